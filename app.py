@@ -9,45 +9,18 @@ import sys
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
 
 from config import config
-from models import SessionLocal, engine, Base, User, Property
+from models import SessionLocal
 from services.auth import AuthService
 from services.audit import AuditService
-from pages import (
-    page_dashboard, page_cashier, page_billing, page_query, page_resources, page_admin,
-    page_quick_dashboard, page_reconciliation_workbench, page_three_way_reconciliation,
-    page_financial_check, page_audit_query, page_data_change_history, page_batch_operations,
-    page_payment_reconciliation, page_arrears_tracking, page_financial_reports,
-    page_backup_management, page_system_monitor, page_permission_management,
-    page_system_init, page_clear_test_data, page_change_password,
-    page_parking_management, page_utility_meter_management, page_utility_reading,
-    page_property_management, page_operation_collection_rate
-)
+from services.bootstrap import bootstrap
+from services.change_tracking import ChangeTracker
+import pages as page_registry
 
 # 页面配置
 st.set_page_config(page_title=config.APP_NAME, layout="wide", page_icon="🏙️")
 
-# 初始化数据库表
-Base.metadata.create_all(engine)
-
-
-def _seed_default_admin():
-    """创建默认物业和管理员账号"""
-    s = SessionLocal()
-    try:
-        prop = s.query(Property).filter_by(code="default").first()
-        if not prop:
-            prop = Property(name="默认物业", code="default")
-            s.add(prop)
-            s.flush()
-        admin = s.query(User).filter_by(username=config.DEFAULT_ADMIN_USER).first()
-        if not admin:
-            h = AuthService.hash_password(config.DEFAULT_ADMIN_PASS)
-            s.add(User(username=config.DEFAULT_ADMIN_USER, password_hash=h, role="管理员", property_id=prop.id))
-        s.commit()
-    except Exception:
-        s.rollback()
-    finally:
-        s.close()
+# 建表、迁移、种子数据及后台服务：每进程只执行一次
+bootstrap()
 
 
 def daily_auto_backup():
@@ -88,6 +61,23 @@ def _get_cookie_token():
     return None
 
 
+def _client_ip():
+    """
+    获取客户端IP。默认使用连接地址；X-Forwarded-For 由客户端可任意伪造，
+    仅在配置了可信代理层数时采用，并取最外层可信代理追加的那一项（自右向左第 N 项）
+    """
+    try:
+        hops = config.TRUSTED_PROXY_HOPS
+        if hops > 0:
+            forwarded = st.context.headers.get('X-Forwarded-For')
+            entries = [e.strip() for e in forwarded.split(',') if e.strip()] if forwarded else []
+            if len(entries) >= hops:
+                return entries[-hops]
+        return getattr(st.context, 'ip_address', None)
+    except Exception:
+        return None
+
+
 def check_login():
     """登录检查"""
     if st.session_state.get('logged_in'):
@@ -98,18 +88,14 @@ def check_login():
     token = params.get('session')
     
     if token:
-        s = SessionLocal()
-        try:
-            user = AuthService.validate_token(s, token)
-            if user:
-                st.session_state.logged_in = True
-                st.session_state.username = user.username
-                st.session_state.user_role = user.role
-                st.session_state.user_id = user.id
-                st.session_state.property_id = user.property_id
-                return True
-        finally:
-            s.close()
+        info = AuthService.resolve_session(token)
+        if info:
+            st.session_state.logged_in = True
+            st.session_state.username = info.username
+            st.session_state.user_role = info.role
+            st.session_state.user_id = info.user_id
+            st.session_state.property_id = info.property_id
+            return True
     
     # 显示登录界面
     c1, c2, c3 = st.columns([1, 2, 1])
@@ -119,14 +105,15 @@ def check_login():
         password = st.text_input("密码", type="password")
         
         if st.button("登录系统", use_container_width=True):
-            if AuthService.is_locked(username):
+            client_ip = _client_ip()
+            if AuthService.is_locked(username, client_ip):
                 st.error("账号已锁定，请稍后再试")
                 return False
             
             s = SessionLocal()
             try:
-                user = s.query(User).filter_by(username=username).first()
-                if user and AuthService.check_password(password, user.password_hash):
+                user = AuthService.authenticate(s, username, password)
+                if user:
                     token = AuthService.create_session(s, user.id, config.SESSION_HOURS)
                     st.session_state.logged_in = True
                     st.session_state.username = user.username
@@ -142,7 +129,7 @@ def check_login():
                     st.query_params['session'] = token
                     st.rerun()
                 else:
-                    AuthService.record_fail(username)
+                    AuthService.record_fail(username, client_ip)
                     st.error("账号或密码错误")
             finally:
                 s.close()
@@ -162,40 +149,40 @@ def logout():
     st.rerun()
 
 
-# 页面映射（分组）
+# 页面映射（分组），值为 pages 包中的函数名，首次访问时才导入对应模块
 PAGES = {
     # 核心业务
-    "🏠 运营驾驶舱": page_dashboard,
-    "💰 收银台": page_cashier,
-    "📋 财务管理": page_billing,
-    "📊 数据中心": page_query,
-    "🏢 资源档案": page_resources,
-    "⚡ 快捷面板": page_quick_dashboard,
+    "🏠 运营驾驶舱": "page_dashboard",
+    "💰 收银台": "page_cashier",
+    "📋 财务管理": "page_billing",
+    "📊 数据中心": "page_query",
+    "🏢 资源档案": "page_resources",
+    "⚡ 快捷面板": "page_quick_dashboard",
     # 车位与水电
-    "🚗 车位管理": page_parking_management,
-    "📊 水电表管理": page_utility_meter_management,
-    "💧 水电抄表": page_utility_reading,
+    "🚗 车位管理": "page_parking_management",
+    "📊 水电表管理": "page_utility_meter_management",
+    "💧 水电抄表": "page_utility_reading",
     # 数据与审计
-    "🔍 收费核对": page_reconciliation_workbench,
-    "🔄 三方核对": page_three_way_reconciliation,
-    "⚖️ 财务检查": page_financial_check,
-    "🔎 审计查询": page_audit_query,
-    "📜 变更历史": page_data_change_history,
-    "⚙️ 批量操作": page_batch_operations,
+    "🔍 收费核对": "page_reconciliation_workbench",
+    "🔄 三方核对": "page_three_way_reconciliation",
+    "⚖️ 财务检查": "page_financial_check",
+    "🔎 审计查询": "page_audit_query",
+    "📜 变更历史": "page_data_change_history",
+    "⚙️ 批量操作": "page_batch_operations",
     # 报表与备份
-    "💳 收款对账": page_payment_reconciliation,
-    "📈 欠费追踪": page_arrears_tracking,
-    "📊 财务报表": page_financial_reports,
-    "📊 运营收缴率": page_operation_collection_rate,
-    "💾 数据备份": page_backup_management,
+    "💳 收款对账": "page_payment_reconciliation",
+    "📈 欠费追踪": "page_arrears_tracking",
+    "📊 财务报表": "page_financial_reports",
+    "📊 运营收缴率": "page_operation_collection_rate",
+    "💾 数据备份": "page_backup_management",
     # 系统与运维
-    "📡 系统监控": page_system_monitor,
-    "🔐 权限管理": page_permission_management,
-    "🔧 系统初始化": page_system_init,
-    "🗑️ 清除测试数据": page_clear_test_data,
-    "🔑 修改密码": page_change_password,
-    "⚙️ 系统管理": page_admin,
-    "🏘️ 物业管理": page_property_management,
+    "📡 系统监控": "page_system_monitor",
+    "🔐 权限管理": "page_permission_management",
+    "🔧 系统初始化": "page_system_init",
+    "🗑️ 清除测试数据": "page_clear_test_data",
+    "🔑 修改密码": "page_change_password",
+    "⚙️ 系统管理": "page_admin",
+    "🏘️ 物业管理": "page_property_management",
 }
 
 # 页面分组（用于侧边栏显示）
@@ -209,13 +196,12 @@ PAGE_GROUPS = {
 
 
 def main():
-    _seed_default_admin()
-    
     if not check_login():
         return
     
     user = st.session_state.username
     role = st.session_state.user_role
+    ChangeTracker.set_operator(user)
     
     # 侧边栏
     st.sidebar.markdown(f"👤 **{user}** ({role})")
@@ -238,7 +224,7 @@ def main():
         logout()
     
     # 渲染页面
-    PAGES[page](user, role)
+    getattr(page_registry, PAGES[page])(user, role)
 
 
 if __name__ == '__main__':
@@ -32,7 +32,48 @@ class Config:
     # 安全配置
     LOGIN_MAX_FAIL: int = int(os.getenv('ERP_LOGIN_MAX_FAIL', '5'))
     LOCK_MINUTES: int = int(os.getenv('ERP_LOCK_MINUTES', '15'))
+    LOGIN_WINDOW_MINUTES: int = int(os.getenv('ERP_LOGIN_WINDOW_MINUTES', '15'))
+    LOGIN_MAX_FAIL_IP: int = int(os.getenv('ERP_LOGIN_MAX_FAIL_IP', '20'))
+    LOGIN_FLUSH_SECONDS: int = int(os.getenv('ERP_LOGIN_FLUSH_SECONDS', '5'))
+    # 前置的可信反向代理层数；0 表示不信任 X-Forwarded-For，直接使用连接地址
+    TRUSTED_PROXY_HOPS: int = int(os.getenv('ERP_TRUSTED_PROXY_HOPS', '0'))
+    # 登录限流内存中最多保留的账号/IP 键数，超出时淘汰最久未活动的键
+    LOGIN_TRACK_MAX_KEYS: int = int(os.getenv('ERP_LOGIN_TRACK_MAX_KEYS', '100000'))
+    BCRYPT_ROUNDS: int = int(os.getenv('ERP_BCRYPT_ROUNDS', '12'))
+    BCRYPT_WORKERS: int = int(os.getenv('ERP_BCRYPT_WORKERS', '4'))
     SESSION_HOURS: int = int(os.getenv('ERP_SESSION_HOURS', '8'))
+    SESSION_CACHE_TTL: int = int(os.getenv('ERP_SESSION_CACHE_TTL', '300'))
+    SESSION_CACHE_SIZE: int = int(os.getenv('ERP_SESSION_CACHE_SIZE', '1024'))
+    SESSION_SWEEP_MINUTES: int = int(os.getenv('ERP_SESSION_SWEEP_MINUTES', '30'))
+    SESSION_SWEEP_BATCH: int = int(os.getenv('ERP_SESSION_SWEEP_BATCH', '1000'))
+    
+    # 参考数据缓存有效期（秒）
+    REF_CACHE_TTL: int = int(os.getenv('ERP_REF_CACHE_TTL', '300'))
+    # 参考数据缓存最多保留的条目数，超出时淘汰最久未使用的条目
+    REF_CACHE_MAX_KEYS: int = int(os.getenv('ERP_REF_CACHE_MAX_KEYS', '1000'))
+    # 已关账账期核对结果缓存有效期（秒）
+    RECON_CACHE_TTL: int = int(os.getenv('ERP_RECON_CACHE_TTL', '3600'))
+    
+    # 完整性检查：并发线程数、每项样本行数、夜间报告目录
+    INTEGRITY_WORKERS: int = int(os.getenv('ERP_INTEGRITY_WORKERS', '4'))
+    INTEGRITY_SAMPLE_SIZE: int = int(os.getenv('ERP_INTEGRITY_SAMPLE_SIZE', '20'))
+    INTEGRITY_REPORT_DIR: str = os.getenv('ERP_INTEGRITY_REPORT_DIR', 'reports')
+    
+    # 导出：游标分块行数、文件目录与保留时长（小时）；目录须位于 app.py 同级的 static/ 下才能以链接下载
+    EXPORT_CHUNK_SIZE: int = int(os.getenv('ERP_EXPORT_CHUNK_SIZE', '5000'))
+    EXPORT_DIR: str = os.getenv('ERP_EXPORT_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                                               'static', 'exports'))
+    EXPORT_KEEP_HOURS: float = float(os.getenv('ERP_EXPORT_KEEP_HOURS', '1'))
+    
+    # 档案导入：批量写入分块行数
+    IMPORT_CHUNK_SIZE: int = int(os.getenv('ERP_IMPORT_CHUNK_SIZE', '5000'))
+    
+    # 分析快照：Parquet 输出目录与压缩算法
+    SNAPSHOT_DIR: str = os.getenv('ERP_SNAPSHOT_DIR', 'snapshots')
+    SNAPSHOT_COMPRESSION: str = os.getenv('ERP_SNAPSHOT_COMPRESSION', 'zstd')
+    
+    # 发票：编号前缀（后接 10 位序号）
+    INVOICE_PREFIX: str = os.getenv('ERP_INVOICE_PREFIX', 'INV-')
     
     # 分页配置
     PAGE_SIZE: int = int(os.getenv('ERP_PAGE_SIZE', '50'))
@@ -1,18 +1,20 @@
 """数据模型模块"""
-from .base import Base, engine, SessionLocal
+from .base import Base, engine, SessionLocal, ensure_indexes
 from .entities import (
     Property, User, Room, FeeType, RoomFeeStandard, Account,
     LedgerEntry, PeriodClose, Bill, PaymentRecord, AuditLog,
-    LoginFail, Invoice, DiscountRequest, AdjustmentEntry,
+    LoginFail, Invoice, InvoiceSequence, DiscountRequest, AdjustmentEntry,
     ParkingType, ParkingSpace, UtilityMeter, UtilityReading, ServiceContract,
-    DataChangeHistory, SessionToken
+    DataChangeHistory, SessionToken, SchemaMigration, DailyPaymentRollup,
+    RoomReconciliation, ReconciliationWatermark
 )
 
 __all__ = [
-    'Base', 'engine', 'SessionLocal',
+    'Base', 'engine', 'SessionLocal', 'ensure_indexes',
     'Property', 'User', 'Room', 'FeeType', 'RoomFeeStandard', 'Account',
     'LedgerEntry', 'PeriodClose', 'Bill', 'PaymentRecord', 'AuditLog',
-    'LoginFail', 'Invoice', 'DiscountRequest', 'AdjustmentEntry',
+    'LoginFail', 'Invoice', 'InvoiceSequence', 'DiscountRequest', 'AdjustmentEntry',
     'ParkingType', 'ParkingSpace', 'UtilityMeter', 'UtilityReading', 'ServiceContract',
-    'DataChangeHistory', 'SessionToken'
+    'DataChangeHistory', 'SessionToken', 'SchemaMigration', 'DailyPaymentRollup',
+    'RoomReconciliation', 'ReconciliationWatermark'
 ]
@@ -1,6 +1,7 @@
 """数据库基础配置"""
 from sqlalchemy import create_engine, event
 from sqlalchemy.orm import declarative_base, sessionmaker
+from sqlalchemy.schema import CreateIndex
 from sqlalchemy.pool import QueuePool
 from config import config
 
@@ -49,10 +50,19 @@ def get_session_factory(property_code: str = None):
         _session_factories[db_path] = sessionmaker(autocommit=False, autoflush=False, bind=eng)
     return _session_factories[db_path]
 
+def ensure_indexes(eng):
+    """为已存在的表补建模型中声明的索引（create_all 不会给旧表加索引）"""
+    # 用 IF NOT EXISTS 而非反射检查，表达式索引无法被反射
+    with eng.begin() as conn:
+        for table in Base.metadata.sorted_tables:
+            for idx in table.indexes:
+                conn.execute(CreateIndex(idx, if_not_exists=True))
+
 def init_property_db(property_code: str):
     """初始化物业数据库表结构"""
     eng = get_engine(property_code)
     Base.metadata.create_all(eng)
+    ensure_indexes(eng)
 
 # 默认引擎和会话（兼容旧代码）
 engine = get_engine()
@@ -2,7 +2,7 @@
 import datetime
 import uuid
 from sqlalchemy import (
-    Column, Integer, String, Float, DateTime, ForeignKey, Text, Boolean
+    Column, Integer, String, Float, Date, DateTime, ForeignKey, Text, Boolean, Index, UniqueConstraint, func
 )
 from sqlalchemy.orm import relationship
 from .base import Base
@@ -93,6 +93,12 @@ class LedgerEntry(Base):
     direction = Column(Integer, nullable=False, default=1)
     side = Column(String(20), nullable=True)
 
+    __table_args__ = (
+        Index('ix_ledger_entries_room_account', 'room_id', 'account_id'),
+        Index('ix_ledger_entries_ref_bill', 'ref_bill_id'),
+        Index('ix_ledger_entries_ref_payment', 'ref_payment_id'),
+    )
+
 
 class PeriodClose(Base):
     __tablename__ = 'period_close'
@@ -104,18 +110,26 @@ class PeriodClose(Base):
     remark = Column(Text)
 
 
+def _default_accounting_period(context):
+    """未指定会计归属期时取账期前 7 位（YYYY-MM）"""
+    period = context.get_current_parameters().get('period')
+    return period[:7] if period and len(period) >= 7 else (period or None)
+
+
 class Bill(Base):
     __tablename__ = 'bills'
     id = Column(Integer, primary_key=True)
     room_id = Column(Integer, ForeignKey('rooms.id'))
     fee_type = Column(String(50))
     period = Column(String(50))
-    accounting_period = Column(String(7), nullable=True)  # 会计归属期 YYYY-MM
+    accounting_period = Column(String(7), nullable=True, default=_default_accounting_period)  # 会计归属期 YYYY-MM
     amount_due = Column(Float, default=0.0)
     amount_paid = Column(Float, default=0.0)
     discount = Column(Float, default=0.0)
     status = Column(String(20), default='未缴')
     created_at = Column(DateTime, default=datetime.datetime.now)
+    # 最近修改时间（含批量 Core UPDATE），分析快照据此重写有变更的分区；索引由迁移 0007 创建
+    updated_at = Column(DateTime, default=datetime.datetime.now, onupdate=datetime.datetime.now)
     operator = Column(String(50))
     remark = Column(String(200))
     origin_id = Column(Integer, nullable=True)
@@ -124,6 +138,13 @@ class Bill(Base):
     
     room = relationship("Room", back_populates="bills")
     parking_space = relationship("ParkingSpace", back_populates="bills")
+    
+    # 账单浏览按 (COALESCE(账期, ''), id) 游标分页，常用筛选列在前；表达式须与 listings.PERIOD_KEY 一致
+    __table_args__ = (
+        Index('ix_bills_period_key_id', func.coalesce(period, ''), id),
+        Index('ix_bills_fee_type_period_key_id', fee_type, func.coalesce(period, ''), id),
+        Index('ix_bills_status_period_key_id', status, func.coalesce(period, ''), id),
+    )
 
 
 class PaymentRecord(Base):
@@ -133,7 +154,7 @@ class PaymentRecord(Base):
     amount = Column(Float, nullable=False)
     biz_type = Column(String(20))
     pay_method = Column(String(20))
-    created_at = Column(DateTime, default=datetime.datetime.now)
+    created_at = Column(DateTime, default=datetime.datetime.now, index=True)
     operator = Column(String(50))
     remark = Column(String(200))
     original_payment_id = Column(Integer, nullable=True)
@@ -154,6 +175,10 @@ class AuditLog(Base):
     created_at = Column(DateTime, default=datetime.datetime.now)
     worm_hash = Column(String(64), nullable=True)
 
+    __table_args__ = (
+        Index('ix_audit_logs_created_id', 'created_at', 'id'),
+    )
+
 
 class LoginFail(Base):
     __tablename__ = 'login_fail'
@@ -167,7 +192,7 @@ class LoginFail(Base):
 class Invoice(Base):
     __tablename__ = 'invoices'
     id = Column(Integer, primary_key=True)
-    bill_id = Column(Integer, ForeignKey('bills.id'), nullable=False)
+    bill_id = Column(Integer, ForeignKey('bills.id'), nullable=False, index=True)
     invoice_no = Column(String(50), unique=True, nullable=False)
     title = Column(String(100), nullable=False)
     tax_rate = Column(Float, default=0.0)
@@ -178,6 +203,14 @@ class Invoice(Base):
     created_at = Column(DateTime, default=datetime.datetime.now)
 
 
+class InvoiceSequence(Base):
+    """发票号序列，next_value 为下一个未分配的序号"""
+    __tablename__ = 'invoice_sequences'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), unique=True, nullable=False)
+    next_value = Column(Integer, nullable=False, default=1)
+
+
 class DiscountRequest(Base):
     __tablename__ = 'discount_requests'
     id = Column(Integer, primary_key=True)
@@ -185,7 +218,7 @@ class DiscountRequest(Base):
     requested_by = Column(String(50), nullable=False)
     amount = Column(Float, nullable=False)
     reason = Column(String(200))
-    status = Column(String(20), default='待审核')
+    status = Column(String(20), default='待审核', index=True)
     created_at = Column(DateTime, default=datetime.datetime.now)
     approved_by = Column(String(50), nullable=True)
     approved_at = Column(DateTime, nullable=True)
@@ -297,11 +330,58 @@ class DataChangeHistory(Base):
     changed_at = Column(DateTime, default=datetime.datetime.now)
     reason = Column(String(200))
 
+    __table_args__ = (
+        Index('ix_data_change_history_changed_id', 'changed_at', 'id'),
+    )
+
 
 class SessionToken(Base):
     __tablename__ = 'session_tokens'
     id = Column(Integer, primary_key=True)
     token = Column(String(128), unique=True, nullable=False, index=True)
-    user_id = Column(Integer, ForeignKey('users.id'), nullable=False)
-    expires_at = Column(DateTime, nullable=False)
+    user_id = Column(Integer, ForeignKey('users.id'), nullable=False, index=True)
+    expires_at = Column(DateTime, nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.datetime.now)
+
+
+class SchemaMigration(Base):
+    __tablename__ = 'schema_migrations'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(100), unique=True, nullable=False)
+    applied_at = Column(DateTime, default=datetime.datetime.now)
+
+
+class DailyPaymentRollup(Base):
+    """按日/支付方式/业务类型汇总的收款，由 payment_records 触发器增量维护"""
+    __tablename__ = 'daily_payment_rollup'
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    pay_method = Column(String(20), nullable=False, default='')
+    biz_type = Column(String(20), nullable=False, default='')
+    amount = Column(Float, default=0.0)  # 正向收款合计
+    refund_amount = Column(Float, default=0.0)  # 负向（冲销/退款）合计
+    count = Column(Integer, default=0)
+    __table_args__ = (UniqueConstraint('day', 'pay_method', 'biz_type', name='uq_daily_payment_rollup'),)
+
+
+class RoomReconciliation(Base):
+    """逐户三方核对中不一致的房产（仅保存差异行）"""
+    __tablename__ = 'room_reconciliation'
+    id = Column(Integer, primary_key=True)
+    room_id = Column(Integer, ForeignKey('rooms.id'), unique=True, nullable=False)
+    room_balance = Column(Float, default=0.0)
+    ledger_balance = Column(Float, default=0.0)
+    payment_total = Column(Float, default=0.0)
+    diff = Column(Float, default=0.0)
+    checked_at = Column(DateTime, default=datetime.datetime.now)
+
+
+class ReconciliationWatermark(Base):
+    """增量核对水位：上次核对时已处理的最大分录/收款/变更记录ID"""
+    __tablename__ = 'reconciliation_watermarks'
+    id = Column(Integer, primary_key=True)
+    name = Column(String(50), unique=True, nullable=False)
+    ledger_id = Column(Integer, default=0)
+    payment_id = Column(Integer, default=0)
+    change_id = Column(Integer, default=0)
+    run_at = Column(DateTime, default=datetime.datetime.now)
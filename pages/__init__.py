@@ -1,26 +1,48 @@
-"""页面模块导出"""
-from .dashboard import page_dashboard
-from .cashier import page_cashier
-from .billing import page_billing
-from .query import page_query
-from .resources import page_resources
-from .admin import page_admin
-from .quick import page_quick_dashboard
-from .reconciliation import page_reconciliation_workbench, page_three_way_reconciliation, page_financial_check
-from .audit import page_audit_query, page_data_change_history
-from .batch import page_batch_operations
-from .reports import page_payment_reconciliation, page_arrears_tracking, page_financial_reports
-from .operation_collection import page_operation_collection_rate
-from .system import page_backup_management, page_system_monitor, page_permission_management, page_system_init, page_clear_test_data, page_change_password
-from .parking import page_parking_management, page_utility_meter_management, page_utility_reading
-from .property import page_property_management, get_current_session
+"""页面模块导出（按需导入：首次访问某个页面函数时才加载其模块）"""
+import importlib
 
-__all__ = [
-    'page_dashboard', 'page_cashier', 'page_billing', 'page_query', 'page_resources', 'page_admin',
-    'page_quick_dashboard', 'page_reconciliation_workbench', 'page_three_way_reconciliation', 'page_financial_check',
-    'page_audit_query', 'page_data_change_history', 'page_batch_operations',
-    'page_payment_reconciliation', 'page_arrears_tracking', 'page_financial_reports', 'page_operation_collection_rate',
-    'page_backup_management', 'page_system_monitor', 'page_permission_management', 'page_system_init', 'page_clear_test_data', 'page_change_password',
-    'page_parking_management', 'page_utility_meter_management', 'page_utility_reading',
-    'page_property_management', 'get_current_session'
-]
+_PAGE_MODULES = {
+    'page_dashboard': 'dashboard',
+    'page_cashier': 'cashier',
+    'page_billing': 'billing',
+    'page_query': 'query',
+    'page_resources': 'resources',
+    'page_admin': 'admin',
+    'page_quick_dashboard': 'quick',
+    'page_reconciliation_workbench': 'reconciliation',
+    'page_three_way_reconciliation': 'reconciliation',
+    'page_financial_check': 'reconciliation',
+    'page_audit_query': 'audit',
+    'page_data_change_history': 'audit',
+    'page_batch_operations': 'batch',
+    'page_payment_reconciliation': 'reports',
+    'page_arrears_tracking': 'reports',
+    'page_financial_reports': 'reports',
+    'page_operation_collection_rate': 'operation_collection',
+    'page_backup_management': 'system',
+    'page_system_monitor': 'system',
+    'page_permission_management': 'system',
+    'page_system_init': 'system',
+    'page_clear_test_data': 'system',
+    'page_change_password': 'system',
+    'page_parking_management': 'parking',
+    'page_utility_meter_management': 'parking',
+    'page_utility_reading': 'parking',
+    'page_property_management': 'property',
+    'get_current_session': 'property',
+}
+
+__all__ = list(_PAGE_MODULES)
+
+
+def __getattr__(name):
+    module = _PAGE_MODULES.get(name)
+    if module is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
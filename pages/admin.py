@@ -1,13 +1,16 @@
 """系统管理页面"""
 import streamlit as st
 import pandas as pd
-import bcrypt
 import json
 import hashlib
 import datetime
 from sqlalchemy.exc import IntegrityError
 from models import SessionLocal, User, Property, FeeType, Room, Bill, PaymentRecord, AuditLog
 from services.audit import AuditService
+from services.auth import AuthService
+from services.cache import RefCache, FEE_TYPES, USERNAMES
+from services.snapshot import SnapshotService
+from config import config
 
 
 def page_admin(user, role):
@@ -56,8 +59,9 @@ def page_admin(user, role):
                     sel_user_obj.role = new_role
                     sel_user_obj.property_id = prop_opts[new_prop]
                     if new_pw:
-                        sel_user_obj.password_hash = bcrypt.hashpw(new_pw.encode(), bcrypt.gensalt()).decode()
+                        sel_user_obj.password_hash = AuthService.hash_password(new_pw)
                     s.commit()
+                    AuthService.invalidate_user(sel_user_id)
                     AuditService.log(user, "修改用户", sel_user_obj.username, {"role": new_role})
                     st.success("用户已更新")
                     st.rerun()
@@ -72,6 +76,8 @@ def page_admin(user, role):
                         AuditService.log(user, "删除用户", sel_user_obj.username, {})
                         s.delete(sel_user_obj)
                         s.commit()
+                        AuthService.invalidate_user(sel_user_id)
+                        RefCache.invalidate(s, USERNAMES)
                         st.session_state.pop('confirm_del_user', None)
                         st.success("用户已删除")
                         st.rerun()
@@ -96,9 +102,10 @@ def page_admin(user, role):
                         st.error("账号密码必填")
                     else:
                         try:
-                            h = bcrypt.hashpw(pw.encode(), bcrypt.gensalt()).decode()
+                            h = AuthService.hash_password(pw)
                             s.add(User(username=un, password_hash=h, role=rl, property_id=prop_opts_add[sel_prop_name]))
                             s.commit()
+                            RefCache.invalidate(s, USERNAMES)
                             st.success("用户已添加")
                             st.rerun()
                         except IntegrityError:
@@ -185,6 +192,7 @@ def page_admin(user, role):
                     sel_fee_obj.name = new_fee_name
                     sel_fee_obj.tax_rate = new_fee_rate
                     s.commit()
+                    RefCache.invalidate(s, FEE_TYPES)
                     AuditService.log(user, "修改费用科目", new_fee_name, {})
                     st.success("科目已更新")
                     st.rerun()
@@ -199,6 +207,7 @@ def page_admin(user, role):
                         AuditService.log(user, "删除费用科目", sel_fee_obj.name, {})
                         s.delete(sel_fee_obj)
                         s.commit()
+                        RefCache.invalidate(s, FEE_TYPES)
                         st.session_state.pop('confirm_del_fee', None)
                         st.success("科目已删除")
                         st.rerun()
@@ -213,6 +222,7 @@ def page_admin(user, role):
                 if st.form_submit_button("添加科目"):
                     s.add(FeeType(name=name, tax_rate=rate))
                     s.commit()
+                    RefCache.invalidate(s, FEE_TYPES)
                     st.success("已添加")
                     st.rerun()
         
@@ -234,5 +244,21 @@ def page_admin(user, role):
                 with open(fname, 'rb') as f:
                     st.download_button("下载备份JSON", f, file_name=fname)
                 AuditService.log(user, "备份导出", "全库", {"file": fname, "sha256": checksum})
+            
+            st.subheader("📊 分析快照（Parquet）")
+            st.caption(f"按会计期分区写入 {config.SNAPSHOT_DIR}/，按 id 水位增量追加（账单按修改时间重写有变更的分区）；"
+                       "夜间任务请使用 scripts/export_snapshot.py")
+            marks = SnapshotService.watermarks()
+            if marks:
+                st.write("当前水位: " + ", ".join(f"{k}={v}" for k, v in marks.items()))
+            c1, c2 = st.columns(2)
+            full = c2.button("♻️ 全量重建快照")
+            if c1.button("📤 增量导出快照") or full:
+                try:
+                    counts = SnapshotService.export(s, full=full)
+                    st.success("快照已导出: " + ", ".join(f"{k} {v} 行" for k, v in counts.items()))
+                    AuditService.log(user, "分析快照导出", "全库", {"full": full, **counts})
+                except Exception as e:
+                    st.error(f"快照导出失败: {e}")
     finally:
         s.close()
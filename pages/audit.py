@@ -4,8 +4,13 @@ import pandas as pd
 import datetime
 import json
 from models.base import SessionLocal
-from models.entities import AuditLog, User, DataChangeHistory
-from sqlalchemy.sql import desc
+from models.entities import AuditLog, DataChangeHistory
+from config import config
+from services.change_tracking import ChangeTracker
+from services.cache import usernames, audit_actions
+from utils.pagination import keyset_page, KeysetPager
+from pages.widgets import render_pager
+
 
 def page_audit_query(user, role):
     """审计日志查询工作台"""
@@ -17,17 +22,16 @@ def page_audit_query(user, role):
     s = SessionLocal()
     try:
         col1, col2, col3 = st.columns(3)
-        users = s.query(User.username).all()
-        user_list = ['全部'] + [u[0] for u in users]
+        user_list = ['全部'] + usernames(s)
         selected_user = col1.selectbox("操作用户", user_list)
         
-        actions = s.query(AuditLog.action).distinct().all()
-        action_list = ['全部'] + [a[0] for a in actions if a[0]]
+        action_list = ['全部'] + audit_actions(s)
         selected_action = col2.selectbox("操作类型", action_list)
         
         date_range = col3.selectbox("时间范围", ["最近1天", "最近7天", "最近30天", "全部"])
         
-        query = s.query(AuditLog).order_by(desc(AuditLog.created_at))
+        query = s.query(AuditLog.id, AuditLog.created_at, AuditLog.user, AuditLog.action,
+                        AuditLog.target, AuditLog.details, AuditLog.trace_id)
         if selected_user != '全部':
             query = query.filter(AuditLog.user == selected_user)
         if selected_action != '全部':
@@ -39,16 +43,21 @@ def page_audit_query(user, role):
         elif date_range == "最近30天":
             query = query.filter(AuditLog.created_at >= datetime.datetime.now() - datetime.timedelta(days=30))
         
-        logs = query.limit(1000).all()
+        pager = KeysetPager(st.session_state, "audit_pager", (selected_user, selected_action, date_range))
+        logs, next_cursor, has_more = keyset_page(query, [AuditLog.created_at, AuditLog.id], pager.cursor, config.PAGE_SIZE)
+        if not logs and pager.has_prev:
+            pager.reset()
+            st.rerun()
         if not logs:
             st.info("未找到符合条件的日志")
             return
         
-        st.markdown(f"### 📋 查询结果 (共 {len(logs)} 条)")
+        st.markdown(f"### 📋 查询结果 (本页 {len(logs)} 条)")
         log_data = [{"ID": log.id, "时间": log.created_at.strftime("%Y-%m-%d %H:%M:%S"), "用户": log.user,
             "操作": log.action, "目标": log.target, "详情": log.details[:50] + "..." if len(log.details or '') > 50 else log.details,
             "trace_id": log.trace_id} for log in logs]
         st.dataframe(pd.DataFrame(log_data), use_container_width=True, height=400)
+        render_pager(pager, has_more, next_cursor, "audit")
         
         st.markdown("### 🔗 操作链路追踪")
         trace_id_input = st.text_input("输入 trace_id 追踪操作链路")
@@ -77,12 +86,14 @@ def page_data_change_history(user, role):
     s = SessionLocal()
     try:
         col1, col2, col3 = st.columns(3)
-        tables = ['全部', 'rooms', 'bills', 'payment_records', 'users']
+        tables = ['全部'] + ChangeTracker.tracked_tables()
         selected_table = col1.selectbox("数据表", tables)
         record_id_input = col2.text_input("记录ID (可选)")
         date_range = col3.selectbox("时间范围", ["最近1天", "最近7天", "最近30天", "全部"], key="change_date")
         
-        query = s.query(DataChangeHistory).order_by(desc(DataChangeHistory.changed_at))
+        query = s.query(DataChangeHistory.id, DataChangeHistory.changed_at, DataChangeHistory.table_name,
+                        DataChangeHistory.record_id, DataChangeHistory.field_name, DataChangeHistory.old_value,
+                        DataChangeHistory.new_value, DataChangeHistory.changed_by, DataChangeHistory.reason)
         if selected_table != '全部':
             query = query.filter(DataChangeHistory.table_name == selected_table)
         if record_id_input:
@@ -97,16 +108,22 @@ def page_data_change_history(user, role):
         elif date_range == "最近30天":
             query = query.filter(DataChangeHistory.changed_at >= datetime.datetime.now() - datetime.timedelta(days=30))
         
-        changes = query.limit(500).all()
+        pager = KeysetPager(st.session_state, "change_pager", (selected_table, record_id_input, date_range))
+        changes, next_cursor, has_more = keyset_page(query, [DataChangeHistory.changed_at, DataChangeHistory.id],
+                                                     pager.cursor, config.PAGE_SIZE)
+        if not changes and pager.has_prev:
+            pager.reset()
+            st.rerun()
         if not changes:
             st.info("未找到变更记录")
             return
         
-        st.markdown(f"### 📋 变更记录 (共 {len(changes)} 条)")
+        st.markdown(f"### 📋 变更记录 (本页 {len(changes)} 条)")
         change_data = [{"时间": c.changed_at.strftime("%Y-%m-%d %H:%M:%S"), "数据表": c.table_name, "记录ID": c.record_id,
             "字段": c.field_name, "原值": c.old_value[:30] + "..." if len(c.old_value or '') > 30 else c.old_value,
             "新值": c.new_value[:30] + "..." if len(c.new_value or '') > 30 else c.new_value,
             "操作人": c.changed_by, "原因": c.reason or ""} for c in changes]
         st.dataframe(pd.DataFrame(change_data), use_container_width=True, height=400)
+        render_pager(pager, has_more, next_cursor, "change")
     finally:
         s.close()
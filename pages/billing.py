@@ -1,10 +1,17 @@
 """财务管理页面"""
 import streamlit as st
 import datetime
-from models import SessionLocal, Bill, FeeType, PeriodClose, Invoice, DiscountRequest, AdjustmentEntry
+import pandas as pd
+from models import SessionLocal, Bill, PeriodClose
 from services.audit import AuditService
 from services.billing import BillingService
+from services.discounts import DiscountService
+from services.invoicing import InvoiceService, split_tax
+from services.listings import ListingService
+from services.cache import RefCache, BILL_PERIODS, fee_type_names, fee_type_rates
+from utils.exceptions import ValidationError
 from utils.helpers import format_money
+from pages.widgets import room_picker
 from utils.transaction import transaction_scope
 
 
@@ -19,7 +26,7 @@ def page_billing(user, role):
         t1, t2, t3, t4 = st.tabs(["⚡ 批量生成账单", "📅 月度关账", "🧾 发票管理", "✅ 减免审批"])
         
         with t1:
-            fees = [f.name for f in s.query(FeeType).all()] or ["物业费"]
+            fees = fee_type_names(s) or ["物业费"]
             
             st.markdown("### 📋 批量生成账单")
             with st.form("batch_billing"):
@@ -37,20 +44,18 @@ def page_billing(user, role):
                                 s_trx, b_period, b_fee, user, gen_all, b_price
                             )
                             AuditService.log_deferred(s_trx, audit_buffer, user, "批量计费", "全小区", result)
+                        RefCache.invalidate(s, BILL_PERIODS)
                         st.success(f"生成 {result['count']} 笔，合计 {format_money(result['total'])}")
                     except Exception as e:
                         st.error(str(e))
             
             st.markdown("---")
             st.markdown("### ✍️ 手动开账单")
-            from models import Room
-            rooms = s.query(Room).filter(Room.is_deleted == False).all()
-            if not rooms:
-                st.warning("暂无房产档案")
-            else:
+            # 房号联想需随输入即时刷新，放在表单外
+            picked = room_picker(s, "manual_billing_room", label="选择房号")
+            if picked:
+                selected_room = picked.room_number
                 with st.form("manual_billing"):
-                    room_map = {r.room_number: r for r in rooms}
-                    selected_room = st.selectbox("选择房号", list(room_map.keys()))
                     c1, c2 = st.columns(2)
                     manual_fee = c1.selectbox("费用类型", fees, key="manual_fee")
                     manual_period = c2.text_input("账期(YYYY-MM)", value=datetime.datetime.now().strftime("%Y-%m"), key="manual_period")
@@ -63,9 +68,8 @@ def page_billing(user, role):
                         else:
                             try:
                                 with transaction_scope() as (s_trx, audit_buffer):
-                                    room = room_map[selected_room]
                                     bill = Bill(
-                                        room_id=room.id,
+                                        room_id=picked.id,
                                         fee_type=manual_fee,
                                         period=manual_period,
                                         accounting_period=manual_period,
@@ -79,6 +83,7 @@ def page_billing(user, role):
                                     s_trx.add(bill)
                                     AuditService.log_deferred(s_trx, audit_buffer, user, "手动开单", 
                                                             selected_room, {"fee": manual_fee, "period": manual_period, "amount": manual_amount})
+                                RefCache.invalidate(s, BILL_PERIODS)
                                 st.success(f"账单创建成功：{selected_room} | {manual_fee} | {manual_period} | {format_money(manual_amount)}")
                             except Exception as e:
                                 st.error(f"创建失败: {e}")
@@ -116,79 +121,78 @@ def page_billing(user, role):
         with t3:
             st.subheader("🧾 发票管理")
             # 查询已缴费但未开票的账单
-            invoiced_bills = s.query(Invoice.bill_id).subquery()
-            paid_bills = s.query(Bill).filter(Bill.status == '已缴', ~Bill.id.in_(invoiced_bills)).all()
+            paid_bills = ListingService.invoice_candidates(s)
             
             if not paid_bills:
                 st.info("暂无可开票账单")
             else:
-                import uuid
-                sel_bill = st.selectbox("选择账单", paid_bills, format_func=lambda b: f"{b.room.room_number if b.room else ''} | {b.fee_type} | {b.period} | ¥{b.amount_paid:.2f}")
+                sel_bill = st.selectbox("选择账单", paid_bills, format_func=lambda b: b.label)
                 if sel_bill:
-                    fee = s.query(FeeType).filter(FeeType.name == sel_bill.fee_type).first()
-                    rate = float(fee.tax_rate) if fee else 0.0
+                    rate = fee_type_rates(s).get(sel_bill.fee_type, 0.0)
                     # 价内税计算：含税金额拆分
                     amt_incl = float(sel_bill.amount_paid)
-                    amt_excl = amt_incl / (1 + rate) if rate > 0 else amt_incl
-                    tax_amt = amt_incl - amt_excl
+                    amt_excl, tax_amt = split_tax(amt_incl, rate)
                     
                     st.write(f"税率: {rate*100:.1f}% | 不含税: ¥{amt_excl:.2f} | 税额: ¥{tax_amt:.2f} | 含税: ¥{amt_incl:.2f}")
-                    inv_no = st.text_input("发票编号", value=f"INV-{uuid.uuid4().hex[:8].upper()}")
-                    title = st.text_input("发票抬头", value=sel_bill.room.owner_name if sel_bill.room else "")
+                    st.caption("发票编号由系统按序分配")
+                    title = st.text_input("发票抬头", value=sel_bill.owner_name)
                     
                     if st.button("开具发票"):
                         try:
                             with transaction_scope() as (s_trx, audit_buffer):
-                                inv = Invoice(bill_id=sel_bill.id, invoice_no=inv_no, title=title, tax_rate=rate,
-                                             amount_excl_tax=amt_excl, tax_amount=tax_amt, amount_incl_tax=amt_incl, status='已开具')
-                                s_trx.add(inv)
+                                batch = InvoiceService.issue(s_trx, [sel_bill.id], title)
+                                if not batch.count:
+                                    raise ValidationError("该账单已开票或状态已变更")
                                 AuditService.log_deferred(s_trx, audit_buffer, user, "开票", f"Bill:{sel_bill.id}", 
-                                                        {"inv_no": inv_no, "rate": rate, "amt_excl": amt_excl, "tax": tax_amt})
-                            st.success("发票已开具")
+                                                        {"inv_no": batch.first_no, "rate": rate, "amt_excl": amt_excl, "tax": batch.tax})
+                            st.success(f"发票已开具: {batch.first_no}")
                             st.rerun()
                         except Exception as e:
                             st.error(f"开票失败: {e}")
         
         with t4:
             st.subheader("✅ 减免审批")
-            pending = s.query(DiscountRequest).filter(DiscountRequest.status == '待审核').all()
+            pending = DiscountService.pending(s)
             if not pending:
                 st.info("暂无待审核申请")
             else:
-                for r in pending:
-                    b = s.query(Bill).get(r.bill_id)
-                    with st.expander(f"申请ID:{r.id} | 金额:{format_money(r.amount)} | 申请人:{r.requested_by}"):
-                        st.write(f"账单: {b.fee_type} | {b.period}")
-                        st.write(f"理由: {r.reason}")
-                        c1, c2 = st.columns(2)
-                        if c1.button("通过", key=f"approve_{r.id}"):
-                            try:
-                                with transaction_scope() as (s_trx, audit_buffer):
-                                    req = s_trx.query(DiscountRequest).get(r.id)
-                                    bill = s_trx.query(Bill).get(req.bill_id)
-                                    bill.discount += float(req.amount)
-                                    s_trx.add(AdjustmentEntry(bill_id=bill.id, amount=float(req.amount),
-                                                            reason=req.reason, approved_by=user))
-                                    req.status = '已通过'
-                                    req.approved_by = user
-                                    req.approved_at = datetime.datetime.now()
-                                    AuditService.log_deferred(s_trx, audit_buffer, user, "审批通过减免",
-                                                            f"Bill:{bill.id}", {"amount": float(req.amount)})
-                                st.success("已通过")
-                                st.rerun()
-                            except Exception as e:
-                                st.error(str(e))
-                        if c2.button("拒绝", key=f"reject_{r.id}"):
-                            try:
-                                with transaction_scope() as (s_trx, audit_buffer):
-                                    req = s_trx.query(DiscountRequest).get(r.id)
-                                    req.status = '已拒绝'
-                                    req.approved_by = user
-                                    AuditService.log_deferred(s_trx, audit_buffer, user, "拒绝减免",
-                                                            f"Bill:{req.bill_id}", {})
-                                st.warning("已拒绝")
-                                st.rerun()
-                            except Exception as e:
-                                st.error(str(e))
+                df = pd.DataFrame([{"选中": False, "申请ID": r.id, "房号": r.room_number, "科目": r.fee_type,
+                                    "账期": r.period, "应收": float(r.amount_due), "已减免": float(r.discount),
+                                    "申请金额": float(r.amount), "理由": r.reason or "", "申请人": r.requested_by}
+                                   for r in pending])
+                select_all = st.checkbox(f"全选（共 {len(df)} 笔，合计 {format_money(df['申请金额'].sum())}）")
+                df["选中"] = select_all
+                edited = st.data_editor(df, column_config={
+                    "选中": st.column_config.CheckboxColumn(required=True),
+                    "应收": st.column_config.NumberColumn(format="¥%.2f"),
+                    "已减免": st.column_config.NumberColumn(format="¥%.2f"),
+                    "申请金额": st.column_config.NumberColumn(format="¥%.2f")},
+                    disabled=[c for c in df.columns if c != "选中"], hide_index=True, key="discount_editor")
+                
+                selected = edited.loc[edited["选中"], "申请ID"].tolist()
+                st.markdown(f"#### 已选 {len(selected)} 笔，合计: :red[{format_money(edited.loc[edited['选中'], '申请金额'].sum())}]")
+                c1, c2 = st.columns(2)
+                if c1.button("✅ 批量通过", type="primary", disabled=not selected):
+                    try:
+                        with transaction_scope() as (s_trx, audit_buffer):
+                            d = DiscountService.approve(s_trx, selected, user)
+                            AuditService.log_deferred(s_trx, audit_buffer, user, "审批通过减免", "多申请",
+                                                      {"申请数": d.requests, "账单数": d.bills, "amount": d.amount,
+                                                       "明细": d.items})
+                        st.success(f"已通过 {d.requests} 笔")
+                        st.rerun()
+                    except Exception as e:
+                        st.error(str(e))
+                if c2.button("❌ 批量拒绝", disabled=not selected):
+                    try:
+                        with transaction_scope() as (s_trx, audit_buffer):
+                            d = DiscountService.reject(s_trx, selected, user)
+                            AuditService.log_deferred(s_trx, audit_buffer, user, "拒绝减免", "多申请",
+                                                      {"申请数": d.requests, "账单数": d.bills, "amount": d.amount,
+                                                       "明细": d.items})
+                        st.warning(f"已拒绝 {d.requests} 笔")
+                        st.rerun()
+                    except Exception as e:
+                        st.error(str(e))
     finally:
         s.close()
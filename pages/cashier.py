@@ -6,6 +6,8 @@ from decimal import Decimal
 from models import SessionLocal, Room, Bill, PaymentRecord
 from services.audit import AuditService
 from services.ledger import LedgerService
+from services.room_directory import RoomDirectory
+from pages.widgets import room_picker
 from utils.helpers import to_decimal, format_money
 from utils.transaction import transaction_scope
 
@@ -31,14 +33,15 @@ def page_cashier(user, role):
         return
     s = SessionLocal()
     try:
-        rooms = s.query(Room).filter(Room.is_deleted == False).all()
-        if not rooms:
-            st.warning("暂无档案数据")
+        picked = room_picker(s, "cashier_room")
+        if not picked:
+            return
+        # 仅加载选中房产的完整记录
+        curr = s.get(Room, picked.id)
+        if curr is None:
+            RoomDirectory.invalidate(s)
+            st.warning("该房产已不存在，请重新选择")
             return
-        
-        r_map = {r.room_number: r for r in rooms}
-        sel_no = st.selectbox("搜索/选择房号", list(r_map.keys()))
-        curr = r_map[sel_no]
         st.write(f"业主: {curr.owner_name} | 余额: {format_money(curr.balance)}")
         
         # 充值
@@ -66,6 +69,8 @@ def page_cashier(user, role):
                                                            room_id=curr.id, ref_payment_id=pr.id)
                             AuditService.log_deferred(s_trx, audit_buffer, user, "充值", curr.room_number,
                                                      {"金额": str(recharge_val), "方式": pay_method})
+                            new_balance = room.balance
+                        RoomDirectory.update_balance(s, curr.id, new_balance)
                         st.success("充值成功")
                         time.sleep(0.5)
                         st.rerun()
@@ -180,6 +185,8 @@ def page_cashier(user, role):
                             AuditService.log_deferred(s_trx, audit_buffer, user, "收费", curr.room_number,
                                                      {"总额": str(to_pay), "方式": pay_way, "余额变化": f"{old_balance} -> {room.balance}"})
                             st.info("[调试] 准备提交事务")
+                            new_balance = room.balance
+                        RoomDirectory.update_balance(s, curr.id, new_balance)
                         st.success("✅ 支付成功！事务已提交")
                         time.sleep(1)
                         st.rerun()
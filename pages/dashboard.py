@@ -2,7 +2,8 @@
 import streamlit as st
 import datetime
 from sqlalchemy.sql import func
-from models import SessionLocal, PaymentRecord, Bill, Room
+from models import SessionLocal, Bill, Room
+from services.rollup import PaymentRollupService
 from utils.helpers import to_decimal, format_money
 
 
@@ -17,14 +18,8 @@ def page_dashboard(user, role):
         q_end = c2.date_input("结束日期", today)
         st.divider()
         
-        period_revenue = to_decimal(
-            s.query(func.sum(PaymentRecord.amount))
-             .filter(PaymentRecord.amount > 0)
-             .filter(PaymentRecord.pay_method != '期初导入')
-             .filter(func.date(PaymentRecord.created_at) >= q_start)
-             .filter(func.date(PaymentRecord.created_at) <= q_end)
-             .scalar() or 0
-        )
+        # 期间实收：读取收款日汇总，区间内每天只有几行
+        period_revenue = to_decimal(PaymentRollupService.revenue(s, q_start, q_end))
         # 期间减免：使用会计归属期筛选
         q_start_str = q_start.strftime('%Y-%m')
         q_end_str = q_end.strftime('%Y-%m')
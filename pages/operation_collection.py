@@ -1,12 +1,9 @@
 """运营收缴率看板"""
 import streamlit as st
-import pandas as pd
 import datetime
-from decimal import Decimal
 from models.base import SessionLocal
-from models.entities import Room, Bill, ServiceContract
-from sqlalchemy import func, and_, or_
-from utils.helpers import format_money, to_decimal
+from services.collection import CollectionRateService
+from utils.helpers import format_money
 
 
 def page_operation_collection_rate(user, role):
@@ -41,114 +38,21 @@ def page_operation_collection_rate(user, role):
             # 房号筛选
             room_filter = st.text_input("房号筛选(可选)", placeholder="输入房号关键词")
         
-        # 默认自动加载数据
-        # 查询所有房产
-        rooms_query = s.query(Room).filter(Room.is_deleted == False)
-        if room_filter:
-            rooms_query = rooms_query.filter(Room.room_number.like(f"%{room_filter}%"))
-        
-        all_rooms = rooms_query.all()
-        
-        if not all_rooms:
-            st.warning("未找到房产数据")
-            return
-        
-        # 计算每户的收缴率
-        data_list = []
-        for room in all_rooms:
-            # 尝试获取服务合同
-            contract = s.query(ServiceContract).filter(
-                ServiceContract.room_id == room.id
-            ).first()
-            
-            # 确定入伙日期和周期
-            if contract:
-                move_in_date = contract.start_date
-                cycle_end = contract.end_date or datetime.datetime.now()
-                date_source = "合同"
-            else:
-                # 无合同：使用最早账单的账期作为入伙日期
-                earliest_bill = s.query(Bill).filter(
-                    Bill.room_id == room.id,
-                    Bill.status != '作废'
-                ).order_by(
-                    func.coalesce(Bill.accounting_period, Bill.period)
-                ).first()
-                
-                if not earliest_bill:
-                    continue  # 没有账单数据，跳过
-                
-                period_str = earliest_bill.accounting_period or earliest_bill.period
-                if not period_str:
-                    continue
-                try:
-                    move_in_date = datetime.datetime.strptime(period_str[:7] + "-01", "%Y-%m-%d")
-                except:
-                    continue
-                
-                cycle_end = datetime.datetime.now()
-                date_source = "账单"
-            
-            # 如果启用了入伙日期筛选，则过滤
-            if use_date_filter and start_date and end_date:
-                if move_in_date.date() < start_date or move_in_date.date() > end_date:
-                    continue
-            
-            # 查询周期内的所有账单（截止到统计日期）
-            stat_period = stat_date.strftime("%Y-%m")
-            bills = s.query(Bill).filter(
-                Bill.room_id == room.id,
-                Bill.status != '作废',
-                or_(
-                    Bill.accounting_period.between(
-                        move_in_date.strftime("%Y-%m"),
-                        stat_period
-                    ),
-                    and_(
-                        Bill.accounting_period.is_(None),
-                        Bill.period.between(
-                            move_in_date.strftime("%Y-%m"),
-                            stat_period
-                        )
-                    )
-                )
-            ).all()
-            
-            if not bills:
-                continue
-            
-            # 计算应收、已缴、减免
-            total_due = sum([to_decimal(b.amount_due or 0) for b in bills])
-            total_paid = sum([to_decimal(b.amount_paid or 0) for b in bills])
-            total_discount = sum([to_decimal(b.discount or 0) for b in bills])
-            
-            # 收缴率 = (已缴 + 减免) / 应收
-            collection_rate = 0.0
-            if total_due > 0:
-                collection_rate = float((total_paid + total_discount) / total_due * 100)
-            
-            data_list.append({
-                "房号": room.room_number,
-                "业主": room.owner_name or "",
-                "入伙日期": move_in_date.strftime("%Y-%m-%d"),
-                "数据来源": date_source,
-                "统计截止": stat_period,
-                "应收金额": float(total_due),
-                "已缴金额": float(total_paid),
-                "减免金额": float(total_discount),
-                "未缴金额": float(total_due - total_paid - total_discount),
-                "收缴率(%)": round(collection_rate, 2)
-            })
+        # 三次集合查询 + 向量化计算，导出与页面共用同一结果
+        df = CollectionRateService.room_rates(
+            s, stat_date,
+            move_in_start=start_date if use_date_filter else None,
+            move_in_end=end_date if use_date_filter else None,
+            room_filter=room_filter or None,
+        )
         
         # 显示统计结果
         st.markdown("### 📈 收缴率统计")
         
-        if not data_list:
+        if df.empty:
             st.warning("没有符合条件的数据")
             return
         
-        df = pd.DataFrame(data_list)
-        
         # 汇总统计
         col1, col2, col3, col4 = st.columns(4)
         total_due_sum = df["应收金额"].sum()
@@ -175,6 +79,20 @@ def page_operation_collection_rate(user, role):
             mime="text/csv"
         )
         
+        # 入伙批次矩阵（全部房产，按统计截止账期缓存）
+        st.markdown("### 🧮 入伙批次累计收缴率")
+        if st.checkbox("显示入伙批次矩阵", value=False):
+            max_months = st.slider("最多显示入伙后月数", min_value=6, max_value=120, value=60, step=6)
+            cohort = CollectionRateService.cohort_matrix(s, stat_date, max_months=max_months)
+            if cohort.empty:
+                st.info("暂无可统计的账单数据")
+            else:
+                st.dataframe(cohort.style.format("{:.1f}%", subset=cohort.columns[1:], na_rep=""),
+                             use_container_width=True)
+                st.caption("行：入伙月份；列：入伙后第 N 个月（M0 为入伙当月）；单元格：截至该月的累计收缴率")
+                st.download_button("📥 导出批次矩阵", cohort.to_csv(encoding='utf-8-sig'),
+                                   file_name=f"入伙批次收缴率_{stat_date.strftime('%Y%m')}.csv", mime="text/csv")
+        
         # 统计说明
         with st.expander("📋 统计说明"):
             st.markdown("""
@@ -9,16 +9,11 @@ from models.entities import ParkingSpace, UtilityMeter, UtilityReading, ParkingT
 from sqlalchemy.sql import desc
 from utils.transaction import transaction_scope
 from services.audit import AuditService
-
-# 默认车位类型
-DEFAULT_PARKING_TYPES = ["地下车位", "地面车位", "车库", "子母车位"]
+from services.cache import RefCache, BILL_PERIODS, PARKING_TYPES, DEFAULT_PARKING_TYPES, parking_types as _cached_parking_types
 
 def get_parking_types(s):
     """获取所有车位类型"""
-    types = s.query(ParkingType).filter(ParkingType.is_deleted.is_(False)).all()
-    if types:
-        return [t.name for t in types]
-    return DEFAULT_PARKING_TYPES
+    return _cached_parking_types(s)
 
 def page_parking_management(user, role):
     """车位管理页面"""
@@ -85,6 +80,7 @@ def page_parking_management(user, role):
                                 with transaction_scope() as (s_trx, audit_buffer):
                                     s_trx.add(ParkingType(name=new_type))
                                     AuditService.log_deferred(s_trx, audit_buffer, user, "新增车位类型", new_type, {})
+                                RefCache.invalidate(s, PARKING_TYPES)
                                 st.success(f"✅ 车位类型 '{new_type}' 添加成功！")
                                 time.sleep(1)
                                 st.rerun()
@@ -170,6 +166,7 @@ C3-01,子母车位,赵六,13800138004,已售,250,500,2025-09,2025-10,100"""
                                         fail += 1
                                 
                                 AuditService.log_deferred(s_trx, audit_buffer, user, "批量导入车位", f"成功{success}条", {"失败": fail})
+                            RefCache.invalidate(s, BILL_PERIODS)
                             
                             st.success(f"✅ 导入完成！成功 {success} 条，失败 {fail} 条")
                             time.sleep(1)
@@ -2,9 +2,10 @@
 import streamlit as st
 import pandas as pd
 import time
-from models.base import SessionLocal, get_session_factory, init_property_db
+from models.base import SessionLocal, get_session_factory
 from models.entities import Property
 from services.audit import AuditService
+from services.bootstrap import bootstrap
 
 def page_property_management(user, role):
     """物业管理与切换"""
@@ -37,7 +38,7 @@ def page_property_management(user, role):
                     if prop:
                         st.session_state.property_code = prop.code
                         st.session_state.property_name = prop.name
-                        init_property_db(prop.code)
+                        bootstrap(prop.code)
                         AuditService.log(user, "切换物业", prop.name, {"code": prop.code})
                     else:
                         st.session_state.property_code = ''
@@ -70,7 +71,7 @@ def page_property_management(user, role):
                         prop = Property(name=name, code=code, address=address)
                         s.add(prop)
                         s.commit()
-                        init_property_db(code)
+                        bootstrap(code)
                         AuditService.log(user, "新增物业", name, {"code": code})
                         st.success(f"✅ 物业 {name} 添加成功！数据库已初始化")
                         time.sleep(1)
@@ -1,9 +1,10 @@
 """数据中心页面"""
 import streamlit as st
-import pandas as pd
-from sqlalchemy.sql import desc
-from models import SessionLocal, Bill, PaymentRecord, Room
-from config import config
+from models import SessionLocal
+from services.listings import ListingService, BillFilter
+from services.cache import bill_periods, fee_type_names
+from utils.pagination import KeysetPager
+from pages.widgets import render_pager, export_panel
 
 
 def page_query(user, role):
@@ -16,44 +17,36 @@ def page_query(user, role):
         t1, t2, t3 = st.tabs(["🧾 账单明细", "💹 资金流水", "📤 数据导出"])
         
         with t1:
-            page = st.number_input("页码", min_value=1, value=1)
-            offset = (page - 1) * config.PAGE_SIZE
-            res = s.query(Bill).join(Room).filter(Room.is_deleted.is_(False)).offset(offset).limit(config.PAGE_SIZE).all()
-            st.dataframe(pd.DataFrame([{
-                "房号": b.room.room_number, "科目": b.fee_type, "账期": b.period,
-                "应收": float(b.amount_due or 0), "减免": float(b.discount or 0),
-                "实收": float(b.amount_paid or 0), "状态": b.status
-            } for b in res]), use_container_width=True)
+            c1, c2, c3 = st.columns(3)
+            period = c1.selectbox("账期", ["全部"] + bill_periods(s), key="qb_period")
+            fee_type = c2.selectbox("科目", ["全部"] + fee_type_names(s), key="qb_fee")
+            status = c3.selectbox("状态", ["全部", "未缴", "部分已缴", "已缴", "作废"], key="qb_status")
+            c4, c5, c6, c7 = st.columns(4)
+            room_prefix = c4.text_input("房号开头", key="qb_room").strip()
+            min_amount = c5.number_input("应收下限", min_value=0.0, value=None, step=100.0, key="qb_min")
+            max_amount = c6.number_input("应收上限", min_value=0.0, value=None, step=100.0, key="qb_max")
+            page_size = c7.selectbox("每页条数", [50, 100, 200, 500], key="qb_size")
+            
+            f = BillFilter(None if period == "全部" else period, None if fee_type == "全部" else fee_type,
+                           None if status == "全部" else status, room_prefix or None, min_amount, max_amount)
+            pager = KeysetPager(st.session_state, "bill_pager", (f, page_size))
+            df, next_cursor, has_more = ListingService.browse_bills(s, f, pager.cursor, page_size)
+            if df.empty and pager.has_prev:
+                pager.reset()
+                st.rerun()
+            if df.empty:
+                st.info("未找到符合条件的账单")
+            else:
+                st.dataframe(df, use_container_width=True, hide_index=True)
+                render_pager(pager, has_more, next_cursor, "bill",
+                             f" · 共约 {ListingService.count_bills(s, f):,} 条")
         
         with t2:
-            res = s.query(PaymentRecord).join(Room).filter(Room.is_deleted.is_(False)).order_by(desc(PaymentRecord.created_at)).limit(500).all()
-            st.dataframe(pd.DataFrame([{
-                "时间": r.created_at.strftime("%Y-%m-%d %H:%M"), "房号": r.room.room_number,
-                "类型": r.biz_type, "金额": float(r.amount), "方式": r.pay_method, "操作人": r.operator
-            } for r in res]), use_container_width=True)
+            st.dataframe(ListingService.payment_frame(s, 500), use_container_width=True)
         
         with t3:
             st.subheader("📤 数据导出")
-            c1, c2 = st.columns(2)
-            if c1.button("导出账单CSV"):
-                res = s.query(Bill).join(Room).filter(Room.is_deleted.is_(False)).limit(5000).all()
-                df = pd.DataFrame([{
-                    "房号": b.room.room_number, "科目": b.fee_type, "账期": b.period,
-                    "应收": b.amount_due or 0, "减免": b.discount or 0, "实收": b.amount_paid or 0, "状态": b.status
-                } for b in res])
-                p = "export_bills.csv"
-                df.to_csv(p, index=False, encoding='utf-8-sig')
-                with open(p, 'rb') as f:
-                    st.download_button("下载账单CSV", f, p)
-            if c2.button("导出流水CSV"):
-                res = s.query(PaymentRecord).join(Room).filter(Room.is_deleted.is_(False)).limit(5000).all()
-                df = pd.DataFrame([{
-                    "房号": r.room.room_number, "类型": r.biz_type, "金额": r.amount,
-                    "方式": r.pay_method, "时间": r.created_at.strftime('%Y-%m-%d %H:%M'), "操作人": r.operator
-                } for r in res])
-                p = "export_payments.csv"
-                df.to_csv(p, index=False, encoding='utf-8-sig')
-                with open(p, 'rb') as f:
-                    st.download_button("下载流水CSV", f, p)
+            st.caption("账单导出按“账单明细”中的筛选条件进行")
+            export_panel(s, "query_export", ["bills", "payments"], bill_filter=f)
     finally:
         s.close()
@@ -2,9 +2,11 @@
 import streamlit as st
 import datetime
 from models.base import SessionLocal
-from models.entities import Room, Bill, DiscountRequest, PeriodClose, AuditLog, PaymentRecord
+from models.entities import Room, Bill, DiscountRequest, PeriodClose, AuditLog
 from sqlalchemy.sql import func
-from utils.helpers import format_money
+from services.rollup import PaymentRollupService
+from services.search import SearchService
+from utils.helpers import format_money, mask_sensitive_data
 
 def page_quick_dashboard(user, role):
     """快捷操作面板"""
@@ -33,7 +35,7 @@ def page_quick_dashboard(user, role):
             else:
                 st.metric("上月账期", "未关账", delta="需关账", delta_color="inverse")
         
-        negative_balance_count = s.query(Room).filter(Room.balance < 0, not Room.is_deleted).count()
+        negative_balance_count = s.query(Room).filter(Room.balance < 0, Room.is_deleted.is_(False)).count()
         with col3:
             st.metric("负余额房产", negative_balance_count)
         
@@ -58,28 +60,27 @@ def page_quick_dashboard(user, role):
                 st.rerun()
         
         st.markdown("### 🔎 快捷搜索")
-        search_type = st.radio("搜索类型", ["房号", "业主姓名", "电话"], horizontal=True)
-        search_input = st.text_input("输入搜索关键词")
+        search_input = st.text_input("输入房号、车位号、表号、业主姓名或电话")
         
         if search_input:
-            if search_type == "房号":
-                rooms = s.query(Room).filter(Room.room_number.like(f"%{search_input}%"), not Room.is_deleted).limit(10).all()
-            elif search_type == "业主姓名":
-                rooms = s.query(Room).filter(Room.owner_name.like(f"%{search_input}%"), not Room.is_deleted).limit(10).all()
-            else:
-                rooms = s.query(Room).filter(Room.owner_phone.like(f"%{search_input}%"), not Room.is_deleted).limit(10).all()
+            hits = SearchService.search(s, search_input, limit=10)
+            room_ids = [h.ref_id for h in hits if h.kind == 'room']
+            rooms = {r.id: r for r in s.query(Room.id, Room.balance).filter(Room.id.in_(room_ids))} if room_ids else {}
             
-            if rooms:
-                st.success(f"找到 {len(rooms)} 个结果")
-                for r in rooms:
-                    with st.expander(f"{r.room_number} - {r.owner_name}"):
-                        st.markdown(f"**房号**: {r.room_number} | **业主**: {r.owner_name} | **余额**: {format_money(r.balance)}")
+            if hits:
+                st.success(f"找到 {len(hits)} 个结果")
+                for h in hits:
+                    with st.expander(f"[{h.label}] {h.code} - {h.owner or ''}"):
+                        line = f"**编号**: {h.code} | **业主**: {h.owner or '-'} | **电话**: {mask_sensitive_data(h.phone or '-', role)}"
+                        if h.ref_id in rooms and h.kind == 'room':
+                            line += f" | **余额**: {format_money(rooms[h.ref_id].balance)}"
+                        st.markdown(line)
             else:
                 st.info("未找到匹配的结果")
         
         st.markdown("### 📈 今日数据")
         today_start = datetime.datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
-        today_payment = s.query(func.sum(PaymentRecord.amount)).filter(PaymentRecord.created_at >= today_start).scalar() or 0.0
+        today_payment = PaymentRollupService.net_total(s, today_start.date(), today_start.date())
         today_bills = s.query(func.count(Bill.id)).filter(Bill.created_at >= today_start).scalar() or 0
         today_operations = s.query(func.count(AuditLog.id)).filter(AuditLog.created_at >= today_start).scalar() or 0
         
@@ -2,9 +2,14 @@
 import streamlit as st
 import pandas as pd
 from models.base import SessionLocal
-from models.entities import Room, Bill, FeeType, LedgerEntry, PaymentRecord
-from sqlalchemy.sql import func, desc
+from models.entities import Room, Bill, LedgerEntry
+from sqlalchemy.sql import func
 from utils.helpers import format_money
+from services.cache import bill_periods, fee_type_names
+from services.reconciliation import ReconciliationService, DETAIL_COLUMNS
+from services.rollup import PaymentRollupService
+from services.integrity import IntegrityService
+from config import config
 
 def page_reconciliation_workbench(user, role):
     """收费核对工作台"""
@@ -15,55 +20,39 @@ def page_reconciliation_workbench(user, role):
     
     s = SessionLocal()
     try:
-        periods = s.query(Bill.period).distinct().order_by(desc(Bill.period)).all()
-        period_list = [p[0] for p in periods if p[0]]
+        period_list = bill_periods(s)
         if not period_list:
             st.warning("暂无账单数据")
             return
         
         col1, col2 = st.columns(2)
         selected_period = col1.selectbox("选择账期", period_list)
-        fee_types = s.query(FeeType.name).all()
-        fee_list = ['全部'] + [f[0] for f in fee_types]
+        fee_list = ['全部'] + fee_type_names(s)
         selected_fee = col2.selectbox("费用类型", fee_list)
         
-        query = s.query(Room.room_number, Room.owner_name, Bill.fee_type,
-            func.sum(Bill.amount_due).label('total_due'),
-            func.sum(Bill.amount_paid).label('total_paid'),
-            func.sum(Bill.discount).label('total_discount')
-        ).join(Room, Bill.room_id == Room.id).filter(Bill.period == selected_period)
+        c1, c2, c3 = st.columns([2, 1, 1])
+        sort_by = c1.selectbox("排序字段", [c for c, _ in DETAIL_COLUMNS], index=0)
+        descending = c2.radio("顺序", ["升序", "降序"], horizontal=True) == "降序"
+        page = c3.number_input("页码", min_value=1, value=1, step=1)
         
-        if selected_fee != '全部':
-            query = query.filter(Bill.fee_type == selected_fee)
-        
-        results = query.group_by(Room.room_number, Room.owner_name, Bill.fee_type).all()
-        if not results:
+        summary, page_df, cached = ReconciliationService.workbench(
+            s, selected_period, None if selected_fee == '全部' else selected_fee,
+            sort_by=sort_by, descending=descending, page=int(page), page_size=config.PAGE_SIZE)
+        if not summary["rows"]:
             st.info("该账期暂无数据")
             return
         
-        data = []
-        total_due_sum = total_paid_sum = total_arrears_sum = 0
-        for r in results:
-            due = float(r.total_due or 0)
-            paid = float(r.total_paid or 0)
-            discount = float(r.total_discount or 0)
-            arrears = due - paid - discount
-            status = "✅ 已结清" if abs(arrears) < 0.01 else ("⚠️ 部分已缴" if paid > 0 else "❌ 未缴")
-            data.append({"房号": r.room_number, "业主": r.owner_name, "费用类型": r.fee_type,
-                "应收金额": due, "实收金额": paid, "减免金额": discount, "欠费金额": arrears, "状态": status})
-            total_due_sum += due
-            total_paid_sum += paid
-            total_arrears_sum += arrears
-        
         st.markdown("### 📊 核对汇总")
         k1, k2, k3, k4 = st.columns(4)
-        k1.metric("应收总额", format_money(total_due_sum))
-        k2.metric("实收总额", format_money(total_paid_sum))
-        k3.metric("欠费总额", format_money(total_arrears_sum), delta_color="inverse")
-        k4.metric("收缴率", f"{(total_paid_sum/total_due_sum*100) if total_due_sum > 0 else 0:.1f}%")
+        k1.metric("应收总额", format_money(summary["due"]))
+        k2.metric("实收总额", format_money(summary["paid"]))
+        k3.metric("欠费总额", format_money(summary["arrears"]), delta_color="inverse")
+        k4.metric("收缴率", f"{(summary['paid']/summary['due']*100) if summary['due'] > 0 else 0:.1f}%")
         
         st.markdown("### 📋 明细数据")
-        st.dataframe(pd.DataFrame(data), use_container_width=True, height=400)
+        pages_total = max((summary["rows"] - 1) // config.PAGE_SIZE + 1, 1)
+        st.caption(f"共 {summary['rows']} 行，第 {int(page)}/{pages_total} 页" + ("（已关账，使用缓存结果）" if cached else ""))
+        st.dataframe(page_df, use_container_width=True, height=400)
     finally:
         s.close()
 
@@ -100,10 +89,28 @@ def page_three_way_reconciliation(user, role):
         st.metric("账单应收总额", format_money(total_arrears))
         
         st.markdown("#### 3️⃣ 收款记录统计")
-        payment_stats = s.query(PaymentRecord.pay_method, func.sum(PaymentRecord.amount).label('total')
-            ).group_by(PaymentRecord.pay_method).all()
+        payment_stats = PaymentRollupService.totals_by_method(s)
         if payment_stats:
-            st.dataframe(pd.DataFrame([{"支付方式": ps.pay_method or "未知", "金额": float(ps.total or 0)} for ps in payment_stats]), use_container_width=True)
+            st.dataframe(pd.DataFrame([{"支付方式": method or "未知", "金额": total} for method, total, _ in payment_stats]), use_container_width=True)
+        
+        st.markdown("#### 4️⃣ 逐户核对（房产余额 vs 预收账款）")
+        last_run = ReconciliationService.last_room_run(s)
+        st.caption(f"上次核对: {last_run.strftime('%Y-%m-%d %H:%M:%S') if last_run else '从未执行'}；增量核对仅重算此后有新分录、收款或档案变更的房产")
+        b1, b2 = st.columns(2)
+        res = None
+        if b1.button("🔄 增量核对", use_container_width=True):
+            res = ReconciliationService.reconcile_rooms(s)
+        if b2.button("♻️ 全量重算", use_container_width=True):
+            res = ReconciliationService.reconcile_rooms(s, full=True)
+        if res:
+            st.success(f"{'全量' if res['full'] else '增量'}核对完成：重算 {res['checked']} 户，当前差异 {res['mismatched']} 户")
+        if last_run or res:
+            mismatches = ReconciliationService.room_mismatches(s)
+            if mismatches.empty:
+                st.success("✅ 所有房产余额与预收账款分录一致")
+            else:
+                st.error(f"❌ {len(mismatches)} 户不一致，差异合计 {format_money(mismatches['差异'].sum())}")
+                st.dataframe(mismatches, use_container_width=True, hide_index=True)
     finally:
         s.close()
 
@@ -117,28 +124,27 @@ def page_financial_check(user, role):
     s = SessionLocal()
     try:
         st.markdown("### 🔍 财务数据完整性检查")
-        check_results = []
-        
-        # 检查负余额房产
-        negative_balance_rooms = s.query(Room).filter(Room.balance < 0, Room.is_deleted.is_(False)).all()
-        if negative_balance_rooms:
-            check_results.append({"检查项": "负余额房产", "状态": "⚠️ 警告", "详情": f"发现 {len(negative_balance_rooms)} 个房产余额为负"})
-        else:
-            check_results.append({"检查项": "负余额房产", "状态": "✅ 通过", "详情": "无负余额房产"})
-        
-        # 检查超额缴费
-        overpaid_bills = s.query(Bill).filter(Bill.amount_paid > Bill.amount_due).all()
-        if overpaid_bills:
-            check_results.append({"检查项": "超额缴费", "状态": "⚠️ 警告", "详情": f"发现 {len(overpaid_bills)} 笔账单实缴超过应缴"})
-        else:
-            check_results.append({"检查项": "超额缴费", "状态": "✅ 通过", "详情": "无超额缴费"})
+        st.caption("各检查项在只读连接上并发执行；夜间报告由 scripts/nightly_integrity_check.py 定时生成")
+        results = IntegrityService.run(s)
         
-        st.dataframe(pd.DataFrame(check_results), use_container_width=True)
+        st.dataframe(pd.DataFrame([{"检查项": r.rule.title, "状态": r.status,
+                                    "详情": r.error or (f"发现 {r.count} 条：{r.rule.hint}" if r.count else "无异常"),
+                                    "耗时(ms)": round(r.elapsed * 1000, 1)} for r in results]),
+                     use_container_width=True, hide_index=True)
         
-        passed = len([r for r in check_results if "✅" in r['状态']])
-        warning = len([r for r in check_results if "⚠️" in r['状态']])
-        col1, col2 = st.columns(2)
+        passed = len([r for r in results if r.status.startswith("✅")])
+        warning = len([r for r in results if r.status.startswith("⚠️")])
+        col1, col2, col3 = st.columns(3)
         col1.metric("通过", passed)
         col2.metric("警告", warning, delta_color="inverse")
+        col3.metric("失败", len(results) - passed - warning, delta_color="inverse")
+        
+        for r in results:
+            if r.sample:
+                with st.expander(f"{r.rule.title}：{r.count} 条（样本 {len(r.sample)} 条）"):
+                    st.dataframe(pd.DataFrame(r.sample, columns=list(r.columns)), use_container_width=True, hide_index=True)
+        
+        st.download_button("📥 下载检查报告", IntegrityService.report(results).encode("utf-8"),
+                           file_name="integrity_report.md", mime="text/markdown")
     finally:
         s.close()
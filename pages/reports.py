@@ -3,8 +3,10 @@ import streamlit as st
 import pandas as pd
 import datetime
 from models.base import SessionLocal
-from models.entities import Room, Bill, PaymentRecord
+from models.entities import Room, Bill
 from sqlalchemy.sql import func, desc
+from services.reports import FinancialReportService
+from services.rollup import PaymentRollupService
 from utils.helpers import format_money
 
 def page_payment_reconciliation(user, role):
@@ -20,25 +22,15 @@ def page_payment_reconciliation(user, role):
         start_date = col1.date_input("开始日期", value=datetime.datetime.now().replace(day=1))
         end_date = col2.date_input("结束日期", value=datetime.datetime.now())
         
-        start_datetime = datetime.datetime.combine(start_date, datetime.time.min)
-        end_datetime = datetime.datetime.combine(end_date, datetime.time.max)
-        
-        payments = s.query(PaymentRecord).filter(
-            PaymentRecord.created_at >= start_datetime, PaymentRecord.created_at <= end_datetime
-        ).order_by(PaymentRecord.created_at).all()
-        
-        if not payments:
+        # 按支付方式的统计直接读取收款日汇总
+        stats = PaymentRollupService.totals_by_method(s, start_date, end_date)
+        if not stats:
             st.info("该期间无收款记录")
             return
         
         st.markdown("### 💰 按支付方式统计")
-        payment_by_method = {}
-        for p in payments:
-            method = p.pay_method or "未知"
-            payment_by_method[method] = payment_by_method.get(method, 0.0) + p.amount
-        
-        st.dataframe(pd.DataFrame([{"支付方式": m, "金额": a} for m, a in payment_by_method.items()]), use_container_width=True)
-        st.metric("收款总额", format_money(sum(p.amount for p in payments)), delta=f"共 {len(payments)} 笔")
+        st.dataframe(pd.DataFrame([{"支付方式": m or "未知", "金额": a} for m, a, _ in stats]), use_container_width=True)
+        st.metric("收款总额", format_money(sum(a for _, a, _ in stats)), delta=f"共 {sum(c for _, _, c in stats)} 笔")
     finally:
         s.close()
 
@@ -91,44 +83,31 @@ def page_financial_reports(user, role):
             start_period = col1.text_input("开始会计期", value=(datetime.datetime.now() - datetime.timedelta(days=90)).strftime("%Y-%m"))
             end_period = col2.text_input("结束会计期", value=datetime.datetime.now().strftime("%Y-%m"))
             
-            # 使用accounting_period进行财务统计，兼容旧数据（accounting_period为空时使用period）
-            from sqlalchemy import or_, and_
-            period_filter = or_(
-                and_(Bill.accounting_period.isnot(None), Bill.accounting_period >= start_period, Bill.accounting_period <= end_period),
-                and_(Bill.accounting_period.is_(None), Bill.period >= start_period, Bill.period <= end_period)
-            )
-            revenue_due = s.query(func.sum(Bill.amount_due)).filter(period_filter).scalar() or 0.0
-            discount = s.query(func.sum(Bill.discount)).filter(period_filter).scalar() or 0.0
-            revenue_received = s.query(func.sum(Bill.amount_paid)).filter(period_filter).scalar() or 0.0
-            
-            st.dataframe(pd.DataFrame([
-                {"项目": "应收收入", "金额": revenue_due},
-                {"项目": "减：减免金额", "金额": discount},
-                {"项目": "已收款金额", "金额": revenue_received},
-                {"项目": "未收款金额", "金额": revenue_due - discount - revenue_received}
-            ]), use_container_width=True)
+            st.dataframe(FinancialReportService.income_statement(s, start_period, end_period), use_container_width=True)
         
         with tab2:
             st.markdown("### 📋 会计期对比分析")
-            # 优先使用accounting_period，兼容旧数据
-            periods = s.query(func.coalesce(Bill.accounting_period, Bill.period)).distinct().order_by(func.coalesce(Bill.accounting_period, Bill.period)).all()
-            period_list = [p[0] for p in periods if p[0] and len(p[0]) == 7]  # 只取YYYY-MM格式
+            period_list = FinancialReportService.periods(s)
             if len(period_list) >= 2:
                 col1, col2 = st.columns(2)
                 period1 = col1.selectbox("会计期1", period_list, index=max(0, len(period_list)-2))
                 period2 = col2.selectbox("会计期2", period_list, index=len(period_list)-1)
                 
-                def get_data(p):
-                    pf = or_(Bill.accounting_period == p, and_(Bill.accounting_period.is_(None), Bill.period == p))
-                    due = s.query(func.sum(Bill.amount_due)).filter(pf).scalar() or 0.0
-                    paid = s.query(func.sum(Bill.amount_paid)).filter(pf).scalar() or 0.0
-                    return {"应收": due, "实收": paid, "收缴率": (paid/due*100) if due > 0 else 0}
-                
-                d1, d2 = get_data(period1), get_data(period2)
+                totals = FinancialReportService.period_totals(s, periods=[period1, period2])
+                totals = totals.reindex([period1, period2], fill_value=0.0)
                 st.dataframe(pd.DataFrame([
-                    {"指标": "应收金额", period1: d1["应收"], period2: d2["应收"]},
-                    {"指标": "实收金额", period1: d1["实收"], period2: d2["实收"]},
-                    {"指标": "收缴率(%)", period1: d1["收缴率"], period2: d2["收缴率"]}
+                    {"指标": "应收金额", period1: totals.at[period1, "应收"], period2: totals.at[period2, "应收"]},
+                    {"指标": "实收金额", period1: totals.at[period1, "实收"], period2: totals.at[period2, "实收"]},
+                    {"指标": "收缴率(%)", period1: totals.at[period1, "收缴率(%)"], period2: totals.at[period2, "收缴率(%)"]}
                 ]), use_container_width=True)
+                
+                st.markdown("### 📈 多期趋势")
+                n = len(period_list)
+                if n > 2:
+                    n = st.slider("期数", min_value=2, max_value=min(36, n), value=min(12, n))
+                trend = FinancialReportService.period_totals(s, start=period_list[-n], end=period_list[-1])
+                st.line_chart(trend[["应收", "实收", "未收"]])
+                st.line_chart(trend[["收缴率(%)"]])
+                st.dataframe(trend, use_container_width=True)
     finally:
         s.close()
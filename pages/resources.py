@@ -1,10 +1,13 @@
 """资源档案管理页面"""
 import streamlit as st
 import pandas as pd
-import uuid
-from models import SessionLocal, Room, Bill, FeeType
+from models import SessionLocal, Room, Bill
 from services.audit import AuditService
 from utils.transaction import transaction_scope
+from services.cache import RefCache, BILL_PERIODS, fee_type_names
+from services.room_directory import RoomDirectory
+from services.room_import import RoomImportService
+from services.search import SearchService
 
 
 def page_resources(user, role):
@@ -17,11 +20,14 @@ def page_resources(user, role):
         t1, t2, t3, t4 = st.tabs(["🔍 查询/维护", "➕ 入伙/新增", "📥 批量导入", "↩️ 批次回滚"])
         
         with t1:
-            search_key = st.text_input("搜索房号", placeholder="输入关键词...")
-            query = s.query(Room).filter(Room.is_deleted.is_(False))
+            search_key = st.text_input("搜索房号/业主/电话", placeholder="输入关键词...")
             if search_key:
-                query = query.filter(Room.room_number.like(f"%{search_key}%"))
-            rooms = query.limit(50).all()
+                # 全文索引按相关度返回房产ID，再按该顺序加载档案
+                ids = [h.ref_id for h in SearchService.search(s, search_key, limit=50, kinds=('room',))]
+                by_id = {r.id: r for r in s.query(Room).filter(Room.id.in_(ids))} if ids else {}
+                rooms = [by_id[i] for i in ids if i in by_id]
+            else:
+                rooms = s.query(Room).filter(Room.is_deleted.is_(False)).limit(50).all()
             st.dataframe(pd.DataFrame([{
                 "房号": r.room_number, "业主": r.owner_name, 
                 "电话": getattr(r, 'owner_phone', ''), "面积": r.area,
@@ -31,7 +37,7 @@ def page_resources(user, role):
             } for r in rooms]), use_container_width=True)
         
         with t2:
-            fee_types = [f.name for f in s.query(FeeType).all()]
+            fee_types = fee_type_names(s)
             if 'room_fee_items' not in st.session_state:
                 st.session_state.room_fee_items = [{"name": fee_types[0] if fee_types else "", "std": "0"}]
             
@@ -97,150 +103,29 @@ def page_resources(user, role):
             
             if f and st.button("开始导入"):
                 try:
-                    df = pd.read_csv(f) if f.name.lower().endswith('.csv') else pd.read_excel(f)
-                    batch_id = str(uuid.uuid4())
-                    
+                    df = RoomImportService.read(f, f.name)
                     if dry_run:
+                        res = RoomImportService.run(s, df, user, dry_run=True)
                         st.warning("试运行不入库，供预览检验")
-                        st.dataframe(df.head(20), use_container_width=True)
                     else:
-                        from models import PaymentRecord, LedgerEntry
                         with transaction_scope() as (s_trx, audit_buffer):
-                            apply_count = 0
-                            bill_count = 0
-                            prepay_total = 0
-                            for _, row in df.iterrows():
-                                rn = str(row.get('房号','')).strip()
-                                if not rn:
-                                    continue
-                                r = s_trx.query(Room).filter_by(room_number=rn).first()
-                                if not r:
-                                    r = Room(room_number=rn, property_id=1)
-                                    s_trx.add(r)
-                                    s_trx.flush()
-                                r.owner_name = str(row.get('业主', r.owner_name or ''))
-                                r.owner_phone = str(row.get('业主电话', r.owner_phone or ''))
-                                try:
-                                    r.area = float(row.get('面积', r.area or 0))
-                                except Exception:
-                                    pass
-                                # 预缴金额设置到余额，并创建会计分录
-                                try:
-                                    prepay = float(row.get('预缴金额', 0) or 0)
-                                    if prepay > 0:
-                                        r.balance = (r.balance or 0) + prepay
-                                        prepay_total += prepay
-                                        # 创建预收账款会计分录（贷方，direction=-1）
-                                        import datetime
-                                        ledger = LedgerEntry(
-                                            room_id=r.id,
-                                            account_id=3,  # 预收账款科目
-                                            amount=prepay,
-                                            period=datetime.datetime.now().strftime('%Y-%m'),
-                                            direction=-1,  # 贷方
-                                            details=f'期初导入-{r.room_number}预缴-操作员:{user}'
-                                        )
-                                        s_trx.add(ledger)
-                                except Exception:
-                                    pass
-                                # 费用项目设置
-                                fee_name = str(row.get('费用项目', '')).strip()
-                                try:
-                                    fee_std = float(row.get('项目月标准金额', 0) or 0)
-                                except Exception:
-                                    fee_std = 0
-                                if fee_name:
-                                    if not r.fee1_name:
-                                        r.fee1_name, r.fee1_std = fee_name, fee_std
-                                    elif not r.fee2_name and r.fee1_name != fee_name:
-                                        r.fee2_name, r.fee2_std = fee_name, fee_std
-                                    elif not r.fee3_name and r.fee1_name != fee_name and r.fee2_name != fee_name:
-                                        r.fee3_name, r.fee3_std = fee_name, fee_std
-                                # 历史欠费生成账单 - 添加数据验证
-                                def safe_float(val, field_name):
-                                    """安全转换为浮点数，过滤无效值"""
-                                    if pd.isna(val) or val == '' or val is None:
-                                        return 0.0
-                                    val_str = str(val).strip()
-                                    # 过滤明显无效的值
-                                    if val_str.lower() in ['nan', 'none', 'null', '[object object]', 'undefined']:
-                                        st.warning(f"房号{rn}的{field_name}包含无效值'{val_str}'，已忽略")
-                                        return 0.0
-                                    try:
-                                        return float(val_str)
-                                    except (ValueError, TypeError):
-                                        st.warning(f"房号{rn}的{field_name}无法转换为数字'{val_str}'，已忽略")
-                                        return 0.0
-                                
-                                arrears = safe_float(row.get('历史欠费', 0), '历史欠费')
-                                paid = safe_float(row.get('已缴金额', 0), '已缴金额')
-                                discount = safe_float(row.get('减免金额', 0), '减免金额')
-                                period_start = str(row.get('欠费周期起', '')).strip()
-                                period_end = str(row.get('欠费周期终', '')).strip()
-                                if arrears > 0 and fee_name and period_start:
-                                    # 解析周期，拆分为单月账单
-                                    import datetime as dt
-                                    def parse_period(p):
-                                        """解析日期字符串为年月"""
-                                        p = p.strip()
-                                        if len(p) >= 10:  # 2025-08-01格式
-                                            return p[:7]
-                                        elif len(p) == 7:  # 2025-08格式
-                                            return p
-                                        return None
-                                    
-                                    start_ym = parse_period(period_start)
-                                    end_ym = parse_period(period_end) if period_end else start_ym
-                                    
-                                    # 生成月份列表
-                                    months = []
-                                    if start_ym and end_ym:
-                                        try:
-                                            sy, sm = int(start_ym[:4]), int(start_ym[5:7])
-                                            ey, em = int(end_ym[:4]), int(end_ym[5:7])
-                                            while (sy, sm) <= (ey, em):
-                                                months.append(f"{sy:04d}-{sm:02d}")
-                                                sm += 1
-                                                if sm > 12:
-                                                    sm = 1
-                                                    sy += 1
-                                        except:
-                                            months = [start_ym]
-                                    else:
-                                        months = [start_ym] if start_ym else []
-                                    
-                                    # 按月份数量平分金额
-                                    month_count = len(months) if months else 1
-                                    monthly_due = round(arrears / month_count, 2)
-                                    monthly_paid = round(paid / month_count, 2)
-                                    monthly_discount = round(discount / month_count, 2)
-                                    
-                                    for i, month in enumerate(months):
-                                        # 最后一个月处理余数
-                                        if i == month_count - 1:
-                                            m_due = arrears - monthly_due * (month_count - 1)
-                                            m_paid = paid - monthly_paid * (month_count - 1)
-                                            m_disc = discount - monthly_discount * (month_count - 1)
-                                        else:
-                                            m_due, m_paid, m_disc = monthly_due, monthly_paid, monthly_discount
-                                        
-                                        status = '已缴' if m_paid >= m_due - m_disc else '未缴'
-                                        bill = Bill(room_id=r.id, fee_type=fee_name, period=month,
-                                                   accounting_period=month,
-                                                   amount_due=m_due, amount_paid=m_paid, discount=m_disc,
-                                                   status=status, batch_id=batch_id, operator=user, remark='期初导入')
-                                        s_trx.add(bill)
-                                        bill_count += 1
-                                    
-                                    # 已缴金额创建PaymentRecord（只创建一条汇总记录）
-                                    if paid > 0:
-                                        pr = PaymentRecord(room_id=r.id, amount=paid, biz_type='缴费',
-                                                          pay_method='期初导入', operator=user, remark=f'期初导入-{fee_name}')
-                                        s_trx.add(pr)
-                                apply_count += 1
-                            AuditService.log_deferred(s_trx, audit_buffer, user, "批量导入", "房档案", 
-                                                     {"batch": batch_id, "rows": apply_count, "bills": bill_count, "prepay": prepay_total})
-                        st.success(f"导入完成，批次ID: {batch_id}，房产{apply_count}条，账单{bill_count}条，预缴金额{prepay_total:.2f}元")
+                            res = RoomImportService.run(s_trx, df, user)
+                            AuditService.log_deferred(s_trx, audit_buffer, user, "批量导入", "房档案",
+                                                      {"batch": res.batch_id, "rows": res.rows, "bills": res.bills,
+                                                       "prepay": res.prepay})
+                        RefCache.invalidate(s, BILL_PERIODS)
+                        RoomDirectory.invalidate(s)
+                        st.success(f"导入完成，批次ID: {res.batch_id}，房产{res.rows}条，账单{res.bills}条，预缴金额{res.prepay:.2f}元")
+                    c1, c2, c3, c4 = st.columns(4)
+                    c1.metric("新增房产", res.new_rooms)
+                    c2.metric("更新房产", res.updated_rooms)
+                    c3.metric("拆分账单", res.bills)
+                    c4.metric("已缴收款", res.payments)
+                    if len(res.issues):
+                        st.warning(f"共 {len(res.issues)} 处数据问题（已忽略或跳过）")
+                        st.dataframe(res.issues, use_container_width=True, hide_index=True)
+                    if dry_run:
+                        st.dataframe(res.preview.head(50), use_container_width=True, hide_index=True)
                 except Exception as e:
                     st.error(str(e))
         
@@ -249,6 +134,7 @@ def page_resources(user, role):
             if st.button("回滚执行") and bid:
                 cnt = s.query(Bill).filter(Bill.batch_id == bid).delete()
                 s.commit()
+                RefCache.invalidate(s, BILL_PERIODS)
                 AuditService.log(user, "批次回滚", "账单", {"batch": bid, "count": cnt})
                 st.success(f"已回滚账单 {cnt} 条")
     finally:
@@ -5,13 +5,16 @@ import datetime
 import time
 import os
 import shutil
-import bcrypt
 from models.base import SessionLocal, engine
 from models.entities import Room, Bill, PaymentRecord, LedgerEntry, AuditLog, User, Account, DataChangeHistory, DiscountRequest, Invoice, PeriodClose, RoomFeeStandard
 from sqlalchemy.sql import desc
 from sqlalchemy import text
 from config import Config
 from services.audit import AuditService
+from services.auth import AuthService
+from services.cache import RefCache, BILL_PERIODS
+from services.rollup import PaymentRollupService
+from services.room_directory import RoomDirectory
 
 def page_backup_management(user, role):
     """数据备份管理"""
@@ -106,6 +109,19 @@ def page_system_monitor(user, role):
         recent_logs = s.query(AuditLog).order_by(desc(AuditLog.created_at)).limit(20).all()
         if recent_logs:
             st.dataframe(pd.DataFrame([{"时间": log.created_at.strftime("%Y-%m-%d %H:%M:%S"), "用户": log.user, "操作": log.action, "目标": log.target} for log in recent_logs]), use_container_width=True)
+        
+        st.markdown("### 🧹 会话清理")
+        if st.button("清理过期会话"):
+            purged = AuthService.purge_expired_sessions(s)
+            AuditService.log(user, "清理过期会话", "session_tokens", {"purged": purged})
+            st.success(f"✅ 已清理 {purged} 条过期会话")
+        
+        st.markdown("### 📅 收款日汇总")
+        st.caption("日汇总随收款记录自动维护；数据被绕过应用修改后可在此全量重建")
+        if st.button("重建收款日汇总"):
+            rows = PaymentRollupService.rebuild(s)
+            AuditService.log(user, "重建收款日汇总", "daily_payment_rollup", {"rows": rows})
+            st.success(f"✅ 已重建 {rows} 行日汇总")
     finally:
         s.close()
 
@@ -194,6 +210,8 @@ def page_clear_test_data(user, role):
                     s.query(RoomFeeStandard).delete()
                     s.query(Room).delete()
                     s.commit()
+                    RefCache.invalidate(s, BILL_PERIODS)
+                    RoomDirectory.invalidate(s)
                     AuditService.log(user, "清除测试数据", "全部", {})
                     st.success("✅ 测试数据清除成功！")
                     time.sleep(2)
@@ -233,18 +251,15 @@ def page_change_password(user, role):
                     st.error("❌ 两次输入的新密码不一致")
                     return
                 
-                try:
-                    if not bcrypt.checkpw(old_password.encode(), current_user.password_hash.encode()):
-                        st.error("❌ 当前密码不正确")
-                        return
-                except Exception:
-                    st.error("❌ 密码验证失败")
+                if not AuthService.check_password(old_password, current_user.password_hash):
+                    st.error("❌ 当前密码不正确")
                     return
                 
                 try:
-                    new_password_hash = bcrypt.hashpw(new_password.encode(), bcrypt.gensalt()).decode()
+                    new_password_hash = AuthService.hash_password(new_password)
                     current_user.password_hash = new_password_hash
                     s.commit()
+                    AuthService.invalidate_user(current_user.id)
                     AuditService.log(user, "修改密码", f"用户 {user}", {"result": "Success"})
                     st.success("✅ 密码修改成功！请使用新密码重新登录")
                 except Exception as e:
@@ -0,0 +1,65 @@
+"""页面公共组件"""
+import html
+import os
+from typing import Optional
+import streamlit as st
+from services.export import ExportService, EXPORTS, FORMATS
+from services.room_directory import RoomDirectory, RoomEntry
+from utils.helpers import format_money
+
+
+def room_picker(s, key: str, label: str = "搜索/选择房号", limit: int = 50) -> Optional[RoomEntry]:
+    """房号输入联想：按前缀从房产目录检索，只把匹配的前 limit 条发给前端"""
+    text = st.text_input(label, key=f"{key}_q", placeholder="输入房号或业主姓名开头...")
+    matches = RoomDirectory.search(s, text, limit=limit)
+    if not matches:
+        st.warning("未找到匹配房产" if text else "暂无档案数据")
+        return None
+    by_id = {m.id: m for m in matches}
+    rid = st.selectbox(f"匹配结果（前 {limit} 条）" if len(matches) >= limit else "匹配结果", list(by_id),
+                       format_func=lambda i: f"{by_id[i].room_number} | {by_id[i].owner_name} | {format_money(by_id[i].balance)}",
+                       key=f"{key}_sel")
+    return by_id.get(rid)
+
+
+def render_pager(pager, has_more, next_cursor, key, caption: str = ""):
+    """渲染上一页/下一页按钮"""
+    c1, c2, c3 = st.columns([1, 1, 4])
+    if c1.button("⬅️ 上一页", key=f"{key}_prev", disabled=not pager.has_prev):
+        pager.prev()
+        st.rerun()
+    if c2.button("下一页 ➡️", key=f"{key}_next", disabled=not has_more):
+        pager.next(next_cursor)
+        st.rerun()
+    c3.caption(f"第 {pager.page_no} 页{caption}")
+
+
+def export_panel(s, key: str, datasets=None, bill_filter=None):
+    """导出面板：选择数据与格式，流式写入文件后以静态服务链接下载，页面重跑不读取文件内容"""
+    datasets = datasets or list(EXPORTS)
+    c1, c2 = st.columns(2)
+    dataset = c1.selectbox("导出数据", datasets, format_func=lambda d: EXPORTS[d].title, key=f"{key}_ds")
+    fmt = c2.selectbox("文件格式", list(FORMATS), key=f"{key}_fmt")
+    if st.button("📥 开始导出", key=f"{key}_run"):
+        previous = st.session_state.pop(f"{key}_result", None)
+        if previous:
+            ExportService.discard(previous)
+        with st.spinner("正在导出..."):
+            st.session_state[f"{key}_result"] = ExportService.export(s, dataset, fmt, bill_filter)
+    result = st.session_state.get(f"{key}_result")
+    if not result:
+        return
+    if not os.path.exists(result.path):
+        st.session_state.pop(f"{key}_result", None)
+        st.info("导出文件已过期，请重新导出")
+    elif not result.url:
+        ExportService.discard(result)
+        st.session_state.pop(f"{key}_result", None)
+        st.warning("导出文件超过链接下载上限，请缩小筛选范围或改用 Parquet 格式")
+    else:
+        st.markdown(f'<a href="{html.escape(result.url)}" download="{html.escape(result.filename)}">'
+                    f'⬇️ 下载 {html.escape(result.filename)}（{result.rows:,} 行）</a>', unsafe_allow_html=True)
+        if st.button("🗑️ 已下载，删除文件", key=f"{key}_done"):
+            ExportService.discard(result)
+            st.session_state.pop(f"{key}_result", None)
+            st.rerun()
@@ -0,0 +1,45 @@
+#!/usr/bin/env python3
+"""登录吞吐压测脚本 - 比较不同 bcrypt 线程池大小下每秒可完成的登录数
+
+用法: python scripts/bench_login.py [--logins 64] [--sessions 32] [--pools 1,2,4,8] [--rounds 12]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.auth import AuthService
+
+
+def bench(pool_size: int, logins: int, sessions: int, hashed: str) -> float:
+    """模拟 sessions 个并发会话共完成 logins 次密码校验，返回每秒登录数"""
+    AuthService.configure_bcrypt_pool(pool_size)
+    # 预热线程池
+    AuthService.check_password("bench-password", hashed)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=sessions) as callers:
+        results = list(callers.map(lambda _: AuthService.check_password("bench-password", hashed), range(logins)))
+    elapsed = time.perf_counter() - start
+    assert all(results)
+    return logins / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="登录吞吐压测")
+    parser.add_argument("--logins", type=int, default=64, help="总登录次数")
+    parser.add_argument("--sessions", type=int, default=32, help="并发会话数（模拟交接班同时登录）")
+    parser.add_argument("--pools", default="1,2,4,8", help="待比较的线程池大小，逗号分隔")
+    parser.add_argument("--rounds", type=int, default=None, help="bcrypt 工作因子，默认取配置")
+    args = parser.parse_args()
+
+    hashed = AuthService.hash_password("bench-password", rounds=args.rounds)
+    print(f"bcrypt cost={hashed.split('$')[2]}, CPU={os.cpu_count()}, 登录数={args.logins}, 并发会话={args.sessions}")
+    print(f"{'线程池':>6} | {'登录/秒':>8}")
+    for size in [int(x) for x in args.pools.split(",") if x.strip()]:
+        print(f"{size:>6} | {bench(size, args.logins, args.sessions, hashed):>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""分析快照导出脚本 - 可通过cron每晚执行，按 id 水位增量追加 Parquet 分区
+
+用法: python scripts/export_snapshot.py [--property CODE ...] [--out DIR] [--full] [--tables bills ledger_entries]
+"""
+import argparse
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from models.base import get_session_factory
+from services.bootstrap import bootstrap
+from services.snapshot import SnapshotService, SNAPSHOT_TABLES
+
+
+def main():
+    parser = argparse.ArgumentParser(description="导出 Parquet 分析快照")
+    parser.add_argument("--property", nargs="*", default=[None], help="物业编码，可多个，默认主库")
+    parser.add_argument("--out", default=config.SNAPSHOT_DIR, help="输出目录")
+    parser.add_argument("--full", action="store_true", help="忽略水位全量重建")
+    parser.add_argument("--tables", nargs="*", choices=list(SNAPSHOT_TABLES), default=None, help="仅导出指定表")
+    args = parser.parse_args()
+
+    for code in args.property:
+        bootstrap(code, seed=False)
+        s = get_session_factory(code)()
+        try:
+            counts = SnapshotService.export(s, code, args.out, args.tables, args.full)
+        finally:
+            s.close()
+        print(f"[{code or 'main'}] " + ", ".join(f"{t}: {n}" for t, n in counts.items()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,47 @@
+#!/usr/bin/env python3
+"""夜间财务完整性检查脚本 - 可通过cron定时执行，例如每天凌晨3点：
+
+    0 3 * * * cd /home/ubuntu/erp/erp_modular && python scripts/nightly_integrity_check.py
+
+报告写入 ERP_INTEGRITY_REPORT_DIR（默认 reports/），存在异常时退出码为 1
+"""
+import argparse
+import datetime
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from config import config
+from models.base import get_session_factory
+from services.bootstrap import bootstrap
+from services.integrity import IntegrityService
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="财务完整性夜间检查")
+    parser.add_argument("--property", default=None, help="物业编码，默认主库")
+    parser.add_argument("--output-dir", default=config.INTEGRITY_REPORT_DIR, help="报告输出目录")
+    args = parser.parse_args()
+
+    bootstrap(args.property, seed=False)
+    s = get_session_factory(args.property)()
+    try:
+        results = IntegrityService.run(s)
+    finally:
+        s.close()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    stamp = datetime.datetime.now().strftime("%Y%m%d")
+    path = os.path.join(args.output_dir, f"integrity_{args.property or 'main'}_{stamp}.md")
+    with open(path, "w", encoding="utf-8") as f:
+        f.write(IntegrityService.report(results))
+
+    issues = [r for r in results if r.count or r.error]
+    for r in results:
+        print(f"{r.status} {r.rule.title}: {r.count} ({r.elapsed * 1000:.1f} ms)")
+    print(f"报告已生成: {path}")
+    return 1 if issues else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
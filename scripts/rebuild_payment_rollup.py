@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""收款日汇总重建脚本 - 供夜间任务或数据修复后执行
+
+用法: python scripts/rebuild_payment_rollup.py [--property CODE] [--start 2025-01-01] [--end 2025-12-31]
+"""
+import argparse
+import datetime
+import os
+import sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models.base import get_session_factory
+from services.bootstrap import bootstrap
+from services.rollup import PaymentRollupService
+
+
+def _date(value: str) -> datetime.date:
+    return datetime.datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="重建收款日汇总")
+    parser.add_argument("--property", default=None, help="物业编码，默认主库")
+    parser.add_argument("--start", type=_date, default=None, help="起始日期 YYYY-MM-DD")
+    parser.add_argument("--end", type=_date, default=None, help="截止日期 YYYY-MM-DD")
+    args = parser.parse_args()
+
+    bootstrap(args.property, seed=False)
+    s = get_session_factory(args.property)()
+    try:
+        rows = PaymentRollupService.rebuild(s, args.start, args.end)
+        print(f"已重建 {rows} 行日汇总")
+    finally:
+        s.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@
 from .audit import AuditService
 from .auth import AuthService
 from .billing import BillingService
+from .change_tracking import ChangeTracker
 from .ledger import LedgerService
 
-__all__ = ['AuditService', 'AuthService', 'BillingService', 'LedgerService']
+__all__ = ['AuditService', 'AuthService', 'BillingService', 'ChangeTracker', 'LedgerService']
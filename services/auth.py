@@ -1,72 +1,139 @@
 """认证服务模块"""
 import datetime
+import hashlib
 import secrets
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from typing import NamedTuple, Optional
 import bcrypt
-from typing import Optional
 from config import config, get_logger
-from models import SessionLocal, User, LoginFail, SessionToken
+from models import SessionLocal, User, SessionToken
+from .login_limiter import LoginLimiter
 
 logger = get_logger(__name__)
 
 
+class SessionInfo(NamedTuple):
+    """会话恢复所需的用户信息"""
+    user_id: int
+    username: str
+    role: str
+    property_id: Optional[int]
+    expires_at: datetime.datetime
+
+
+def _token_key(token: str) -> str:
+    """缓存只保存 token 的摘要，不保存原始 token"""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+class _SessionCache:
+    """进程内 TTL + LRU 会话缓存"""
+
+    def __init__(self, max_size: int, ttl: int):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, token: str) -> Optional[SessionInfo]:
+        key = _token_key(token)
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return None
+            info, cached_at = item
+            if time.monotonic() - cached_at > self.ttl or info.expires_at < datetime.datetime.now():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return info
+
+    def put(self, token: str, info: SessionInfo):
+        key = _token_key(token)
+        with self._lock:
+            self._data[key] = (info, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def discard(self, token: str):
+        with self._lock:
+            self._data.pop(_token_key(token), None)
+
+    def discard_user(self, user_id: int):
+        with self._lock:
+            for key in [k for k, (info, _) in self._data.items() if info.user_id == user_id]:
+                del self._data[key]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+_session_cache = _SessionCache(config.SESSION_CACHE_SIZE, config.SESSION_CACHE_TTL)
+_sweeper_lock = threading.Lock()
+_sweeper_thread = None
+
+# bcrypt 计算会释放 GIL，放入有界线程池以限制并发登录时的 CPU 占用
+_bcrypt_pool = ThreadPoolExecutor(max_workers=config.BCRYPT_WORKERS, thread_name_prefix="bcrypt")
+
+
 class AuthService:
     @staticmethod
-    def hash_password(password: str) -> str:
-        return bcrypt.hashpw(password.encode(), bcrypt.gensalt()).decode()
+    def configure_bcrypt_pool(workers: int):
+        """调整 bcrypt 线程池大小（用于压测或运维调优）"""
+        global _bcrypt_pool
+        old_pool = _bcrypt_pool
+        _bcrypt_pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="bcrypt")
+        old_pool.shutdown(wait=False)
+
+    @staticmethod
+    def hash_password(password: str, rounds: int = None) -> str:
+        salt = bcrypt.gensalt(rounds or config.BCRYPT_ROUNDS)
+        return _bcrypt_pool.submit(bcrypt.hashpw, password.encode(), salt).result().decode()
 
     @staticmethod
     def check_password(plain: str, hashed: str) -> bool:
         try:
-            return bcrypt.checkpw(plain.encode(), hashed.encode())
+            return _bcrypt_pool.submit(bcrypt.checkpw, plain.encode(), hashed.encode()).result()
         except Exception as e:
             logger.error(f"密码校验失败: {e}")
             return False
 
     @staticmethod
-    def is_locked(username: str) -> bool:
-        s = SessionLocal()
+    def needs_rehash(hashed: str) -> bool:
+        """哈希的工作因子与当前配置不一致时需要重算"""
         try:
-            rec = s.query(LoginFail).filter_by(username=username).first()
-            if not rec or not rec.locked_until:
-                return False
-            return datetime.datetime.now() < rec.locked_until
-        finally:
-            s.close()
+            return int(hashed.split('$')[2]) != config.BCRYPT_ROUNDS
+        except (IndexError, ValueError):
+            return True
 
     @staticmethod
-    def record_fail(username: str):
-        s = SessionLocal()
-        try:
-            rec = s.query(LoginFail).filter_by(username=username).first()
-            now = datetime.datetime.now()
-            if not rec:
-                rec = LoginFail(username=username, fail_count=1, updated_at=now)
-                s.add(rec)
-            else:
-                if rec.locked_until and now < rec.locked_until:
-                    pass
-                else:
-                    rec.fail_count += 1
-                    rec.updated_at = now
-                    if rec.fail_count >= config.LOGIN_MAX_FAIL:
-                        rec.locked_until = now + datetime.timedelta(minutes=config.LOCK_MINUTES)
-                        logger.warning(f"账号 {username} 已锁定 {config.LOCK_MINUTES} 分钟")
+    def authenticate(s, username: str, password: str) -> Optional[User]:
+        """校验账号密码，工作因子变更时透明升级哈希"""
+        user = s.query(User).filter_by(username=username).first()
+        if not user or not AuthService.check_password(password, user.password_hash):
+            return None
+        if AuthService.needs_rehash(user.password_hash):
+            user.password_hash = AuthService.hash_password(password)
             s.commit()
-            logger.info(f"登录失败记录: {username}, 次数: {rec.fail_count}")
-        finally:
-            s.close()
+            logger.info(f"用户 {username} 密码哈希已升级至 cost={config.BCRYPT_ROUNDS}")
+        return user
+
+    @staticmethod
+    def is_locked(username: str, ip: Optional[str] = None) -> bool:
+        return LoginLimiter.is_locked(username, ip)
+
+    @staticmethod
+    def record_fail(username: str, ip: Optional[str] = None):
+        LoginLimiter.record_fail(username, ip)
 
     @staticmethod
     def clear_fail(username: str):
-        s = SessionLocal()
-        try:
-            rec = s.query(LoginFail).filter_by(username=username).first()
-            if rec:
-                rec.fail_count = 0
-                rec.locked_until = None
-                s.commit()
-        finally:
-            s.close()
+        LoginLimiter.clear_fail(username)
 
     @staticmethod
     def create_session(s, user_id: int, hours: int = 8) -> str:
@@ -85,18 +152,97 @@ class AuthService:
         if not rec:
             return None
         if rec.expires_at < datetime.datetime.now():
-            s.delete(rec)
-            s.commit()
+            AuthService.clear_token(s, token=token)
             return None
         return s.query(User).get(rec.user_id)
 
+    @staticmethod
+    def resolve_session(token: str) -> Optional[SessionInfo]:
+        """恢复会话：优先命中进程内缓存，未命中时查库并回填缓存"""
+        if not token:
+            return None
+        info = _session_cache.get(token)
+        if info:
+            return info
+        s = SessionLocal()
+        try:
+            rec = s.query(SessionToken.user_id, SessionToken.expires_at).filter_by(token=token).first()
+            if not rec:
+                return None
+            if rec.expires_at < datetime.datetime.now():
+                AuthService.clear_token(s, token=token)
+                return None
+            user = s.get(User, rec.user_id)
+            if not user:
+                return None
+            info = SessionInfo(user.id, user.username, user.role, user.property_id, rec.expires_at)
+            _session_cache.put(token, info)
+            return info
+        finally:
+            s.close()
+
+    @staticmethod
+    def invalidate_user(user_id: int):
+        """用户角色、归属或密码变更后使其缓存会话失效"""
+        if user_id:
+            _session_cache.discard_user(user_id)
+
     @staticmethod
     def clear_token(s, token: str = None, user_id: int = None):
         q = s.query(SessionToken)
         if token:
             q = q.filter_by(token=token)
+            _session_cache.discard(token)
         elif user_id:
             q = q.filter_by(user_id=user_id)
-        for r in q.all():
-            s.delete(r)
+            _session_cache.discard_user(user_id)
+        else:
+            _session_cache.clear()
+        q.delete(synchronize_session=False)
         s.commit()
+
+    @staticmethod
+    def purge_expired_sessions(s=None, batch_size: int = None) -> int:
+        """按 expires_at 索引分批删除过期会话，返回清理条数"""
+        batch_size = batch_size or config.SESSION_SWEEP_BATCH
+        close_session = False
+        if s is None:
+            s = SessionLocal()
+            close_session = True
+        try:
+            now = datetime.datetime.now()
+            total = 0
+            while True:
+                batch = s.query(SessionToken.id).filter(SessionToken.expires_at < now).limit(batch_size)
+                deleted = s.query(SessionToken).filter(SessionToken.id.in_(batch.scalar_subquery())) \
+                    .delete(synchronize_session=False)
+                s.commit()
+                total += deleted
+                if deleted < batch_size:
+                    break
+            if total:
+                logger.info(f"清理过期会话: {total} 条")
+            return total
+        finally:
+            if close_session:
+                s.close()
+
+    @staticmethod
+    def start_session_sweeper(interval_minutes: int = None):
+        """启动后台过期会话清理线程（每进程一次）"""
+        global _sweeper_thread
+        with _sweeper_lock:
+            if _sweeper_thread is not None:
+                return
+            interval = (interval_minutes or config.SESSION_SWEEP_MINUTES) * 60
+
+            def _run():
+                while True:
+                    try:
+                        AuthService.purge_expired_sessions()
+                    except Exception as e:
+                        logger.error(f"过期会话清理失败: {e}")
+                    time.sleep(interval)
+
+            _sweeper_thread = threading.Thread(target=_run, name="session-sweeper", daemon=True)
+            _sweeper_thread.start()
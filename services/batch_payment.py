@@ -0,0 +1,126 @@
+"""批量缴费模块 - 一次读取全部待缴账单，批量更新账单并批量写入收款、分录与变更历史"""
+import datetime
+import json
+import uuid
+from typing import Dict, List, NamedTuple, Optional, Sequence
+from sqlalchemy import bindparam, func, insert, select, update
+from config import get_logger
+from models import Bill, DataChangeHistory, LedgerEntry, PaymentRecord, Room
+from utils.exceptions import ConcurrencyError, PeriodClosedError, ValidationError
+from .ledger import LedgerService
+
+logger = get_logger(__name__)
+
+# 科目：现金(1)、物业费收入(2)、预收账款(3)
+CASH_ACCOUNT_ID, INCOME_ACCOUNT_ID, PREPAID_ACCOUNT_ID = 1, 2, 3
+# 读取时 IN 列表的分块大小
+ROOM_CHUNK = 500
+
+
+class RoomPaymentResult(NamedTuple):
+    room_id: int
+    room_number: str
+    bills: int
+    amount: float
+    payment_id: Optional[int]
+
+    @property
+    def status(self) -> str:
+        return "✅ 已缴清" if self.bills else "— 无欠费"
+
+
+def _entry(room_id, account_id, amount, period, direction, details, ref_bill_id=None, ref_payment_id=None) -> dict:
+    return {"room_id": room_id, "account_id": account_id, "amount": amount, "period": period,
+            "ref_bill_id": ref_bill_id, "ref_payment_id": ref_payment_id, "details": details,
+            "direction": direction, "side": "debit" if direction == 1 else "credit"}
+
+
+class BatchPaymentService:
+    @staticmethod
+    def settle(s, room_ids: Sequence[int], period: str, pay_method: str, operator: str,
+               biz_type: str = '批量缴费') -> List[RoomPaymentResult]:
+        """
+        结清所选房产在 period 的全部待缴账单，返回逐户结果。
+        在调用方事务内执行且不提交：先一次读出全部账单，再集中写入，写锁只在写入阶段持有。
+        每户一笔收款（借现金/贷预收），每张账单一组分录（借预收/贷收入），与收银台直接支付一致。
+        账单在读取后被他人修改时抛出 ConcurrencyError，由调用方回滚。
+        """
+        room_ids = sorted({int(r) for r in room_ids})
+        if not room_ids:
+            return []
+        pay_period = datetime.datetime.now().strftime("%Y-%m")
+        for p in {period, pay_period}:
+            if LedgerService.is_period_closed(p, s):
+                raise PeriodClosedError(f"账期 {p} 已关账")
+
+        # ---- 读取阶段 ----
+        rooms: Dict[int, str] = {}
+        bills = []
+        owe = Bill.amount_due - func.coalesce(Bill.amount_paid, 0) - func.coalesce(Bill.discount, 0)
+        for i in range(0, len(room_ids), ROOM_CHUNK):
+            chunk = room_ids[i:i + ROOM_CHUNK]
+            rooms.update(s.execute(select(Room.id, Room.room_number).where(Room.id.in_(chunk))).all())
+            bills += s.execute(
+                select(Bill.id, Bill.room_id, Bill.period, func.coalesce(Bill.amount_paid, 0), Bill.status, owe)
+                .where(Bill.room_id.in_(chunk), Bill.period == period, Bill.status != '已缴', Bill.status != '作废')
+                .order_by(Bill.room_id, Bill.id)).all()
+        missing = set(room_ids) - set(rooms)
+        if missing:
+            raise ValidationError(f"房产不存在: {sorted(missing)[:10]}")
+
+        per_room: Dict[int, List] = {}
+        for b in bills:
+            amount = round(float(b[5] or 0), 2)
+            if amount > 0.01:
+                per_room.setdefault(b[1], []).append((b, amount))
+        if not per_room:
+            return [RoomPaymentResult(rid, rooms[rid], 0, 0.0, None) for rid in room_ids]
+
+        # ---- 写入阶段 ----
+        trace = str(uuid.uuid4())
+        now = datetime.datetime.now()
+        settled = [(b, amount) for items in per_room.values() for b, amount in items]
+
+        res = s.execute(
+            update(Bill.__table__)
+            .where(Bill.id == bindparam("b_id"), func.coalesce(Bill.amount_paid, 0) == bindparam("b_old"),
+                   Bill.status == bindparam("b_status"))
+            .values(amount_paid=bindparam("b_new"), status='已缴'),
+            [{"b_id": b[0], "b_old": b[3], "b_status": b[4], "b_new": float(b[3]) + amount} for b, amount in settled])
+        if res.rowcount != len(settled):
+            raise ConcurrencyError("部分账单在操作期间已被修改，请刷新后重试")
+
+        room_order = sorted(per_room)
+        payment_ids = s.execute(
+            insert(PaymentRecord).returning(PaymentRecord.id, sort_by_parameter_order=True),
+            [{"room_id": rid, "amount": round(sum(a for _, a in per_room[rid]), 2), "biz_type": biz_type,
+              "pay_method": pay_method, "operator": operator, "trace_id": trace, "created_at": now}
+             for rid in room_order]).scalars().all()
+        payments = dict(zip(room_order, payment_ids))
+
+        details = json.dumps({"batch": trace}, ensure_ascii=False)
+        entries = []
+        for rid in room_order:
+            total = round(sum(a for _, a in per_room[rid]), 2)
+            entries.append(_entry(rid, CASH_ACCOUNT_ID, total, pay_period, 1, details, ref_payment_id=payments[rid]))
+            entries.append(_entry(rid, PREPAID_ACCOUNT_ID, total, pay_period, -1, details, ref_payment_id=payments[rid]))
+            for b, amount in per_room[rid]:
+                entries.append(_entry(rid, PREPAID_ACCOUNT_ID, amount, b[2], 1, details, ref_bill_id=b[0]))
+                entries.append(_entry(rid, INCOME_ACCOUNT_ID, amount, b[2], -1, details, ref_bill_id=b[0]))
+        s.execute(insert(LedgerEntry), entries)
+
+        # 批量 UPDATE 不经过 before_flush，变更历史在此补写
+        history = []
+        for b, amount in settled:
+            history.append({"table_name": "bills", "record_id": b[0], "field_name": "amount_paid",
+                            "old_value": str(b[3]), "new_value": str(float(b[3]) + amount),
+                            "changed_by": operator, "changed_at": now, "reason": biz_type})
+            history.append({"table_name": "bills", "record_id": b[0], "field_name": "status",
+                            "old_value": b[4] or "", "new_value": '已缴',
+                            "changed_by": operator, "changed_at": now, "reason": biz_type})
+        s.execute(insert(DataChangeHistory), history)
+
+        logger.info(f"批量缴费: {len(per_room)} 户, {len(settled)} 张账单, 账期 {period}, trace={trace}")
+        return [RoomPaymentResult(rid, rooms[rid], len(per_room.get(rid, [])),
+                                  round(sum(a for _, a in per_room.get(rid, [])), 2), payments.get(rid))
+                for rid in room_ids]
@@ -0,0 +1,115 @@
+"""应用启动引导模块 - 建表、迁移与种子数据每进程每库只执行一次"""
+import threading
+from sqlalchemy import text
+from config import config, get_logger
+from models import Base, User, Property, SchemaMigration, ensure_indexes
+from models.base import get_engine, get_session_factory
+from .listings import drop_legacy_browser_indexes, install_count_invalidation
+from .reports import install_effective_period
+from .rollup import install_payment_rollup
+from .search import install_search_index, install_search_update_triggers
+from .snapshot import install_bill_change_stamp
+
+logger = get_logger(__name__)
+
+_lock = threading.Lock()
+_bootstrapped = set()
+_process_ready = False
+
+
+def _migration_core_indexes(conn):
+    """系统初始化页的常用索引，改为自动创建"""
+    for sql in [
+        "CREATE INDEX IF NOT EXISTS idx_room_number ON rooms(room_number)",
+        "CREATE INDEX IF NOT EXISTS idx_bill_room_id ON bills(room_id)",
+        "CREATE INDEX IF NOT EXISTS idx_bill_period ON bills(period)",
+        "CREATE INDEX IF NOT EXISTS idx_payment_room_id ON payment_records(room_id)",
+    ]:
+        conn.execute(text(sql))
+
+
+# 按顺序执行的数据迁移：(名称, 函数)，每个库只执行一次
+MIGRATIONS = [
+    ("0001_core_indexes", _migration_core_indexes),
+    ("0002_search_index", install_search_index),
+    ("0003_daily_payment_rollup", install_payment_rollup),
+    ("0004_bill_effective_period", install_effective_period),
+    ("0005_search_update_columns", install_search_update_triggers),
+    ("0006_bill_browser_period_key", drop_legacy_browser_indexes),
+    ("0007_bill_change_stamp", install_bill_change_stamp),
+]
+
+
+def run_migrations(eng) -> list:
+    """执行尚未应用的迁移，返回本次应用的迁移名称"""
+    applied = []
+    with eng.begin() as conn:
+        done = {r[0] for r in conn.execute(text("SELECT name FROM schema_migrations"))}
+        for name, fn in MIGRATIONS:
+            if name in done:
+                continue
+            fn(conn)
+            conn.execute(SchemaMigration.__table__.insert().values(name=name))
+            applied.append(name)
+            logger.info(f"已执行数据迁移: {name}")
+    return applied
+
+
+def _seed_default_admin(property_code: str = None):
+    """创建默认物业和管理员账号"""
+    from .auth import AuthService
+    s = get_session_factory(property_code)()
+    try:
+        prop = s.query(Property).filter_by(code="default").first()
+        if not prop:
+            prop = Property(name="默认物业", code="default")
+            s.add(prop)
+            s.flush()
+        admin = s.query(User).filter_by(username=config.DEFAULT_ADMIN_USER).first()
+        if not admin:
+            h = AuthService.hash_password(config.DEFAULT_ADMIN_PASS)
+            s.add(User(username=config.DEFAULT_ADMIN_USER, password_hash=h, role="管理员", property_id=prop.id))
+        s.commit()
+    except Exception as e:
+        s.rollback()
+        logger.error(f"默认管理员初始化失败: {e}")
+    finally:
+        s.close()
+
+
+def _start_process_services():
+    """进程级服务：变更追踪监听、账单浏览计数失效监听与过期会话清理线程"""
+    global _process_ready
+    if _process_ready:
+        return
+    from .auth import AuthService
+    from .change_tracking import ChangeTracker
+    ChangeTracker.install()
+    install_count_invalidation()
+    AuthService.start_session_sweeper()
+    _process_ready = True
+
+
+def bootstrap(property_code: str = None, seed: bool = None):
+    """
+    初始化数据库（建表、补索引、迁移）并按需写入种子数据。
+    同一进程内对同一物业库只执行一次，Streamlit 每次重跑脚本时调用代价可忽略。
+    seed 默认仅对主库（未指定物业编码）执行。
+    """
+    key = property_code or ""
+    if key in _bootstrapped and _process_ready:
+        return
+    with _lock:
+        if key not in _bootstrapped:
+            eng = get_engine(property_code)
+            Base.metadata.create_all(eng)
+            ensure_indexes(eng)
+            run_migrations(eng)
+            if seed is None:
+                seed = not property_code
+            if seed:
+                _seed_default_admin(property_code)
+            _bootstrapped.add(key)
+            logger.info(f"数据库引导完成: {property_code or 'default'}")
+        # 清理线程会立即访问会话表，须在建表与迁移之后启动
+        _start_process_services()
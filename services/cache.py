@@ -0,0 +1,121 @@
+"""参考数据缓存模块 - 按物业库隔离，写操作显式失效"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable
+from sqlalchemy import desc
+from config import config, get_logger
+from models import FeeType, ParkingType, Account, Bill, User, AuditLog
+
+logger = get_logger(__name__)
+
+# 默认车位类型（无自定义类型时使用）
+DEFAULT_PARKING_TYPES = ["地下车位", "地面车位", "车库", "子母车位"]
+
+
+def _db_key(s) -> str:
+    """以会话（或连接）绑定的数据库URL区分物业库"""
+    return str(s.get_bind().url if hasattr(s, "get_bind") else s.engine.url)
+
+
+class RefCache:
+    """
+    进程内参考数据缓存。每个 (物业库, 名称) 有独立的代数计数器，
+    写路径调用 invalidate() 使代数加一，旧值随即失效。
+    缓存值均为列表/字典等纯数据，可直接作为 st.cache_data 的返回值，
+    也可把 generation() 作为 st.cache_data 函数的参数实现联动失效。
+    同一名称下可按 arg 缓存多个值（共用代数）；条目总数超过 REF_CACHE_MAX_KEYS 时按 LRU 淘汰。
+    """
+    _lock = threading.Lock()
+    _values = OrderedDict()
+    _generations = {}
+
+    @staticmethod
+    def generation(s, name: str) -> int:
+        return RefCache._generations.get((_db_key(s), name), 0)
+
+    @staticmethod
+    def get(s, name: str, loader: Callable, ttl: int = None, arg: Hashable = None):
+        """读取缓存，未命中、代数变化或超过 ttl 秒时调用 loader(s) 重新加载"""
+        key = (_db_key(s), name)
+        value_key = key + (arg,)
+        ttl = ttl if ttl is not None else config.REF_CACHE_TTL
+        with RefCache._lock:
+            gen = RefCache._generations.get(key, 0)
+            item = RefCache._values.get(value_key)
+            if item and item[0] == gen and time.monotonic() - item[1] < ttl:
+                RefCache._values.move_to_end(value_key)
+                return item[2]
+        value = loader(s)
+        with RefCache._lock:
+            # 加载期间若已失效则不回填，避免写入旧值
+            if RefCache._generations.get(key, 0) == gen:
+                RefCache._values[value_key] = (gen, time.monotonic(), value)
+                RefCache._values.move_to_end(value_key)
+                while len(RefCache._values) > config.REF_CACHE_MAX_KEYS:
+                    RefCache._values.popitem(last=False)
+        return value
+
+    @staticmethod
+    def invalidate(s, *names: str):
+        """写操作后调用：使指定名称（含其下全部 arg）的缓存失效"""
+        db = _db_key(s)
+        with RefCache._lock:
+            for name in names:
+                key = (db, name)
+                RefCache._generations[key] = RefCache._generations.get(key, 0) + 1
+            for value_key in [k for k in RefCache._values if k[0] == db and k[1] in names]:
+                del RefCache._values[value_key]
+        logger.debug(f"参考数据缓存失效: {names}")
+
+    @staticmethod
+    def clear():
+        with RefCache._lock:
+            RefCache._values.clear()
+            RefCache._generations.clear()
+
+
+# 缓存名称常量，供写路径失效时引用
+FEE_TYPES = "fee_types"
+PARKING_TYPES = "parking_types"
+ACCOUNTS = "accounts"
+BILL_PERIODS = "bill_periods"
+USERNAMES = "usernames"
+AUDIT_ACTIONS = "audit_actions"
+
+
+def fee_type_rates(s) -> dict:
+    """费用科目 -> 税率"""
+    return RefCache.get(s, FEE_TYPES, lambda s: {r.name: float(r.tax_rate or 0) for r in
+                                                 s.query(FeeType.name, FeeType.tax_rate).order_by(FeeType.id)})
+
+
+def fee_type_names(s) -> list:
+    return list(fee_type_rates(s))
+
+
+def parking_types(s) -> list:
+    types = RefCache.get(s, PARKING_TYPES, lambda s: [r.name for r in s.query(ParkingType.name).filter(
+        ParkingType.is_deleted.is_(False)).order_by(ParkingType.id)])
+    return types or DEFAULT_PARKING_TYPES
+
+
+def account_natures(s) -> dict:
+    """会计科目ID -> 性质"""
+    return RefCache.get(s, ACCOUNTS, lambda s: {r.id: r.nature for r in s.query(Account.id, Account.nature)})
+
+
+def bill_periods(s) -> list:
+    """账单账期列表（倒序），由 idx_bill_period 索引支撑"""
+    return RefCache.get(s, BILL_PERIODS, lambda s: [r[0] for r in s.query(Bill.period).distinct().order_by(
+        desc(Bill.period)) if r[0]])
+
+
+def usernames(s) -> list:
+    return RefCache.get(s, USERNAMES, lambda s: [r[0] for r in s.query(User.username).order_by(User.id)])
+
+
+def audit_actions(s) -> list:
+    """审计操作类型为代码中固定的词表，只按 ttl 刷新"""
+    return RefCache.get(s, AUDIT_ACTIONS, lambda s: [r[0] for r in s.query(AuditLog.action).distinct() if r[0]],
+                        ttl=config.REF_CACHE_TTL * 4)
@@ -0,0 +1,114 @@
+"""数据变更自动追踪模块 - 基于 SQLAlchemy before_flush 事件"""
+import contextvars
+from typing import Iterable, Optional
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+from config import get_logger
+from models import Base, DataChangeHistory
+
+logger = get_logger(__name__)
+
+# 追踪配置：表名 -> 需要追踪的字段集合（None 表示全部字段）
+TRACKED_TABLES = {
+    'rooms': None,
+    'bills': None,
+    'payment_records': None,
+    'users': {'username', 'password_hash', 'role', 'property_id'},
+    'parking_spaces': None,
+}
+
+# 不记录明文的敏感字段
+MASKED_FIELDS = {('users', 'password_hash')}
+
+# 任何表都不追踪的字段
+IGNORED_FIELDS = {'id', 'created_at'}
+
+_current_operator = contextvars.ContextVar('change_operator', default='system')
+
+
+def _fmt(value) -> str:
+    return "" if value is None else str(value)
+
+
+def _noop_set(target, value, oldvalue, initiator):
+    return value
+
+
+def _enable_active_history(table_name: str):
+    """提交后对象属性会过期，开启 active_history 使赋值前先加载旧值"""
+    for mapper in Base.registry.mappers:
+        if mapper.local_table.name != table_name:
+            continue
+        for prop in mapper.column_attrs:
+            attr = getattr(mapper.class_, prop.key)
+            if not event.contains(attr, 'set', _noop_set):
+                event.listen(attr, 'set', _noop_set, active_history=True, retval=True)
+
+
+def _before_flush(session, flush_context, instances):
+    """在同一次 flush 中为已修改的追踪对象批量写入变更历史"""
+    if session.info.get('skip_change_tracking'):
+        return
+    operator = session.info.get('operator') or _current_operator.get()
+    reason = session.info.get('change_reason', '')
+    rows = []
+    for obj in session.dirty:
+        table = getattr(obj, '__tablename__', None)
+        if table not in TRACKED_TABLES:
+            continue
+        fields = TRACKED_TABLES[table]
+        state = inspect(obj)
+        # committed_state 只包含自加载以来被修改过的属性，代价与变更字段数成正比
+        for key in list(state.committed_state):
+            if key in IGNORED_FIELDS or (fields is not None and key not in fields):
+                continue
+            hist = state.attrs[key].history
+            if not hist.has_changes():
+                continue
+            old = hist.deleted[0] if hist.deleted else None
+            new = hist.added[0] if hist.added else None
+            if _fmt(old) == _fmt(new):
+                continue
+            if (table, key) in MASKED_FIELDS:
+                old, new = '***', '***(已修改)'
+            rows.append(DataChangeHistory(
+                table_name=table, record_id=state.identity[0] if state.identity else obj.id,
+                field_name=key, old_value=_fmt(old), new_value=_fmt(new),
+                changed_by=operator, reason=reason
+            ))
+    if rows:
+        session.add_all(rows)
+        logger.debug(f"自动记录数据变更 {len(rows)} 条")
+
+
+class ChangeTracker:
+    @staticmethod
+    def install():
+        """注册全局 before_flush 监听（重复调用安全）"""
+        if not event.contains(Session, 'before_flush', _before_flush):
+            event.listen(Session, 'before_flush', _before_flush)
+        for table in TRACKED_TABLES:
+            _enable_active_history(table)
+
+    @staticmethod
+    def uninstall():
+        if event.contains(Session, 'before_flush', _before_flush):
+            event.remove(Session, 'before_flush', _before_flush)
+
+    @staticmethod
+    def configure(table_name: str, fields: Optional[Iterable[str]] = None, enabled: bool = True):
+        """配置单表追踪：fields 为空表示追踪全部字段，enabled=False 关闭该表追踪"""
+        if not enabled:
+            TRACKED_TABLES.pop(table_name, None)
+        else:
+            TRACKED_TABLES[table_name] = set(fields) if fields is not None else None
+            _enable_active_history(table_name)
+
+    @staticmethod
+    def tracked_tables() -> list:
+        return list(TRACKED_TABLES)
+
+    @staticmethod
+    def set_operator(username: str):
+        """设置当前线程（Streamlit 会话脚本线程）的操作人"""
+        _current_operator.set(username or 'system')
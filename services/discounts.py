@@ -0,0 +1,129 @@
+"""减免审批模块 - 待审申请一次关联读取，批量审批以集合语句在同一事务内写入"""
+import datetime
+from typing import Dict, List, NamedTuple, Optional, Sequence
+from sqlalchemy import bindparam, func, insert, select, update
+from config import get_logger
+from models import AdjustmentEntry, Bill, DataChangeHistory, DiscountRequest, Room
+from utils.exceptions import ConcurrencyError, ValidationError
+
+logger = get_logger(__name__)
+
+# 读取与状态更新时 IN 列表的分块大小
+REQUEST_CHUNK = 500
+
+
+class PendingDiscount(NamedTuple):
+    """待审核减免申请及其账单概况"""
+    id: int
+    bill_id: int
+    room_number: str
+    fee_type: str
+    period: str
+    amount_due: float
+    discount: float
+    amount: float
+    reason: Optional[str]
+    requested_by: str
+    created_at: Optional[datetime.datetime]
+
+
+class DiscountDecision(NamedTuple):
+    requests: int
+    bills: int
+    amount: float
+    # 逐笔明细 [{"申请ID", "账单ID", "amount"}]，供审计日志记录
+    items: List[dict]
+
+
+def _chunks(ids: List[int]):
+    for i in range(0, len(ids), REQUEST_CHUNK):
+        yield ids[i:i + REQUEST_CHUNK]
+
+
+def _load_pending(s, ids: List[int]):
+    """读取待审核申请；数量不符说明已被他人处理"""
+    requests = []
+    for chunk in _chunks(ids):
+        requests += s.execute(select(DiscountRequest.id, DiscountRequest.bill_id, DiscountRequest.amount,
+                                     DiscountRequest.reason)
+                              .where(DiscountRequest.id.in_(chunk), DiscountRequest.status == '待审核')).all()
+    if len(requests) != len(ids):
+        raise ConcurrencyError("部分申请已被他人处理，请刷新后重试")
+    return requests
+
+
+def _items(requests) -> List[dict]:
+    return [{"申请ID": r.id, "账单ID": r.bill_id, "amount": float(r.amount)} for r in requests]
+
+
+def _close_requests(s, ids: List[int], status: str, approver: str, now: datetime.datetime):
+    """仅更新仍为待审核的申请；被他人先行处理时抛出 ConcurrencyError，由调用方回滚"""
+    changed = 0
+    for chunk in _chunks(ids):
+        changed += s.execute(
+            update(DiscountRequest).where(DiscountRequest.id.in_(chunk), DiscountRequest.status == '待审核')
+            .values(status=status, approved_by=approver, approved_at=now)
+            .execution_options(synchronize_session=False)).rowcount
+    if changed != len(ids):
+        raise ConcurrencyError("部分申请已被他人处理，请刷新后重试")
+
+
+class DiscountService:
+    @staticmethod
+    def pending(s, limit: Optional[int] = None) -> List[PendingDiscount]:
+        """全部待审核申请，账单与房号在同一条语句中关联取出"""
+        stmt = (select(DiscountRequest.id, Bill.id, func.coalesce(Room.room_number, ""), Bill.fee_type, Bill.period,
+                       func.coalesce(Bill.amount_due, 0), func.coalesce(Bill.discount, 0), DiscountRequest.amount,
+                       DiscountRequest.reason, DiscountRequest.requested_by, DiscountRequest.created_at)
+                .join(Bill, DiscountRequest.bill_id == Bill.id).outerjoin(Room, Bill.room_id == Room.id)
+                .where(DiscountRequest.status == '待审核').order_by(DiscountRequest.id).limit(limit))
+        return [PendingDiscount(*r) for r in s.execute(stmt)]
+
+    @staticmethod
+    def approve(s, request_ids: Sequence[int], approver: str) -> DiscountDecision:
+        """
+        批量通过减免申请，在调用方事务内执行且不提交。
+        先以带状态条件的 UPDATE 占住申请，再按账单合计累加减免、批量写入调整分录与变更历史。
+        """
+        ids = sorted({int(r) for r in request_ids})
+        if not ids:
+            raise ValidationError("未选择申请")
+        requests = _load_pending(s, ids)
+
+        now = datetime.datetime.now()
+        _close_requests(s, ids, '已通过', approver, now)
+
+        per_bill: Dict[int, float] = {}
+        for r in requests:
+            per_bill[r.bill_id] = per_bill.get(r.bill_id, 0.0) + float(r.amount)
+        bill_ids = sorted(per_bill)
+        old: Dict[int, float] = {}
+        for chunk in _chunks(bill_ids):
+            old.update(s.execute(select(Bill.id, func.coalesce(Bill.discount, 0)).where(Bill.id.in_(chunk))).all())
+        s.execute(update(Bill.__table__).where(Bill.id == bindparam("b_id"))
+                  .values(discount=func.coalesce(Bill.discount, 0) + bindparam("b_add")),
+                  [{"b_id": b, "b_add": per_bill[b]} for b in bill_ids])
+
+        s.execute(insert(AdjustmentEntry), [
+            {"bill_id": r.bill_id, "amount": float(r.amount), "reason": r.reason, "approved_by": approver,
+             "approved_at": now} for r in requests])
+        # 批量 UPDATE 不经过 before_flush，变更历史在此补写
+        s.execute(insert(DataChangeHistory), [
+            {"table_name": "bills", "record_id": b, "field_name": "discount", "old_value": str(old.get(b, 0.0)),
+             "new_value": str(float(old.get(b, 0.0)) + per_bill[b]), "changed_by": approver, "changed_at": now,
+             "reason": "减免审批"} for b in bill_ids])
+
+        decision = DiscountDecision(len(ids), len(bill_ids), round(sum(per_bill.values()), 2), _items(requests))
+        logger.info(f"减免审批通过: {decision.requests} 笔申请, {decision.bills} 张账单, 合计 {decision.amount}")
+        return decision
+
+    @staticmethod
+    def reject(s, request_ids: Sequence[int], approver: str) -> DiscountDecision:
+        """批量拒绝减免申请，在调用方事务内执行且不提交"""
+        ids = sorted({int(r) for r in request_ids})
+        if not ids:
+            raise ValidationError("未选择申请")
+        requests = _load_pending(s, ids)
+        _close_requests(s, ids, '已拒绝', approver, datetime.datetime.now())
+        return DiscountDecision(len(ids), len({r.bill_id for r in requests}),
+                                round(sum(float(r.amount) for r in requests), 2), _items(requests))
@@ -0,0 +1,215 @@
+"""流式导出模块 - 按块读取游标写入临时文件（CSV / XLSX / Parquet），内存占用与总行数无关"""
+import csv
+import datetime
+import glob
+import os
+import secrets
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional
+from sqlalchemy import func
+from config import config, get_logger
+from models import Bill, PaymentRecord, Room
+from utils.exceptions import ValidationError
+from .listings import BillFilter, filter_bills
+
+logger = get_logger(__name__)
+
+_PREFIX = "erp_export_"
+# Streamlit 静态文件服务（server.enableStaticServing）的根目录与单文件上限
+STATIC_ROOT = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "static")
+STATIC_MAX_BYTES = 200 * 1024 * 1024
+
+# 格式: (扩展名, MIME)
+FORMATS = {
+    "CSV": (".csv", "text/csv"),
+    "XLSX": (".xlsx", "application/vnd.openxmlformats-officedocument.spreadsheetml.sheet"),
+    "Parquet": (".parquet", "application/octet-stream"),
+}
+
+
+class ExportColumn(NamedTuple):
+    label: str
+    expr: object
+    kind: str = "str"  # str / float / datetime
+
+
+class ExportDataset(NamedTuple):
+    title: str
+    columns: List[ExportColumn]
+    query: Callable  # (s, BillFilter) -> Query
+
+
+def _bills(s, f: Optional[BillFilter]):
+    cols = EXPORTS["bills"].columns
+    return filter_bills(s.query(*[c.expr.label(c.label) for c in cols]), f or BillFilter()).order_by(Bill.id)
+
+
+def _payments(s, f):
+    cols = EXPORTS["payments"].columns
+    return s.query(*[c.expr.label(c.label) for c in cols]).join(Room, PaymentRecord.room_id == Room.id).filter(
+        Room.is_deleted.is_(False)).order_by(PaymentRecord.id)
+
+
+def _rooms(s, f):
+    cols = EXPORTS["rooms"].columns
+    return s.query(*[c.expr.label(c.label) for c in cols]).filter(Room.is_deleted.is_(False)).order_by(Room.id)
+
+
+EXPORTS: Dict[str, ExportDataset] = {
+    "bills": ExportDataset("账单数据", [
+        ExportColumn("房号", Room.room_number), ExportColumn("业主", Room.owner_name),
+        ExportColumn("科目", Bill.fee_type), ExportColumn("账期", Bill.period),
+        ExportColumn("应收", func.coalesce(Bill.amount_due, 0), "float"),
+        ExportColumn("减免", func.coalesce(Bill.discount, 0), "float"),
+        ExportColumn("实收", func.coalesce(Bill.amount_paid, 0), "float"),
+        ExportColumn("状态", Bill.status),
+    ], _bills),
+    "payments": ExportDataset("收款记录", [
+        ExportColumn("房号", Room.room_number), ExportColumn("类型", PaymentRecord.biz_type),
+        ExportColumn("金额", PaymentRecord.amount, "float"), ExportColumn("方式", PaymentRecord.pay_method),
+        ExportColumn("时间", PaymentRecord.created_at, "datetime"), ExportColumn("操作人", PaymentRecord.operator),
+    ], _payments),
+    "rooms": ExportDataset("房产档案", [
+        ExportColumn("房号", Room.room_number), ExportColumn("业主", Room.owner_name),
+        ExportColumn("电话", Room.owner_phone), ExportColumn("面积", Room.area, "float"),
+        ExportColumn("余额", Room.balance, "float"),
+    ], _rooms),
+}
+
+
+class ExportResult(NamedTuple):
+    path: str
+    filename: str
+    mime: str
+    rows: int
+    # 静态服务下载地址（相对路径）；文件不在静态目录或超过上限时为 None
+    url: Optional[str] = None
+
+
+def _static_url(path: str) -> Optional[str]:
+    rel = os.path.relpath(os.path.realpath(path), os.path.realpath(STATIC_ROOT))
+    if rel.startswith(os.pardir) or os.path.getsize(path) > STATIC_MAX_BYTES:
+        return None
+    return "app/static/" + rel.replace(os.sep, "/")
+
+
+def _text(v, kind: str):
+    if v is None:
+        return ""
+    if kind == "datetime" and isinstance(v, datetime.datetime):
+        return v.strftime("%Y-%m-%d %H:%M")
+    return v
+
+
+class _CsvWriter:
+    def __init__(self, path, columns):
+        self._f = open(path, "w", newline="", encoding="utf-8-sig")
+        self._w = csv.writer(self._f)
+        self._kinds = [c.kind for c in columns]
+        self._w.writerow([c.label for c in columns])
+
+    def write(self, rows):
+        self._w.writerows([_text(v, k) for v, k in zip(r, self._kinds)] for r in rows)
+
+    def close(self):
+        self._f.close()
+
+
+class _XlsxWriter:
+    """openpyxl 只写模式逐行落盘，不在内存中保留整张表"""
+    def __init__(self, path, columns):
+        from openpyxl import Workbook
+        self._path = path
+        self._wb = Workbook(write_only=True)
+        self._ws = self._wb.create_sheet("导出数据")
+        self._kinds = [c.kind for c in columns]
+        self._ws.append([c.label for c in columns])
+
+    def write(self, rows):
+        for r in rows:
+            self._ws.append([_text(v, k) for v, k in zip(r, self._kinds)])
+
+    def close(self):
+        self._wb.save(self._path)
+
+
+class _ParquetWriter:
+    """每块写成一个 row group；列类型由导出定义给出，避免空块推断出 null 类型"""
+    def __init__(self, path, columns):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise ValidationError("导出 Parquet 需要安装 pyarrow")
+        self._pa = pa
+        types = {"str": pa.string(), "float": pa.float64(), "datetime": pa.timestamp("us")}
+        self._schema = pa.schema([(c.label, types[c.kind]) for c in columns])
+        self._writer = pq.ParquetWriter(path, self._schema)
+
+    def write(self, rows):
+        arrays = [self._pa.array(list(col), type=field.type) for col, field in zip(zip(*rows), self._schema)]
+        self._writer.write_table(self._pa.Table.from_arrays(arrays, schema=self._schema))
+
+    def close(self):
+        self._writer.close()
+
+
+_WRITERS = {"CSV": _CsvWriter, "XLSX": _XlsxWriter, "Parquet": _ParquetWriter}
+
+
+class ExportService:
+    @staticmethod
+    def export(s, dataset: str, fmt: str = "CSV", bill_filter: Optional[BillFilter] = None,
+               chunk_size: int = None) -> ExportResult:
+        """
+        以服务端游标按 chunk_size 行分块读取，逐块写入本次请求独占的文件。
+        文件名含随机令牌，由 Streamlit 静态服务按链接流式下载，应用进程不读入文件内容；
+        下载后调用 discard() 删除，遗留文件由下次导出时的 cleanup() 清理
+        """
+        if dataset not in EXPORTS or fmt not in FORMATS:
+            raise ValidationError(f"不支持的导出: {dataset} / {fmt}")
+        ds = EXPORTS[dataset]
+        suffix, mime = FORMATS[fmt]
+        chunk_size = chunk_size or config.EXPORT_CHUNK_SIZE
+        ExportService.cleanup()
+
+        os.makedirs(config.EXPORT_DIR, exist_ok=True)
+        path = os.path.join(config.EXPORT_DIR, f"{_PREFIX}{secrets.token_urlsafe(24)}{suffix}")
+        open(path, "xb").close()
+        start = time.perf_counter()
+        rows = 0
+        try:
+            writer = _WRITERS[fmt](path, ds.columns)
+            result = s.execute(ds.query(s, bill_filter).statement.execution_options(yield_per=chunk_size))
+            for part in result.partitions():
+                writer.write(part)
+                rows += len(part)
+            writer.close()
+        except Exception:
+            os.remove(path)
+            raise
+        stamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        logger.info(f"导出完成: {ds.title} {fmt} {rows} 行, 耗时 {time.perf_counter() - start:.2f}s")
+        return ExportResult(path, f"{ds.title}_{stamp}{suffix}", mime, rows, _static_url(path))
+
+    @staticmethod
+    def discard(result: ExportResult):
+        """删除已下载的导出文件（进行中的下载持有文件句柄，不受影响）"""
+        try:
+            os.remove(result.path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def cleanup(max_age_hours: float = None) -> int:
+        """删除超过保留时长的导出临时文件，返回删除数量"""
+        max_age = (max_age_hours if max_age_hours is not None else config.EXPORT_KEEP_HOURS) * 3600
+        removed = 0
+        for path in glob.glob(os.path.join(config.EXPORT_DIR, _PREFIX + "*")):
+            try:
+                if time.time() - os.path.getmtime(path) > max_age:
+                    os.remove(path)
+                    removed += 1
+            except OSError:
+                pass
+        return removed
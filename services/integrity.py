@@ -0,0 +1,166 @@
+"""财务完整性检查模块 - 规则以 SQL 注册（计数 + 样本），在只读连接上并发执行"""
+import datetime
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from sqlalchemy import text
+from config import config, get_logger
+
+logger = get_logger(__name__)
+
+
+class IntegrityRule(NamedTuple):
+    """sql 为返回问题明细的 SELECT，计数与样本均由其派生"""
+    key: str
+    title: str
+    sql: str
+    hint: str = ""
+
+
+class RuleResult(NamedTuple):
+    rule: IntegrityRule
+    count: int
+    columns: Tuple[str, ...]
+    sample: List[tuple]
+    elapsed: float
+    error: Optional[str] = None
+
+    @property
+    def status(self) -> str:
+        if self.error:
+            return "❌ 执行失败"
+        return "✅ 通过" if self.count == 0 else "⚠️ 警告"
+
+
+_RULES: Dict[str, IntegrityRule] = {}
+
+
+def register_rule(rule: IntegrityRule) -> IntegrityRule:
+    """注册（或按 key 覆盖）一条检查规则"""
+    _RULES[rule.key] = rule
+    return rule
+
+
+# ---- 内置规则 ----
+register_rule(IntegrityRule(
+    "negative_balance", "负余额房产",
+    "SELECT id AS 房产ID, room_number AS 房号, owner_name AS 业主, balance AS 余额 FROM rooms "
+    "WHERE balance < 0 AND COALESCE(is_deleted, 0) = 0 ORDER BY balance",
+    "房产余额为负"))
+register_rule(IntegrityRule(
+    "overpaid_bills", "超额缴费",
+    "SELECT id AS 账单ID, room_id AS 房产ID, period AS 账期, fee_type AS 费用类型, "
+    "amount_due AS 应收, amount_paid AS 实收 FROM bills WHERE amount_paid > amount_due ORDER BY id",
+    "账单实缴超过应缴"))
+register_rule(IntegrityRule(
+    "discount_over_due", "减免超过应收",
+    "SELECT id AS 账单ID, room_id AS 房产ID, period AS 账期, fee_type AS 费用类型, "
+    "amount_due AS 应收, discount AS 减免 FROM bills WHERE discount > amount_due + 0.005 ORDER BY id",
+    "账单减免金额大于应收金额"))
+register_rule(IntegrityRule(
+    "paid_bills_without_ledger", "已缴账单无分录",
+    "SELECT b.id AS 账单ID, b.room_id AS 房产ID, b.period AS 账期, b.amount_paid AS 实收 FROM bills b "
+    "WHERE COALESCE(b.amount_paid, 0) > 0 AND COALESCE(b.status, '') != '作废' "
+    "AND NOT EXISTS (SELECT 1 FROM ledger_entries l WHERE l.ref_bill_id = b.id) ORDER BY b.id",
+    "账单有实收但没有引用该账单的分录"))
+register_rule(IntegrityRule(
+    "unbalanced_bill_entries", "账单分录借贷不平",
+    "SELECT ref_bill_id AS 账单ID, COUNT(*) AS 分录数, ROUND(SUM(amount * direction), 2) AS 借贷差额 "
+    "FROM ledger_entries WHERE ref_bill_id IS NOT NULL GROUP BY ref_bill_id "
+    "HAVING ABS(SUM(amount * direction)) >= 0.01 ORDER BY ref_bill_id",
+    "同一账单的分录借方合计不等于贷方合计"))
+register_rule(IntegrityRule(
+    "unbalanced_payment_entries", "收款分录借贷不平",
+    "SELECT ref_payment_id AS 收款ID, COUNT(*) AS 分录数, ROUND(SUM(amount * direction), 2) AS 借贷差额 "
+    "FROM ledger_entries WHERE ref_payment_id IS NOT NULL GROUP BY ref_payment_id "
+    "HAVING ABS(SUM(amount * direction)) >= 0.01 ORDER BY ref_payment_id",
+    "同一收款的分录借方合计不等于贷方合计"))
+register_rule(IntegrityRule(
+    "payments_without_room", "收款无对应房产",
+    "SELECT p.id AS 收款ID, p.room_id AS 房产ID, p.amount AS 金额, p.biz_type AS 业务类型, "
+    "p.created_at AS 时间 FROM payment_records p LEFT JOIN rooms r ON r.id = p.room_id "
+    "WHERE r.id IS NULL ORDER BY p.id",
+    "收款记录的房产不存在"))
+register_rule(IntegrityRule(
+    "orphan_invoices", "孤立发票",
+    "SELECT i.id AS 发票ID, i.invoice_no AS 发票号, i.bill_id AS 账单ID, b.status AS 账单状态 "
+    "FROM invoices i LEFT JOIN bills b ON b.id = i.bill_id "
+    "WHERE COALESCE(i.status, '') != '作废' AND (b.id IS NULL OR b.status = '作废') ORDER BY i.id",
+    "发票对应账单不存在或已作废"))
+
+
+def _db_path(s) -> Optional[str]:
+    path = s.get_bind().url.database
+    return path if path and path != ":memory:" else None
+
+
+def _run_rule(rule: IntegrityRule, execute, sample_size: int) -> RuleResult:
+    start = time.perf_counter()
+    try:
+        count = execute(f"SELECT COUNT(*) FROM ({rule.sql})")[1][0][0]
+        columns, sample = execute(f"{rule.sql} LIMIT {int(sample_size)}")
+        return RuleResult(rule, int(count), columns, sample, time.perf_counter() - start)
+    except Exception as e:
+        logger.error(f"完整性规则 {rule.key} 执行失败: {e}")
+        return RuleResult(rule, 0, (), [], time.perf_counter() - start, str(e))
+
+
+def _readonly_executor(path: str):
+    """每条规则独立打开只读连接，线程间不共享"""
+    def execute(sql):
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            cur = conn.execute(sql)
+            return tuple(d[0] for d in cur.description), cur.fetchall()
+        finally:
+            conn.close()
+    return execute
+
+
+class IntegrityService:
+    @staticmethod
+    def rules() -> List[IntegrityRule]:
+        return list(_RULES.values())
+
+    @staticmethod
+    def run(s, keys: Optional[Sequence[str]] = None, sample_size: int = None,
+            workers: int = None) -> List[RuleResult]:
+        """
+        执行检查规则（默认全部），结果顺序与注册顺序一致。
+        文件数据库上各规则在独立只读连接中并发执行，否则在当前会话上顺序执行。
+        """
+        rules = [r for r in _RULES.values() if keys is None or r.key in keys]
+        sample_size = sample_size or config.INTEGRITY_SAMPLE_SIZE
+        path = _db_path(s)
+        start = time.perf_counter()
+        if path:
+            execute = _readonly_executor(path)
+            with ThreadPoolExecutor(max_workers=workers or config.INTEGRITY_WORKERS,
+                                    thread_name_prefix="integrity") as pool:
+                results = list(pool.map(lambda r: _run_rule(r, execute, sample_size), rules))
+        else:
+            def execute(sql):
+                res = s.execute(text(sql))
+                return tuple(res.keys()), [tuple(r) for r in res]
+            results = [_run_rule(r, execute, sample_size) for r in rules]
+        issues = sum(1 for r in results if r.count or r.error)
+        logger.info(f"完整性检查完成: {len(results)} 项, {issues} 项异常, 耗时 {time.perf_counter() - start:.2f}s")
+        return results
+
+    @staticmethod
+    def report(results: List[RuleResult], title: str = "财务完整性检查报告") -> str:
+        """生成 Markdown 报告（页面下载与夜间任务共用）"""
+        now = datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        lines = [f"# {title}", "", f"生成时间: {now}", "",
+                 "| 检查项 | 状态 | 问题数 | 耗时(ms) |", "| --- | --- | ---: | ---: |"]
+        for r in results:
+            lines.append(f"| {r.rule.title} | {r.status} | {r.count} | {r.elapsed * 1000:.1f} |")
+        for r in results:
+            if not (r.count or r.error):
+                continue
+            lines += ["", f"## {r.rule.title}", "", r.error or f"{r.rule.hint}，共 {r.count} 条，样本："]
+            if r.sample:
+                lines += ["", "| " + " | ".join(r.columns) + " |", "|" + " --- |" * len(r.columns)]
+                lines += ["| " + " | ".join("" if v is None else str(v) for v in row) + " |" for row in r.sample]
+        return "\n".join(lines) + "\n"
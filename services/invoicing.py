@@ -0,0 +1,105 @@
+"""开票模块 - 发票号按块从序列表分配，税率取缓存的费用科目映射，发票批量写入"""
+from typing import List, NamedTuple, Optional, Sequence
+from sqlalchemy import exists, func, insert, select, update
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from config import config, get_logger
+from models import Bill, Invoice, InvoiceSequence, Room
+from utils.exceptions import ValidationError
+from .cache import fee_type_rates
+
+logger = get_logger(__name__)
+
+INVOICE_SEQUENCE = "invoice"
+# 读取时 IN 列表的分块大小
+BILL_CHUNK = 500
+
+
+def not_invoiced():
+    """账单没有有效（未作废）发票；走 invoices.bill_id 索引的反连接"""
+    return ~exists().where(Invoice.bill_id == Bill.id, Invoice.status != '作废')
+
+
+def split_tax(amount_incl: float, rate: float):
+    """价内税拆分，返回 (不含税金额, 税额)"""
+    amount_excl = round(amount_incl / (1 + rate), 2) if rate > 0 else round(amount_incl, 2)
+    return amount_excl, round(amount_incl - amount_excl, 2)
+
+
+class InvoiceBatch(NamedTuple):
+    count: int
+    amount: float
+    tax: float
+    first_no: Optional[str]
+    last_no: Optional[str]
+
+
+class InvoiceService:
+    @staticmethod
+    def format_no(value: int) -> str:
+        """序号定长补零，与旧的 INV-8 位十六进制编号长度不同，不会撞号"""
+        return f"{config.INVOICE_PREFIX}{value:010d}"
+
+    @staticmethod
+    def _lock_sequence(s, name: str):
+        """确保序列行存在；该写语句同时占住写锁，后续读取与分配之间不会有并发开票插入"""
+        s.execute(sqlite_insert(InvoiceSequence).values(name=name, next_value=1)
+                  .on_conflict_do_nothing(index_elements=[InvoiceSequence.name]))
+
+    @staticmethod
+    def allocate(s, count: int, name: str = INVOICE_SEQUENCE) -> List[str]:
+        """一条 UPDATE 预留 count 个连续序号并返回对应发票号，在调用方事务内执行"""
+        if count <= 0:
+            return []
+        InvoiceService._lock_sequence(s, name)
+        end = s.execute(update(InvoiceSequence).where(InvoiceSequence.name == name)
+                        .values(next_value=InvoiceSequence.next_value + count)
+                        .returning(InvoiceSequence.next_value)).scalar_one()
+        return [InvoiceService.format_no(v) for v in range(end - count, end)]
+
+    @staticmethod
+    def _issue(s, rows, title: Optional[str]) -> InvoiceBatch:
+        if not rows:
+            return InvoiceBatch(0, 0.0, 0.0, None, None)
+        rates = fee_type_rates(s)
+        numbers = InvoiceService.allocate(s, len(rows))
+        invoices = []
+        for (bill_id, fee_type, amount, owner), no in zip(rows, numbers):
+            rate = rates.get(fee_type, 0.0)
+            amount = round(float(amount or 0), 2)
+            amount_excl, tax = split_tax(amount, rate)
+            invoices.append({"bill_id": bill_id, "invoice_no": no, "title": title or owner or "个人",
+                             "tax_rate": rate, "amount_excl_tax": amount_excl, "tax_amount": tax,
+                             "amount_incl_tax": amount, "status": '已开具'})
+        s.execute(insert(Invoice), invoices)
+        batch = InvoiceBatch(len(invoices), round(sum(i["amount_incl_tax"] for i in invoices), 2),
+                             round(sum(i["tax_amount"] for i in invoices), 2), numbers[0], numbers[-1])
+        logger.info(f"开票: {batch.count} 张, 含税 {batch.amount}, 发票号 {batch.first_no} ~ {batch.last_no}")
+        return batch
+
+    @staticmethod
+    def _candidates(*where):
+        return (select(Bill.id, Bill.fee_type, func.coalesce(Bill.amount_paid, 0), Room.owner_name)
+                .outerjoin(Room, Bill.room_id == Room.id)
+                .where(Bill.status == '已缴', not_invoiced(), *where).order_by(Bill.id))
+
+    @staticmethod
+    def issue(s, bill_ids: Sequence[int], title: Optional[str] = None) -> InvoiceBatch:
+        """
+        为所选账单开票，在调用方事务内执行且不提交。
+        已开票或未缴清的账单自动跳过；title 为空时以业主姓名为抬头。
+        """
+        bill_ids = sorted({int(b) for b in bill_ids})
+        if not bill_ids:
+            raise ValidationError("未选择账单")
+        InvoiceService._lock_sequence(s, INVOICE_SEQUENCE)
+        rows = []
+        for i in range(0, len(bill_ids), BILL_CHUNK):
+            rows += s.execute(InvoiceService._candidates(Bill.id.in_(bill_ids[i:i + BILL_CHUNK]))).all()
+        return InvoiceService._issue(s, rows, title)
+
+    @staticmethod
+    def issue_period(s, period: str, title: Optional[str] = None, fee_type: Optional[str] = None) -> InvoiceBatch:
+        """为 period 全部已缴未开票账单一次开票（可限定科目），在调用方事务内执行且不提交"""
+        InvoiceService._lock_sequence(s, INVOICE_SEQUENCE)
+        where = [Bill.period == period] + ([Bill.fee_type == fee_type] if fee_type else [])
+        return InvoiceService._issue(s, s.execute(InvoiceService._candidates(*where)).all(), title)
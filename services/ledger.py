@@ -1,7 +1,7 @@
 """分录服务模块 - 修复借贷平衡问题"""
 import json
 from typing import Optional
-from models import SessionLocal, LedgerEntry, PeriodClose, Account
+from models import SessionLocal, LedgerEntry, PeriodClose
 from config import get_logger
 from utils.exceptions import PeriodClosedError, ValidationError
 
@@ -64,8 +64,9 @@ class LedgerService:
             logger.warning(f"尝试在已关账期 {period} 记账")
             raise PeriodClosedError(f"账期 {period} 已关账")
         if direction is None:
-            acc = s.query(Account).get(int(account_id)) if account_id else None
-            nature = (acc.nature if acc else '').lower()
+            from .cache import account_natures
+            nature = (account_natures(s).get(int(account_id)) if account_id else None) or ''
+            nature = nature.lower()
             base_dir = 1 if nature == 'asset' else -1
             direction = base_dir if amount >= 0 else -base_dir
             side = nature or side
@@ -0,0 +1,146 @@
+"""列表查询模块 - 只投影展示所需列，关联房产在同一条语句中完成，避免逐行懒加载"""
+from typing import List, NamedTuple, Optional, Tuple
+import pandas as pd
+from sqlalchemy import desc, event, func, literal_column, select, text
+from sqlalchemy.engine import Engine
+from sqlalchemy.sql.dml import UpdateBase
+from models import Bill, PaymentRecord, Room
+from utils.pagination import keyset_page
+from .cache import RefCache
+from .invoicing import not_invoiced
+
+# 账单浏览总数缓存名，按筛选条件分条缓存，任何账单写入后整体失效
+BILL_BROWSER_COUNT = "bill_browser_count"
+# 账单浏览游标键：空账期按 '' 参与比较并排在最后，与 bills 表的 period_key 表达式索引一致
+# '' 须以字面量渲染，绑定参数会使 SQLite 无法匹配表达式索引
+PERIOD_KEY = func.coalesce(Bill.period, literal_column("''"))
+
+
+class InvoiceCandidate(NamedTuple):
+    """可开票账单（已缴且未开票）"""
+    id: int
+    room_number: str
+    owner_name: str
+    fee_type: str
+    period: str
+    amount_paid: float
+
+    @property
+    def label(self) -> str:
+        return f"{self.room_number} | {self.fee_type} | {self.period} | ¥{self.amount_paid:.2f}"
+
+
+class BillFilter(NamedTuple):
+    """账单浏览筛选条件，空值表示不限"""
+    period: Optional[str] = None
+    fee_type: Optional[str] = None
+    status: Optional[str] = None
+    room_prefix: Optional[str] = None
+    min_amount: Optional[float] = None
+    max_amount: Optional[float] = None
+
+
+def filter_bills(query, f: BillFilter):
+    """在关联房产的查询上应用账单筛选条件（浏览、计数与导出共用）"""
+    query = query.join(Room, Bill.room_id == Room.id).filter(Room.is_deleted.is_(False))
+    if f.period:
+        query = query.filter(Bill.period == f.period)
+    if f.fee_type:
+        query = query.filter(Bill.fee_type == f.fee_type)
+    if f.status:
+        query = query.filter(Bill.status == f.status)
+    if f.room_prefix:
+        # 区间比较代替 LIKE 'x%'，可走房号索引
+        query = query.filter(Room.room_number >= f.room_prefix, Room.room_number < f.room_prefix + "\uffff")
+    if f.min_amount is not None:
+        query = query.filter(Bill.amount_due >= f.min_amount)
+    if f.max_amount is not None:
+        query = query.filter(Bill.amount_due <= f.max_amount)
+    return query
+
+
+def _bills_written(conn, clauseelement, multiparams, params, execution_options, result):
+    """账单表的 INSERT/UPDATE/DELETE（含 ORM 刷新与批量 Core 语句）后使浏览计数失效"""
+    if isinstance(clauseelement, UpdateBase) and getattr(clauseelement.table, "name", None) == Bill.__tablename__:
+        RefCache.invalidate(conn, BILL_BROWSER_COUNT)
+
+
+def install_count_invalidation():
+    """注册全局 after_execute 监听（重复调用安全）"""
+    if not event.contains(Engine, 'after_execute', _bills_written):
+        event.listen(Engine, 'after_execute', _bills_written)
+
+
+def drop_legacy_browser_indexes(conn):
+    """删除按原始账期建的浏览索引，已由 period_key 表达式索引取代（作为数据迁移执行一次）"""
+    for name in ["ix_bills_period_id", "ix_bills_fee_type_period_id", "ix_bills_status_period_id"]:
+        conn.execute(text(f"DROP INDEX IF EXISTS {name}"))
+
+
+def _frame(s, stmt) -> pd.DataFrame:
+    res = s.execute(stmt)
+    return pd.DataFrame([tuple(r) for r in res], columns=list(res.keys()))
+
+
+def _minutes(col: pd.Series) -> pd.Series:
+    return pd.to_datetime(col, errors="coerce").dt.strftime("%Y-%m-%d %H:%M").fillna("")
+
+
+class ListingService:
+    @staticmethod
+    def bill_frame(s, limit: Optional[int] = None, offset: int = 0) -> pd.DataFrame:
+        """未删除房产的账单明细：房号/科目/账期/应收/减免/实收/状态"""
+        stmt = (select(Room.room_number.label("房号"), Bill.fee_type.label("科目"), Bill.period.label("账期"),
+                       func.coalesce(Bill.amount_due, 0).label("应收"), func.coalesce(Bill.discount, 0).label("减免"),
+                       func.coalesce(Bill.amount_paid, 0).label("实收"), Bill.status.label("状态"))
+                .join(Room, Bill.room_id == Room.id).where(Room.is_deleted.is_(False))
+                .order_by(Bill.id).offset(offset).limit(limit))
+        return _frame(s, stmt)
+
+    @staticmethod
+    def payment_frame(s, limit: Optional[int] = None, latest_first: bool = True) -> pd.DataFrame:
+        """未删除房产的收款流水：时间/房号/类型/金额/方式/操作人"""
+        order = desc(PaymentRecord.created_at) if latest_first else PaymentRecord.id
+        stmt = (select(PaymentRecord.created_at.label("时间"), Room.room_number.label("房号"),
+                       PaymentRecord.biz_type.label("类型"), PaymentRecord.amount.label("金额"),
+                       PaymentRecord.pay_method.label("方式"), PaymentRecord.operator.label("操作人"))
+                .join(Room, PaymentRecord.room_id == Room.id).where(Room.is_deleted.is_(False))
+                .order_by(order).limit(limit))
+        df = _frame(s, stmt)
+        df["时间"] = _minutes(df["时间"])
+        return df
+
+    @staticmethod
+    def invoice_candidates(s, period: Optional[str] = None) -> List[InvoiceCandidate]:
+        """已缴且未开票的账单，附带房号与业主；可限定账期"""
+        stmt = (select(Bill.id, func.coalesce(Room.room_number, ""), func.coalesce(Room.owner_name, ""),
+                       Bill.fee_type, Bill.period, func.coalesce(Bill.amount_paid, 0))
+                .outerjoin(Room, Bill.room_id == Room.id)
+                .where(Bill.status == '已缴', not_invoiced()).order_by(Bill.id))
+        if period:
+            stmt = stmt.where(Bill.period == period)
+        return [InvoiceCandidate(*r) for r in s.execute(stmt)]
+
+    @staticmethod
+    def browse_bills(s, f: BillFilter, cursor: Optional[Tuple] = None,
+                     page_size: int = 50) -> Tuple[pd.DataFrame, Optional[Tuple], bool]:
+        """
+        账单浏览：按 (COALESCE(账期, ''), id) 倒序游标分页，深页与首页代价相同。
+        空账期的账单按 '' 参与游标比较，排在最后一段。
+        返回 (本页明细, 下一页游标, 是否还有下一页)
+        """
+        period_key = PERIOD_KEY.label("period_key")
+        query = filter_bills(s.query(
+            Bill.id, period_key, Room.room_number, Room.owner_name, Bill.fee_type,
+            func.coalesce(Bill.amount_due, 0).label("amount_due"), func.coalesce(Bill.discount, 0).label("discount"),
+            func.coalesce(Bill.amount_paid, 0).label("amount_paid"), Bill.status), f)
+        rows, next_cursor, has_more = keyset_page(query, [period_key, Bill.id], cursor, page_size)
+        df = pd.DataFrame([tuple(r) for r in rows],
+                          columns=["ID", "账期", "房号", "业主", "科目", "应收", "减免", "实收", "状态"])
+        return df, next_cursor, has_more
+
+    @staticmethod
+    def count_bills(s, f: BillFilter) -> int:
+        """符合条件的账单数，按筛选条件缓存，账单写入后失效"""
+        return RefCache.get(s, BILL_BROWSER_COUNT,
+                            lambda s: filter_bills(s.query(func.count(Bill.id)), f).scalar() or 0, arg=f)
@@ -0,0 +1,230 @@
+"""登录限流模块 - 内存滑动窗口 + 异步批量回写 LoginFail"""
+import datetime
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Optional
+from config import config, get_logger
+from models import SessionLocal, LoginFail
+
+logger = get_logger(__name__)
+
+
+class LoginLimiter:
+    """
+    按账号与客户端IP分别维护失败时间窗口，命中阈值即锁定。
+    账号状态与 IP 锁定由后台线程批量回写 login_fail 表（IP 以 "ip:地址" 为名），启动时从表中恢复，
+    失败尝试本身不再逐次写库。窗口与锁定均已过期的键在回写时清除，
+    失败窗口数超过 LOGIN_TRACK_MAX_KEYS 时淘汰最久未活动且未锁定的键，内存不随攻击尝试的账号/IP 数无限增长；
+    锁定中的键从不淘汰，只在到期后清除。
+    """
+    _lock = threading.Lock()
+    _attempts = OrderedDict()
+    _locked_until = {}
+    _dirty = set()
+    _loaded = False
+    _flusher = None
+
+    @staticmethod
+    def _now() -> datetime.datetime:
+        return datetime.datetime.now()
+
+    @classmethod
+    def _window(cls) -> datetime.timedelta:
+        return datetime.timedelta(minutes=config.LOGIN_WINDOW_MINUTES)
+
+    @classmethod
+    def _ensure_loaded(cls):
+        """首次使用时从 login_fail 表恢复锁定与窗口内失败次数"""
+        if cls._loaded:
+            return
+        now = cls._now()
+        s = SessionLocal()
+        try:
+            rows = s.query(LoginFail.username, LoginFail.fail_count, LoginFail.locked_until, LoginFail.updated_at).filter(
+                (LoginFail.locked_until > now) | (LoginFail.updated_at >= now - cls._window())
+            ).all()
+        except Exception as e:
+            logger.error(f"登录失败记录恢复失败: {e}")
+            rows = []
+        finally:
+            s.close()
+        for r in rows:
+            key = cls._key_of(r.username)
+            if r.locked_until and r.locked_until > now:
+                cls._locked_until[key] = r.locked_until
+            if r.fail_count and r.updated_at and r.updated_at >= now - cls._window():
+                cls._attempts[key] = deque([r.updated_at] * r.fail_count)
+        cls._loaded = True
+        logger.info(f"登录限流状态已恢复: {len(rows)} 个账号/IP")
+
+    @staticmethod
+    def _key_of(name: str) -> str:
+        """login_fail.username -> 内存键"""
+        return name if name.startswith("ip:") else f"u:{name}"
+
+    @staticmethod
+    def _name_of(key: str) -> str:
+        """内存键 -> login_fail.username"""
+        return key[2:] if key.startswith("u:") else key
+
+    @classmethod
+    def _evict(cls):
+        """按最久未活动淘汰未锁定的失败窗口；被淘汰的键不再回写，避免以空状态覆盖库中记录"""
+        excess = len(cls._attempts) - config.LOGIN_TRACK_MAX_KEYS
+        if excess <= 0:
+            return
+        victims = []
+        for key in cls._attempts:
+            if key not in cls._locked_until:
+                victims.append(key)
+                if len(victims) >= excess:
+                    break
+        for key in victims:
+            del cls._attempts[key]
+            cls._dirty.discard(key)
+
+    @classmethod
+    def _prune(cls, now: datetime.datetime) -> int:
+        """清除窗口内已无失败记录且未锁定的键，返回清除数量"""
+        start = now - cls._window()
+        expired = [k for k, until in cls._locked_until.items() if until <= now]
+        for k in expired:
+            del cls._locked_until[k]
+        stale = [k for k, q in cls._attempts.items() if (not q or q[-1] < start) and k not in cls._locked_until]
+        for k in stale:
+            del cls._attempts[k]
+        return len(expired) + len(stale)
+
+    @classmethod
+    def _is_key_locked(cls, key: str, now: datetime.datetime) -> bool:
+        until = cls._locked_until.get(key)
+        if until and now < until:
+            return True
+        if until:
+            # 锁定期满后重新计数
+            del cls._locked_until[key]
+            cls._attempts.pop(key, None)
+        return False
+
+    @classmethod
+    def _hit(cls, key: str, limit: int, now: datetime.datetime) -> int:
+        q = cls._attempts.get(key)
+        if q is None:
+            q = cls._attempts[key] = deque()
+        cls._attempts.move_to_end(key)
+        q.append(now)
+        start = now - cls._window()
+        while q and q[0] < start:
+            q.popleft()
+        if len(q) >= limit:
+            cls._locked_until[key] = now + datetime.timedelta(minutes=config.LOCK_MINUTES)
+        cls._evict()
+        return len(q)
+
+    @classmethod
+    def is_locked(cls, username: str, ip: Optional[str] = None) -> bool:
+        now = cls._now()
+        with cls._lock:
+            cls._ensure_loaded()
+            if cls._is_key_locked(f"u:{username}", now):
+                return True
+            return bool(ip) and cls._is_key_locked(f"ip:{ip}", now)
+
+    @classmethod
+    def record_fail(cls, username: str, ip: Optional[str] = None) -> int:
+        """记录一次失败，返回账号在窗口内的失败次数"""
+        now = cls._now()
+        with cls._lock:
+            cls._ensure_loaded()
+            key = f"u:{username}"
+            if cls._is_key_locked(key, now):
+                return len(cls._attempts.get(key, ()))
+            count = cls._hit(key, config.LOGIN_MAX_FAIL, now)
+            if key in cls._locked_until:
+                logger.warning(f"账号 {username} 已锁定 {config.LOCK_MINUTES} 分钟")
+            if ip:
+                ip_key = f"ip:{ip}"
+                cls._hit(ip_key, config.LOGIN_MAX_FAIL_IP, now)
+                if ip_key in cls._locked_until:
+                    # IP 只在锁定时回写，未达阈值的计数不落库
+                    cls._dirty.add(ip_key)
+                    logger.warning(f"IP {ip} 失败次数过多，已锁定 {config.LOCK_MINUTES} 分钟")
+            cls._dirty.add(key)
+        cls._start_flusher()
+        logger.info(f"登录失败记录: {username}, 次数: {count}")
+        return count
+
+    @classmethod
+    def clear_fail(cls, username: str):
+        with cls._lock:
+            cls._ensure_loaded()
+            key = f"u:{username}"
+            # 没有失败状态时不产生任何写入
+            if key not in cls._attempts and key not in cls._locked_until:
+                return
+            cls._attempts.pop(key, None)
+            cls._locked_until.pop(key, None)
+            cls._dirty.add(key)
+        cls._start_flusher()
+
+    @classmethod
+    def flush(cls) -> int:
+        """清除过期键，并将脏账号/IP 的状态一次性批量回写 login_fail，返回回写条数"""
+        with cls._lock:
+            now = cls._now()
+            cls._prune(now)
+            if not cls._dirty:
+                return 0
+            start = now - cls._window()
+            snapshot = {}
+            for key in cls._dirty:
+                count = sum(1 for t in cls._attempts.get(key, ()) if t >= start)
+                snapshot[cls._name_of(key)] = (count, cls._locked_until.get(key))
+            cls._dirty = set()
+        s = SessionLocal()
+        try:
+            existing = {r.username: r for r in s.query(LoginFail).filter(LoginFail.username.in_(list(snapshot)))}
+            for username, (count, locked_until) in snapshot.items():
+                rec = existing.get(username)
+                if rec is None:
+                    if not count and not locked_until:
+                        continue
+                    s.add(LoginFail(username=username, fail_count=count, locked_until=locked_until, updated_at=now))
+                else:
+                    rec.fail_count = count
+                    rec.locked_until = locked_until
+                    rec.updated_at = now
+            s.commit()
+            return len(snapshot)
+        except Exception as e:
+            s.rollback()
+            logger.error(f"登录失败状态回写失败: {e}")
+            with cls._lock:
+                cls._dirty.update(cls._key_of(name) for name in snapshot)
+            return 0
+        finally:
+            s.close()
+
+    @classmethod
+    def _start_flusher(cls):
+        with cls._lock:
+            if cls._flusher is not None:
+                return
+
+            def _run():
+                while True:
+                    time.sleep(config.LOGIN_FLUSH_SECONDS)
+                    cls.flush()
+
+            cls._flusher = threading.Thread(target=_run, name="login-fail-flusher", daemon=True)
+            cls._flusher.start()
+
+    @classmethod
+    def reset(cls):
+        """清空内存状态（测试或切换数据库时使用）"""
+        with cls._lock:
+            cls._attempts.clear()
+            cls._locked_until.clear()
+            cls._dirty.clear()
+            cls._loaded = False
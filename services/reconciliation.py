@@ -0,0 +1,179 @@
+"""收费核对模块 - 分组与状态判定在 SQL 中完成，已关账账期结果缓存；逐户三方核对按水位增量执行"""
+import datetime
+from typing import Optional, Tuple
+import pandas as pd
+from sqlalchemy import case, func, select
+from config import config, get_logger
+from models import (Room, Bill, PeriodClose, LedgerEntry, PaymentRecord, DataChangeHistory,
+                    RoomReconciliation, ReconciliationWatermark)
+from .cache import RefCache
+
+logger = get_logger(__name__)
+
+RECONCILIATION = "reconciliation"
+
+# 预收账款科目
+PREPAID_ACCOUNT_ID = 3
+ROOM_WATERMARK = "room_balance"
+# 增量核对时 IN 列表的分块大小
+ROOM_CHUNK = 500
+
+# 明细列：(显示名, SQL 列名)
+DETAIL_COLUMNS = [("房号", "room_number"), ("业主", "owner_name"), ("费用类型", "fee_type"),
+                  ("应收金额", "due"), ("实收金额", "paid"), ("减免金额", "discount"),
+                  ("欠费金额", "arrears"), ("状态", "status")]
+SORTABLE = dict(DETAIL_COLUMNS)
+
+
+def _detail_select(period: str, fee_type: Optional[str]):
+    """按 房号/业主/费用类型 分组汇总并用 CASE 判定状态"""
+    q = select(
+        Room.room_number.label("room_number"), Room.owner_name.label("owner_name"), Bill.fee_type.label("fee_type"),
+        func.coalesce(func.sum(Bill.amount_due), 0).label("due"),
+        func.coalesce(func.sum(Bill.amount_paid), 0).label("paid"),
+        func.coalesce(func.sum(Bill.discount), 0).label("discount"),
+    ).join(Room, Bill.room_id == Room.id).where(Bill.period == period)
+    if fee_type:
+        q = q.where(Bill.fee_type == fee_type)
+    g = q.group_by(Room.room_number, Room.owner_name, Bill.fee_type).subquery()
+    arrears = (g.c.due - g.c.paid - g.c.discount)
+    status = case((func.abs(arrears) < 0.01, "✅ 已结清"), (g.c.paid > 0, "⚠️ 部分已缴"), else_="❌ 未缴")
+    return select(g.c.room_number, g.c.owner_name, g.c.fee_type, g.c.due, g.c.paid, g.c.discount,
+                  arrears.label("arrears"), status.label("status")).subquery()
+
+
+def _summary(s, detail) -> dict:
+    row = s.execute(select(func.count(), func.sum(detail.c.due), func.sum(detail.c.paid),
+                           func.sum(detail.c.arrears))).one()
+    return {"rows": row[0], "due": float(row[1] or 0), "paid": float(row[2] or 0), "arrears": float(row[3] or 0)}
+
+
+def _to_frame(rows) -> pd.DataFrame:
+    return pd.DataFrame([tuple(r) for r in rows], columns=[c for c, _ in DETAIL_COLUMNS])
+
+
+class ReconciliationService:
+    @staticmethod
+    def closed_at(s, period: str):
+        """已关账账期返回关账时间，否则 None"""
+        return s.query(PeriodClose.closed_at).filter(PeriodClose.period == period, PeriodClose.closed.is_(True)).scalar()
+
+    @staticmethod
+    def _closed_result(s, period: str, fee_type: Optional[str], closed_at) -> Tuple[dict, pd.DataFrame]:
+        """已关账账期整体计算一次后缓存；关账时间计入缓存名，解锁重关后自动失效"""
+        def load(s):
+            detail = _detail_select(period, fee_type)
+            df = _to_frame(s.execute(select(detail)))
+            logger.info(f"核对结果已缓存: {period} {fee_type or '全部'} {len(df)} 行")
+            return _summary(s, detail), df
+        name = f"{RECONCILIATION}:{period}:{fee_type or ''}:{closed_at}"
+        return RefCache.get(s, name, load, ttl=config.RECON_CACHE_TTL)
+
+    @staticmethod
+    def workbench(s, period: str, fee_type: Optional[str] = None, sort_by: str = "房号",
+                  descending: bool = False, page: int = 1, page_size: int = None) -> Tuple[dict, pd.DataFrame, bool]:
+        """
+        返回 (汇总, 当前页明细, 是否来自关账缓存)。
+        未关账账期在数据库中完成分组、排序与分页；已关账账期在缓存结果上排序分页。
+        """
+        page_size = page_size or config.PAGE_SIZE
+        offset = max(page - 1, 0) * page_size
+        col = SORTABLE.get(sort_by, "room_number")
+        closed_at = ReconciliationService.closed_at(s, period)
+        if closed_at is not None:
+            summary, df = ReconciliationService._closed_result(s, period, fee_type, closed_at)
+            sort_by = sort_by if sort_by in SORTABLE else "房号"
+            keys = [sort_by] + [k for k in ("房号", "费用类型") if k != sort_by]
+            asc = [not descending] + [True] * (len(keys) - 1)
+            page_df = df.sort_values(keys, ascending=asc, kind="stable").iloc[offset:offset + page_size]
+            return summary, page_df.reset_index(drop=True), True
+
+        detail = _detail_select(period, fee_type)
+        order = detail.c[col].desc() if descending else detail.c[col].asc()
+        rows = s.execute(select(detail).order_by(order, detail.c.room_number, detail.c.fee_type)
+                         .limit(page_size).offset(offset))
+        return _summary(s, detail), _to_frame(rows), False
+
+    @staticmethod
+    def _room_rows(s, room_ids=None):
+        """一次分组查询得到各房产的 余额 / 预收账款净额 / 收款净额"""
+        ledger = select(LedgerEntry.room_id, func.sum(LedgerEntry.amount * LedgerEntry.direction * -1).label("net")
+                        ).where(LedgerEntry.account_id == PREPAID_ACCOUNT_ID)
+        pay = select(PaymentRecord.room_id, func.sum(PaymentRecord.amount).label("total"))
+        rooms = select(Room.id, case((Room.is_deleted.is_(True), 0.0), else_=func.coalesce(Room.balance, 0)).label("balance"))
+        if room_ids is not None:
+            ledger = ledger.where(LedgerEntry.room_id.in_(room_ids))
+            pay = pay.where(PaymentRecord.room_id.in_(room_ids))
+            rooms = rooms.where(Room.id.in_(room_ids))
+        ledger = ledger.group_by(LedgerEntry.room_id).subquery()
+        pay = pay.group_by(PaymentRecord.room_id).subquery()
+        rooms = rooms.subquery()
+        return s.execute(select(rooms.c.id, rooms.c.balance, func.coalesce(ledger.c.net, 0), func.coalesce(pay.c.total, 0))
+                         .outerjoin(ledger, ledger.c.room_id == rooms.c.id)
+                         .outerjoin(pay, pay.c.room_id == rooms.c.id)).all()
+
+    @staticmethod
+    def _store(s, rows, now) -> int:
+        mismatches = [RoomReconciliation(room_id=rid, room_balance=float(bal), ledger_balance=float(net),
+                                         payment_total=float(paid), diff=float(bal) - float(net), checked_at=now)
+                      for rid, bal, net, paid in rows if abs(float(bal) - float(net)) >= 0.01]
+        s.add_all(mismatches)
+        return len(mismatches)
+
+    @staticmethod
+    def reconcile_rooms(s, full: bool = False) -> dict:
+        """
+        逐户核对 房产余额 与 预收账款科目净额，仅保存不一致的房产。
+        增量模式只重算上次核对后有新分录、新收款或房产变更记录的房产；
+        分录/收款被物理删除等情况需 full=True 全量重算。
+        """
+        now = datetime.datetime.now()
+        # 先取水位再计算，计算期间新写入的数据会在下次增量中处理
+        marks = (s.query(func.max(LedgerEntry.id)).scalar() or 0,
+                 s.query(func.max(PaymentRecord.id)).scalar() or 0,
+                 s.query(func.max(DataChangeHistory.id)).scalar() or 0)
+        wm = s.query(ReconciliationWatermark).filter_by(name=ROOM_WATERMARK).first()
+        full = full or wm is None
+        if full:
+            s.query(RoomReconciliation).delete()
+            rows = ReconciliationService._room_rows(s)
+            checked, mismatched = len(rows), ReconciliationService._store(s, rows, now)
+        else:
+            touched = {r[0] for r in s.query(LedgerEntry.room_id).filter(
+                LedgerEntry.id > wm.ledger_id, LedgerEntry.room_id.isnot(None)).distinct()}
+            touched |= {r[0] for r in s.query(PaymentRecord.room_id).filter(
+                PaymentRecord.id > wm.payment_id, PaymentRecord.room_id.isnot(None)).distinct()}
+            touched |= {r[0] for r in s.query(DataChangeHistory.record_id).filter(
+                DataChangeHistory.id > wm.change_id, DataChangeHistory.table_name == 'rooms').distinct()}
+            ids = sorted(touched)
+            checked = mismatched = 0
+            for i in range(0, len(ids), ROOM_CHUNK):
+                chunk = ids[i:i + ROOM_CHUNK]
+                s.query(RoomReconciliation).filter(RoomReconciliation.room_id.in_(chunk)).delete(synchronize_session=False)
+                rows = ReconciliationService._room_rows(s, chunk)
+                checked += len(rows)
+                mismatched += ReconciliationService._store(s, rows, now)
+        if wm is None:
+            wm = ReconciliationWatermark(name=ROOM_WATERMARK)
+            s.add(wm)
+        wm.ledger_id, wm.payment_id, wm.change_id = marks
+        wm.run_at = now
+        s.commit()
+        total = s.query(func.count(RoomReconciliation.id)).scalar()
+        logger.info(f"逐户三方核对({'全量' if full else '增量'}): 重算 {checked} 户, 本次差异 {mismatched} 户, 当前差异 {total} 户")
+        return {"full": full, "checked": checked, "mismatched": total, "run_at": now}
+
+    @staticmethod
+    def room_mismatches(s) -> pd.DataFrame:
+        """当前不一致的房产列表，按差异绝对值降序"""
+        rows = s.query(Room.room_number, Room.owner_name, RoomReconciliation.room_balance,
+                       RoomReconciliation.ledger_balance, RoomReconciliation.payment_total,
+                       RoomReconciliation.diff, RoomReconciliation.checked_at
+                       ).join(Room, Room.id == RoomReconciliation.room_id
+                              ).order_by(func.abs(RoomReconciliation.diff).desc()).all()
+        return pd.DataFrame([tuple(r) for r in rows],
+                            columns=["房号", "业主", "房产余额", "预收账款净额", "收款净额", "差异", "核对时间"])
+
+    @staticmethod
+    def last_room_run(s):
+        return s.query(ReconciliationWatermark.run_at).filter_by(name=ROOM_WATERMARK).scalar()
@@ -0,0 +1,71 @@
+"""财务报表查询模块 - 按生效账期一次分组汇总，利润表、账期对比与趋势共用"""
+from typing import Optional, Sequence
+import numpy as np
+import pandas as pd
+from sqlalchemy import func, text
+from config import get_logger
+from models import Bill
+
+logger = get_logger(__name__)
+
+PERIOD_COLUMNS = ["应收", "减免", "实收"]
+
+# 账单生效账期：优先会计归属期（收缴率、报表共用）
+EFFECTIVE_PERIOD = func.coalesce(Bill.accounting_period, Bill.period)
+
+
+def install_effective_period(conn):
+    """回填历史账单的会计归属期，并建立生效账期表达式覆盖索引（作为数据迁移执行一次）"""
+    res = conn.execute(text(
+        "UPDATE bills SET accounting_period = CASE WHEN length(period) >= 7 THEN substr(period, 1, 7) ELSE period END "
+        "WHERE accounting_period IS NULL AND COALESCE(period, '') != ''"
+    ))
+    # 表达式须与 EFFECTIVE_PERIOD 一致，分组汇总可直接在索引上完成
+    conn.execute(text(
+        "CREATE INDEX IF NOT EXISTS ix_bills_effective_period "
+        "ON bills(COALESCE(accounting_period, period), amount_due, discount, amount_paid)"
+    ))
+    logger.info(f"已回填 {res.rowcount} 笔账单的会计归属期")
+
+
+class FinancialReportService:
+    @staticmethod
+    def period_totals(s, start: Optional[str] = None, end: Optional[str] = None,
+                      periods: Optional[Sequence[str]] = None) -> pd.DataFrame:
+        """
+        各生效账期的 应收/减免/实收/未收/收缴率，一次分组查询完成。
+        可按账期区间 [start, end] 或指定账期列表筛选，结果按账期升序。
+        """
+        q = s.query(EFFECTIVE_PERIOD, func.coalesce(func.sum(Bill.amount_due), 0),
+                    func.coalesce(func.sum(Bill.discount), 0), func.coalesce(func.sum(Bill.amount_paid), 0))
+        if start:
+            q = q.filter(EFFECTIVE_PERIOD >= start)
+        if end:
+            q = q.filter(EFFECTIVE_PERIOD <= end)
+        if periods is not None:
+            q = q.filter(EFFECTIVE_PERIOD.in_(list(periods)))
+        rows = q.group_by(EFFECTIVE_PERIOD).order_by(EFFECTIVE_PERIOD).all()
+        df = pd.DataFrame([tuple(r) for r in rows], columns=["账期"] + PERIOD_COLUMNS).set_index("账期")
+        df = df.astype(float)
+        df["未收"] = df["应收"] - df["减免"] - df["实收"]
+        due = df["应收"].to_numpy()
+        df["收缴率(%)"] = np.round(np.divide(df["实收"].to_numpy() * 100, due, out=np.zeros_like(due), where=due > 0), 2)
+        return df
+
+    @staticmethod
+    def income_statement(s, start: str, end: str) -> pd.DataFrame:
+        """简化利润表：由账期汇总累加得到"""
+        totals = FinancialReportService.period_totals(s, start, end)[PERIOD_COLUMNS].sum()
+        due, discount, paid = (float(totals[c]) for c in PERIOD_COLUMNS)
+        return pd.DataFrame([
+            {"项目": "应收收入", "金额": due},
+            {"项目": "减：减免金额", "金额": discount},
+            {"项目": "已收款金额", "金额": paid},
+            {"项目": "未收款金额", "金额": due - discount - paid},
+        ])
+
+    @staticmethod
+    def periods(s) -> list:
+        """全部 YYYY-MM 格式的生效账期（升序）"""
+        rows = s.query(EFFECTIVE_PERIOD).distinct().order_by(EFFECTIVE_PERIOD).all()
+        return [p for p, in rows if p and len(p) == 7]
@@ -0,0 +1,99 @@
+"""收款日汇总模块 - daily_payment_rollup 由触发器随 payment_records 增量维护"""
+import datetime
+from typing import List, Optional, Sequence, Tuple
+from sqlalchemy import func, text
+from config import get_logger
+from models import DailyPaymentRollup
+
+logger = get_logger(__name__)
+
+_DAY = "COALESCE(date({ref}.created_at), date('now', 'localtime'))"
+
+
+def _apply_sql(ref: str, sign: int) -> str:
+    """把 ref（NEW/OLD）行以 sign 方向累加进日汇总"""
+    return (
+        "INSERT INTO daily_payment_rollup(day, pay_method, biz_type, amount, refund_amount, count) "
+        f"VALUES ({_DAY.format(ref=ref)}, COALESCE({ref}.pay_method, ''), COALESCE({ref}.biz_type, ''), "
+        f"{sign} * MAX({ref}.amount, 0), {sign} * MIN({ref}.amount, 0), {sign}) "
+        "ON CONFLICT(day, pay_method, biz_type) DO UPDATE SET "
+        "amount = amount + excluded.amount, refund_amount = refund_amount + excluded.refund_amount, "
+        "count = count + excluded.count"
+    )
+
+
+def install_payment_rollup(conn):
+    """创建 payment_records 的汇总触发器并全量回填（作为数据迁移执行一次）"""
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS payment_records_rollup_ai AFTER INSERT ON payment_records "
+        f"BEGIN {_apply_sql('NEW', 1)}; END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS payment_records_rollup_au AFTER UPDATE OF amount, pay_method, biz_type, created_at "
+        f"ON payment_records BEGIN {_apply_sql('OLD', -1)}; {_apply_sql('NEW', 1)}; END"
+    ))
+    conn.execute(text(
+        f"CREATE TRIGGER IF NOT EXISTS payment_records_rollup_ad AFTER DELETE ON payment_records "
+        f"BEGIN {_apply_sql('OLD', -1)}; END"
+    ))
+    _rebuild(conn)
+
+
+def _rebuild(conn, start: Optional[datetime.date] = None, end: Optional[datetime.date] = None) -> int:
+    src, dst, params = [], [], {}
+    if start:
+        src.append("created_at >= :start")
+        dst.append("day >= :start")
+        params["start"] = start.isoformat()
+    if end:
+        src.append("created_at < :end_next")
+        dst.append("day <= :end")
+        params["end"] = end.isoformat()
+        params["end_next"] = (end + datetime.timedelta(days=1)).isoformat()
+    conn.execute(text("DELETE FROM daily_payment_rollup" + (" WHERE " + " AND ".join(dst) if dst else "")), params)
+    res = conn.execute(text(
+        "INSERT INTO daily_payment_rollup(day, pay_method, biz_type, amount, refund_amount, count) "
+        f"SELECT {_DAY.format(ref='payment_records')}, COALESCE(pay_method, ''), COALESCE(biz_type, ''), "
+        "SUM(MAX(amount, 0)), SUM(MIN(amount, 0)), COUNT(*) FROM payment_records"
+        + (" WHERE " + " AND ".join(src) if src else "") + " GROUP BY 1, 2, 3"
+    ), params)
+    return res.rowcount
+
+
+class PaymentRollupService:
+    @staticmethod
+    def rebuild(s, start: Optional[datetime.date] = None, end: Optional[datetime.date] = None) -> int:
+        """按收款明细重算日汇总（可限定日期范围），返回写入的汇总行数"""
+        count = _rebuild(s.connection(), start, end)
+        s.commit()
+        logger.info(f"收款日汇总已重建: {start or '最早'} ~ {end or '最新'}，{count} 行")
+        return count
+
+    @staticmethod
+    def revenue(s, start: datetime.date, end: datetime.date, exclude_methods: Sequence[str] = ('期初导入',)) -> float:
+        """期间实收（仅正向收款），读取日汇总而非扫描收款明细"""
+        q = s.query(func.sum(DailyPaymentRollup.amount)).filter(
+            DailyPaymentRollup.day >= start, DailyPaymentRollup.day <= end)
+        if exclude_methods:
+            q = q.filter(DailyPaymentRollup.pay_method.notin_(list(exclude_methods)))
+        return float(q.scalar() or 0)
+
+    @staticmethod
+    def net_total(s, start: datetime.date, end: datetime.date) -> float:
+        """期间收款净额（含冲销）"""
+        return float(s.query(func.sum(DailyPaymentRollup.amount + DailyPaymentRollup.refund_amount)).filter(
+            DailyPaymentRollup.day >= start, DailyPaymentRollup.day <= end).scalar() or 0)
+
+    @staticmethod
+    def totals_by_method(s, start: Optional[datetime.date] = None,
+                         end: Optional[datetime.date] = None) -> List[Tuple[str, float, int]]:
+        """按支付方式汇总的收款净额与笔数，可限定日期范围"""
+        q = s.query(DailyPaymentRollup.pay_method,
+                    func.sum(DailyPaymentRollup.amount + DailyPaymentRollup.refund_amount),
+                    func.sum(DailyPaymentRollup.count))
+        if start:
+            q = q.filter(DailyPaymentRollup.day >= start)
+        if end:
+            q = q.filter(DailyPaymentRollup.day <= end)
+        rows = q.group_by(DailyPaymentRollup.pay_method).having(func.sum(DailyPaymentRollup.count) != 0).all()
+        return [(m, float(t or 0), int(c or 0)) for m, t, c in rows]
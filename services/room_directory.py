@@ -0,0 +1,139 @@
+"""房产目录缓存模块 - 紧凑数组 + 有序房号前缀检索，按ID水位增量刷新"""
+import bisect
+import threading
+import time
+from array import array
+from typing import List, NamedTuple, Optional
+from config import config, get_logger
+from models import Room
+from .cache import _db_key
+
+logger = get_logger(__name__)
+
+
+class RoomEntry(NamedTuple):
+    id: int
+    room_number: str
+    owner_name: str
+    balance: float
+
+
+class _Directory:
+    """单个物业库的房产目录：列存数组 + 按房号/业主排序的 (检索键, 下标) 列表"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.ids = array('q')
+        self.balances = array('d')
+        self.numbers = []
+        self.owners = []
+        self.by_number = []
+        self.by_owner = []
+        self.pos = {}
+        self.watermark = 0
+        self.loaded_at = time.monotonic()
+
+    def add(self, rid: int, number: str, owner: str, balance: float):
+        i = len(self.ids)
+        self.ids.append(rid)
+        self.balances.append(float(balance or 0))
+        self.numbers.append(number or "")
+        self.owners.append(owner or "")
+        self.pos[rid] = i
+        bisect.insort(self.by_number, ((number or "").casefold(), i))
+        if owner:
+            bisect.insort(self.by_owner, (owner.casefold(), i))
+        if rid > self.watermark:
+            self.watermark = rid
+
+    def entry(self, i: int) -> RoomEntry:
+        return RoomEntry(self.ids[i], self.numbers[i], self.owners[i], self.balances[i])
+
+    def prefix(self, index: list, prefix: str, limit: int, seen: set) -> List[RoomEntry]:
+        out = []
+        k = bisect.bisect_left(index, (prefix,))
+        while k < len(index) and len(out) < limit:
+            key, i = index[k]
+            if not key.startswith(prefix):
+                break
+            if i not in seen:
+                seen.add(i)
+                out.append(self.entry(i))
+            k += 1
+        return out
+
+
+class RoomDirectory:
+    """
+    收银台、手动开单等选择器使用的房产目录（id、房号、业主、余额）。
+    每次读取只按 id 水位增量加载新增房产；档案被修改或删除时由写路径调用 invalidate()，
+    另按 REF_CACHE_TTL 整体重建一次以兜底。余额为快照值，业务处理前应按 id 读取完整 Room。
+    """
+    _lock = threading.Lock()
+    _dirs = {}
+
+    @staticmethod
+    def _load(s, d: _Directory):
+        rows = s.query(Room.id, Room.room_number, Room.owner_name, Room.balance).filter(
+            Room.id > d.watermark, Room.is_deleted.is_(False)).order_by(Room.id).all()
+        for r in rows:
+            d.add(r.id, r.room_number, r.owner_name, r.balance)
+        if rows:
+            logger.debug(f"房产目录增量加载 {len(rows)} 条，水位 {d.watermark}")
+
+    @staticmethod
+    def _get(s) -> _Directory:
+        key = _db_key(s)
+        with RoomDirectory._lock:
+            d = RoomDirectory._dirs.get(key)
+            if d is None or time.monotonic() - d.loaded_at >= config.REF_CACHE_TTL:
+                d = RoomDirectory._dirs[key] = _Directory()
+        with d.lock:
+            RoomDirectory._load(s, d)
+        return d
+
+    @staticmethod
+    def search(s, text: str = "", limit: int = 50) -> List[RoomEntry]:
+        """按房号前缀检索（不区分大小写），不足 limit 条时再按业主姓名前缀补充"""
+        d = RoomDirectory._get(s)
+        prefix = (text or "").strip().casefold()
+        with d.lock:
+            seen = set()
+            out = d.prefix(d.by_number, prefix, limit, seen)
+            if prefix and len(out) < limit:
+                out += d.prefix(d.by_owner, prefix, limit - len(out), seen)
+        return out
+
+    @staticmethod
+    def get(s, room_id: int) -> Optional[RoomEntry]:
+        d = RoomDirectory._get(s)
+        with d.lock:
+            i = d.pos.get(room_id)
+            return d.entry(i) if i is not None else None
+
+    @staticmethod
+    def size(s) -> int:
+        return len(RoomDirectory._get(s).ids)
+
+    @staticmethod
+    def update_balance(s, room_id: int, balance: float):
+        """收款/充值提交后同步目录中的余额快照"""
+        d = RoomDirectory._dirs.get(_db_key(s))
+        if d is None:
+            return
+        with d.lock:
+            i = d.pos.get(room_id)
+            if i is not None:
+                d.balances[i] = float(balance or 0)
+
+    @staticmethod
+    def invalidate(s):
+        """房产档案被修改、删除或批量导入后调用，下次读取时整体重建"""
+        with RoomDirectory._lock:
+            RoomDirectory._dirs.pop(_db_key(s), None)
+        logger.debug("房产目录已失效")
+
+    @staticmethod
+    def clear():
+        with RoomDirectory._lock:
+            RoomDirectory._dirs.clear()
@@ -0,0 +1,261 @@
+"""房产档案导入模块 - 整表向量化校验与账单拆分，已有房产一次预读，房产/账单/收款/分录分块批量写入"""
+import datetime
+import time
+import uuid
+from typing import Dict, List, NamedTuple, Optional
+import numpy as np
+import pandas as pd
+from sqlalchemy import bindparam, insert, select, update
+from config import config, get_logger
+from models import Bill, DataChangeHistory, LedgerEntry, PaymentRecord, Room
+from utils.exceptions import ValidationError
+
+logger = get_logger(__name__)
+
+# 预收账款科目
+PREPAID_ACCOUNT_ID = 3
+TEXT_COLUMNS = ["房号", "业主", "业主电话", "费用项目", "欠费周期起", "欠费周期终"]
+NUMBER_COLUMNS = ["面积", "项目月标准金额", "历史欠费", "预缴金额", "已缴金额", "减免金额"]
+# 按空值处理的无效文本
+INVALID_TEXT = ["", "nan", "none", "null", "[object object]", "undefined"]
+ROOM_FIELDS = ["owner_name", "owner_phone", "area", "balance",
+               "fee1_name", "fee1_std", "fee2_name", "fee2_std", "fee3_name", "fee3_std"]
+FEE_SLOTS = [("fee1_name", "fee1_std"), ("fee2_name", "fee2_std"), ("fee3_name", "fee3_std")]
+ISSUE_COLUMNS = ["行号", "房号", "字段", "原值", "问题"]
+
+
+class RoomImportResult(NamedTuple):
+    batch_id: str
+    rows: int
+    new_rooms: int
+    updated_rooms: int
+    bills: int
+    payments: int
+    prepay: float
+    issues: pd.DataFrame   # 汇总的问题清单，列见 ISSUE_COLUMNS
+    preview: pd.DataFrame  # 拆分后的账单（按房号），供试运行预览
+
+
+def _fmt(value) -> str:
+    return "" if value is None else str(value)
+
+
+def _issues(frame: pd.DataFrame, field: str, values, message: str) -> pd.DataFrame:
+    return pd.DataFrame({"行号": frame["行号"].to_numpy(), "房号": frame["房号"].fillna("").to_numpy(),
+                         "字段": field, "原值": pd.Series(values, dtype=object).fillna("").astype(str).to_numpy(),
+                         "问题": message})
+
+
+def _month_index(text: pd.Series) -> pd.Series:
+    """YYYY-MM / YYYY-MM-DD（含 Excel 日期时间文本）-> 年*12+月-1，无法识别为 NaN"""
+    parts = text.str.replace("/", "-", regex=False).str.slice(0, 7).str.extract(r"^(\d{4})-(\d{2})$")
+    year, month = pd.to_numeric(parts[0]).astype(float), pd.to_numeric(parts[1]).astype(float)
+    return (year * 12 + month - 1).where((month >= 1) & (month <= 12))
+
+
+def _split(total: np.ndarray, n: np.ndarray, last: np.ndarray) -> np.ndarray:
+    """金额按月数平分到两位小数，余数计入最后一个月"""
+    per = np.repeat(np.round(total / n, 2), n)
+    rest = np.round(np.repeat(total, n) - per * (np.repeat(n, n) - 1), 2)
+    return np.where(last, rest, per)
+
+
+def _normalize(df: pd.DataFrame):
+    """整表清洗：文本去空白、数字列统一转换、账期解析为月序号；返回 (清洗后的表, 问题列表)"""
+    df = df.rename(columns=lambda c: str(c).strip())
+    if "房号" not in df.columns:
+        raise ValidationError("缺少必填列：房号")
+    df = df.reset_index(drop=True)
+    out = pd.DataFrame({"行号": df.index + 2})  # 第 1 行为表头
+    issues = []
+    for col in TEXT_COLUMNS + NUMBER_COLUMNS:
+        text = (df[col] if col in df.columns else pd.Series(pd.NA, index=df.index)).astype("string").str.strip()
+        valid = text.mask(text.str.lower().isin(INVALID_TEXT))
+        if col in TEXT_COLUMNS:
+            out[col] = valid
+            continue
+        out[col] = pd.to_numeric(valid, errors="coerce").astype(float)
+        bad = out[col].isna() & text.notna() & (text != "")
+        if bad.any():
+            issues.append(_issues(out[bad], col, text[bad], "无法转换为数字，已忽略"))
+
+    blank = out["房号"].isna()
+    stray = blank & out[TEXT_COLUMNS[1:]].notna().any(axis=1)
+    if stray.any():
+        issues.append(_issues(out[stray], "房号", out.loc[stray, "房号"], "房号为空，整行跳过"))
+    out = out[~blank].copy()
+
+    # 历史欠费按账期起止拆分为单月账单，未填截止账期时只拆起始月
+    out["_start"] = _month_index(out["欠费周期起"])
+    out["_end"] = _month_index(out["欠费周期终"]).where(out["欠费周期终"].notna(), out["_start"])
+    arrears = out["历史欠费"].fillna(0) > 0
+    wants = arrears & out["费用项目"].notna() & out["欠费周期起"].notna()
+    checks = [
+        (arrears & ~wants, "历史欠费", "历史欠费", "缺少费用项目或欠费周期起，未生成账单"),
+        (wants & out["_start"].isna(), "欠费周期起", "欠费周期起", "账期无法识别，未生成账单"),
+        (wants & out["_start"].notna() & out["_end"].isna(), "欠费周期终", "欠费周期终", "账期无法识别，未生成账单"),
+        (wants & (out["_end"] < out["_start"]), "欠费周期终", "欠费周期终", "早于欠费周期起，未生成账单"),
+    ]
+    for mask, field, col, message in checks:
+        if mask.any():
+            issues.append(_issues(out[mask], field, out.loc[mask, col], message))
+    out["_bill"] = wants & out["_start"].notna() & out["_end"].notna() & (out["_end"] >= out["_start"])
+    return out, issues
+
+
+def _bill_frame(rows: pd.DataFrame) -> pd.DataFrame:
+    """逐行欠费拆分为单月账单（NumPy 向量运算，不逐行循环）"""
+    b = rows[rows["_bill"]]
+    if b.empty:
+        return pd.DataFrame(columns=["房号", "fee_type", "period", "amount_due", "amount_paid", "discount", "status"])
+    start = b["_start"].to_numpy(dtype=np.int64)
+    n = b["_end"].to_numpy(dtype=np.int64) - start + 1
+    offset = np.arange(n.sum()) - np.repeat(np.cumsum(n) - n, n)
+    last = offset == np.repeat(n - 1, n)
+    month = np.repeat(start, n) + offset
+    period = pd.Series(month // 12).astype(str) + "-" + pd.Series(month % 12 + 1).astype(str).str.zfill(2)
+    due = _split(b["历史欠费"].to_numpy(dtype=float), n, last)
+    paid = _split(b["已缴金额"].fillna(0).to_numpy(dtype=float), n, last)
+    discount = _split(b["减免金额"].fillna(0).to_numpy(dtype=float), n, last)
+    return pd.DataFrame({
+        "房号": np.repeat(b["房号"].to_numpy(dtype=object), n),
+        "fee_type": np.repeat(b["费用项目"].to_numpy(dtype=object), n),
+        "period": period.to_numpy(dtype=object),
+        "amount_due": due, "amount_paid": paid, "discount": discount,
+        "status": np.where(paid >= due - discount - 0.005, '已缴', '未缴'),
+    })
+
+
+def _room_states(s, rows: pd.DataFrame):
+    """一次读出已有房产，按导入行计算各户最终档案；返回 (房号 -> 原档案, 房号 -> 导入后档案)"""
+    existing: Dict[str, dict] = {}
+    # 同号房产取 id 最小者，与按房号 first() 查找一致
+    for r in s.execute(select(Room.id, Room.room_number, *[getattr(Room, f) for f in ROOM_FIELDS])
+                       .order_by(Room.id.desc())):
+        existing[r.room_number] = dict(r._mapping)
+
+    by_room = rows.groupby("房号", sort=False)
+    last = by_room[["业主", "业主电话", "面积"]].last()  # 各列取最后一个非空值
+    prepay = rows["预缴金额"].where(rows["预缴金额"] > 0, 0).fillna(0).groupby(rows["房号"], sort=False).sum()
+
+    states: Dict[str, dict] = {}
+    for rn, owner, phone, area in last.itertuples():
+        old = existing.get(rn)
+        state = dict(old) if old else {"id": None, "room_number": rn, "owner_name": None, "owner_phone": None,
+                                       "area": 0.0, "balance": 0.0, "fee1_name": None, "fee1_std": 0.0,
+                                       "fee2_name": None, "fee2_std": 0.0, "fee3_name": None, "fee3_std": 0.0}
+        if pd.notna(owner):
+            state["owner_name"] = owner
+        if pd.notna(phone):
+            state["owner_phone"] = phone
+        if pd.notna(area):
+            state["area"] = float(area)
+        if prepay[rn] > 0:
+            state["balance"] = round(float(state["balance"] or 0) + float(prepay[rn]), 2)
+        states[rn] = state
+
+    # 费用项目依次填入第一个空位，已存在的项目不重复占位
+    fees = rows.loc[rows["费用项目"].notna(), ["房号", "费用项目", "项目月标准金额"]].drop_duplicates(["房号", "费用项目"])
+    for rn, fee, std in fees.itertuples(index=False):
+        state = states[rn]
+        names = [state[name] for name, _ in FEE_SLOTS]
+        if fee in names:
+            continue
+        for name, std_field in FEE_SLOTS:
+            if not state[name]:
+                state[name], state[std_field] = fee, 0.0 if pd.isna(std) else float(std)
+                break
+    return existing, states
+
+
+def _records(frame: pd.DataFrame) -> List[dict]:
+    """按列 tolist() 转为原生类型后组装，比 DataFrame.to_dict 逐格装箱快一个数量级"""
+    cols = list(frame.columns)
+    return [dict(zip(cols, values)) for values in zip(*(frame[c].tolist() for c in cols))]
+
+
+def _insert_chunks(s, model, rows: List[dict], chunk_size: int, returning=None) -> list:
+    """Core 批量插入（绕过 ORM 批量持久化的逐行处理），可按参数顺序返回主键"""
+    table = model.__table__
+    ids = []
+    for i in range(0, len(rows), chunk_size):
+        chunk = rows[i:i + chunk_size]
+        if returning is not None:
+            ids += s.execute(insert(table).returning(table.c[returning], sort_by_parameter_order=True),
+                             chunk).scalars().all()
+        else:
+            s.execute(insert(table), chunk)
+    return ids
+
+
+class RoomImportService:
+    @staticmethod
+    def read(f, filename: str) -> pd.DataFrame:
+        """全部列按文本读取，保留房号与电话的前导零，数字由导入统一转换"""
+        if filename.lower().endswith(".csv"):
+            return pd.read_csv(f, dtype=str, keep_default_na=False)
+        return pd.read_excel(f, dtype=str)
+
+    @staticmethod
+    def run(s, df: pd.DataFrame, operator: str, dry_run: bool = False,
+            chunk_size: Optional[int] = None) -> RoomImportResult:
+        """
+        导入房产档案、历史欠费账单、已缴收款与预缴分录。
+        在调用方事务内执行且不提交；dry_run=True 时只校验与拆分，不写库。
+        单元格问题汇总在结果的 issues 中，不中断导入。
+        """
+        start_time = time.perf_counter()
+        chunk_size = chunk_size or config.IMPORT_CHUNK_SIZE
+        batch_id = str(uuid.uuid4())
+        rows, issues = _normalize(df)
+        bills = _bill_frame(rows)
+        existing, states = _room_states(s, rows)
+        new_rooms = [rn for rn, st in states.items() if st["id"] is None]
+        changed = [rn for rn, st in states.items()
+                   if st["id"] is not None and any(_fmt(st[f]) != _fmt(existing[rn][f]) for f in ROOM_FIELDS)]
+        paid_rows = rows[rows["_bill"] & (rows["已缴金额"].fillna(0) > 0)]
+        prepay_rows = rows[rows["预缴金额"].fillna(0) > 0]
+        issue_frame = pd.concat(issues, ignore_index=True) if issues else pd.DataFrame(columns=ISSUE_COLUMNS)
+        result = RoomImportResult(batch_id, len(rows), len(new_rooms), len(changed), len(bills), len(paid_rows),
+                                  round(float(prepay_rows["预缴金额"].sum()), 2), issue_frame, bills)
+        if dry_run:
+            return result
+
+        now = datetime.datetime.now()
+        ids = _insert_chunks(s, Room, [
+            {"room_number": rn, "property_id": 1, **{f: states[rn][f] for f in ROOM_FIELDS}} for rn in new_rooms],
+            chunk_size, returning="id")
+        room_ids = {rn: st["id"] for rn, st in states.items()}
+        room_ids.update(zip(new_rooms, ids))
+
+        if changed:
+            s.execute(update(Room.__table__).where(Room.id == bindparam("r_id"))
+                      .values(**{f: bindparam(f"r_{f}") for f in ROOM_FIELDS}),
+                      [{"r_id": states[rn]["id"], **{f"r_{f}": states[rn][f] for f in ROOM_FIELDS}} for rn in changed])
+            # 批量 UPDATE 不经过 before_flush，变更历史在此补写
+            _insert_chunks(s, DataChangeHistory, [
+                {"table_name": "rooms", "record_id": states[rn]["id"], "field_name": f,
+                 "old_value": _fmt(existing[rn][f]), "new_value": _fmt(states[rn][f]),
+                 "changed_by": operator, "changed_at": now, "reason": "档案导入"}
+                for rn in changed for f in ROOM_FIELDS if _fmt(states[rn][f]) != _fmt(existing[rn][f])], chunk_size)
+
+        if len(bills):
+            frame = bills.assign(room_id=bills["房号"].map(room_ids), accounting_period=bills["period"],
+                                 batch_id=batch_id, operator=operator, remark='期初导入', created_at=now)
+            _insert_chunks(s, Bill, _records(frame.drop(columns="房号")), chunk_size)
+
+        _insert_chunks(s, PaymentRecord, [
+            {"room_id": room_ids[rn], "amount": float(amount), "biz_type": '缴费', "pay_method": '期初导入',
+             "operator": operator, "remark": f'期初导入-{fee}', "created_at": now}
+            for rn, fee, amount in paid_rows[["房号", "费用项目", "已缴金额"]].itertuples(index=False)], chunk_size)
+
+        # 预缴计入余额，同时记预收账款贷方
+        period = now.strftime('%Y-%m')
+        _insert_chunks(s, LedgerEntry, [
+            {"room_id": room_ids[rn], "account_id": PREPAID_ACCOUNT_ID, "amount": float(amount), "period": period,
+             "direction": -1, "side": "credit", "details": f'期初导入-{rn}预缴-操作员:{operator}', "created_at": now}
+            for rn, amount in prepay_rows[["房号", "预缴金额"]].itertuples(index=False)], chunk_size)
+
+        logger.info(f"档案导入 {batch_id}: {result.rows} 行, 新增房产 {result.new_rooms}, 更新 {result.updated_rooms}, "
+                    f"账单 {result.bills}, 问题 {len(issue_frame)}, 耗时 {time.perf_counter() - start_time:.2f}s")
+        return result
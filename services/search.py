@@ -0,0 +1,129 @@
+"""全文检索模块 - SQLite FTS5 trigram 索引覆盖房产、车位、仪表的编号与业主信息"""
+from typing import List, NamedTuple, Optional, Sequence
+from sqlalchemy import bindparam, text
+from config import get_logger
+
+logger = get_logger(__name__)
+
+# 各类资源在索引中的 rowid = 资源ID * 3 + 偏移，触发器据此按 rowid 增删
+KIND_OFFSETS = {'room': 0, 'parking': 1, 'meter': 2}
+KIND_LABELS = {'room': '房产', 'parking': '车位', 'meter': '仪表'}
+
+# trigram 分词至少需要 3 个字符，更短的关键词退化为前缀匹配
+MIN_MATCH_LEN = 3
+
+# (资源类型, 表名, 编号列, 业主列, 电话列)
+_SOURCES = [
+    ('room', 'rooms', 'room_number', 'owner_name', 'owner_phone'),
+    ('parking', 'parking_spaces', 'space_number', 'owner_name', 'owner_phone'),
+    ('meter', 'utility_meters', 'meter_number', 'NULL', 'NULL'),
+]
+
+
+def _row_sql(kind: str, table: str, code: str, owner: str, phone: str, ref: str) -> str:
+    """生成以 ref（NEW/表名）为来源写入索引的 INSERT ... SELECT"""
+    owner = owner if owner == 'NULL' else f"{ref}.{owner}"
+    phone = phone if phone == 'NULL' else f"{ref}.{phone}"
+    return (f"INSERT INTO search_index(rowid, kind, ref_id, code, owner, phone) "
+            f"SELECT {ref}.id * 3 + {KIND_OFFSETS[kind]}, '{kind}', {ref}.id, {ref}.{code}, {owner}, {phone}")
+
+
+def install_search_index(conn):
+    """创建 FTS5 索引表与同步触发器并回填现有数据（作为数据迁移执行一次）"""
+    conn.execute(text(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS search_index USING fts5("
+        "kind UNINDEXED, ref_id UNINDEXED, code, owner, phone, tokenize='trigram')"
+    ))
+    for kind, table, code, owner, phone in _SOURCES:
+        offset = KIND_OFFSETS[kind]
+        insert_new = _row_sql(kind, table, code, owner, phone, "NEW")
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ai AFTER INSERT ON {table} "
+            f"WHEN COALESCE(NEW.is_deleted, 0) = 0 BEGIN {insert_new}; END"
+        ))
+        conn.execute(text(
+            f"CREATE TRIGGER IF NOT EXISTS {table}_search_ad AFTER DELETE ON {table} BEGIN "
+            f"DELETE FROM search_index WHERE rowid = OLD.id * 3 + {offset}; END"
+        ))
+    install_search_update_triggers(conn)
+    _backfill(conn)
+
+
+def install_search_update_triggers(conn):
+    """
+    （重新）创建更新同步触发器，只在编号/业主/电话/删除标记变化时重写索引行，
+    余额等其他列的更新不触碰 FTS 表（作为数据迁移执行一次，替换旧的全列触发器）
+    """
+    for kind, table, code, owner, phone in _SOURCES:
+        offset = KIND_OFFSETS[kind]
+        columns = ", ".join(c for c in (code, owner, phone, "is_deleted") if c != 'NULL')
+        conn.execute(text(f"DROP TRIGGER IF EXISTS {table}_search_au"))
+        conn.execute(text(
+            f"CREATE TRIGGER {table}_search_au AFTER UPDATE OF {columns} ON {table} BEGIN "
+            f"DELETE FROM search_index WHERE rowid = OLD.id * 3 + {offset}; "
+            f"{_row_sql(kind, table, code, owner, phone, 'NEW')} WHERE COALESCE(NEW.is_deleted, 0) = 0; END"
+        ))
+
+
+def _backfill(conn):
+    conn.execute(text("DELETE FROM search_index"))
+    for kind, table, code, owner, phone in _SOURCES:
+        conn.execute(text(f"{_row_sql(kind, table, code, owner, phone, table)} FROM {table} "
+                          f"WHERE COALESCE({table}.is_deleted, 0) = 0"))
+
+
+class SearchHit(NamedTuple):
+    kind: str
+    ref_id: int
+    code: str
+    owner: Optional[str]
+    phone: Optional[str]
+
+    @property
+    def label(self) -> str:
+        return KIND_LABELS.get(self.kind, self.kind)
+
+
+class SearchService:
+    @staticmethod
+    def search(s, query: str, limit: int = 20, kinds: Optional[Sequence[str]] = None) -> List[SearchHit]:
+        """
+        跨房产/车位/仪表检索编号、业主姓名与电话，按相关度排序：
+        编号完全匹配 > 编号前缀匹配 > bm25 得分。
+        kinds 可限定资源类型，如 ('room',)
+        """
+        q = (query or "").strip()
+        if not q:
+            return []
+        names = None
+        if kinds:
+            names = [k for k in kinds if k in KIND_OFFSETS]
+            if not names:
+                return []
+        params = {"q": q, "prefix": q.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%",
+                  "limit": limit}
+        where = []
+        if len(q) >= MIN_MATCH_LEN:
+            where.append("search_index MATCH :match")
+            params["match"] = '"' + q.replace('"', '""') + '"'
+            rank = "bm25(search_index)"
+        else:
+            # 短关键词（如两字姓名）无法走 trigram，按各字段前缀匹配
+            where.append("(code LIKE :prefix ESCAPE '\\' OR owner LIKE :prefix ESCAPE '\\' "
+                         "OR phone LIKE :prefix ESCAPE '\\')")
+            rank = "code"
+        if names:
+            where.append("kind IN :kinds")
+            params["kinds"] = names
+        sql = (f"SELECT kind, ref_id, code, owner, phone FROM search_index WHERE {' AND '.join(where)} "
+               f"ORDER BY CASE WHEN code = :q THEN 0 WHEN code LIKE :prefix ESCAPE '\\' THEN 1 ELSE 2 END, {rank} "
+               f"LIMIT :limit")
+        stmt = text(sql).bindparams(bindparam("kinds", expanding=True)) if names else text(sql)
+        return [SearchHit(*r) for r in s.execute(stmt, params)]
+
+    @staticmethod
+    def rebuild(s):
+        """整体重建索引（数据被绕过触发器修改后使用）"""
+        _backfill(s.connection())
+        s.commit()
+        logger.info("全文检索索引已重建")
@@ -0,0 +1,247 @@
+"""分析快照模块 - 按会计期分区写出 Parquet，按 id 水位增量追加
+
+目录结构（hive 分区，可直接被 pyarrow.dataset / Spark / DuckDB 读取）:
+    {SNAPSHOT_DIR}/{物业}/{表名}/acct_month=YYYY-MM/part-{起始id}-{截止id}.parquet
+    {SNAPSHOT_DIR}/{物业}/_watermarks.json
+    {SNAPSHOT_DIR}/{物业}/_staging/    重建中的目录，写完后换名替入
+"""
+import datetime
+import glob
+import json
+import os
+import shutil
+import time
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+from sqlalchemy import Boolean, Date, DateTime, Float, Integer, func, literal, or_, select, text
+from config import config, get_logger
+from models import Bill, LedgerEntry, PaymentRecord, Room, SchemaMigration, UtilityReading
+from utils.exceptions import ValidationError
+
+logger = get_logger(__name__)
+
+WATERMARK_FILE = "_watermarks.json"
+STAGING_DIR = "_staging"
+UNKNOWN_PERIOD = "unknown"
+# 分区键名，避免与表内 period 列同名
+PARTITION_KEY = "acct_month"
+# 变更水位在 _watermarks.json 中的键后缀
+CHANGED_SUFFIX = ".changed"
+
+
+class SnapshotTable(NamedTuple):
+    model: object
+    period: Optional[object]  # 分区列表达式；None 表示不分区、每次整表覆盖
+    incremental: bool = True
+    # 修改时间列；非空表示行写入后仍会变化，有新增或变更行的分区整体重写而非追加
+    changed: Optional[object] = None
+
+
+SNAPSHOT_TABLES: Dict[str, SnapshotTable] = {
+    # 账单写入后仍会缴费、减免，按 updated_at 变更水位重写所在分区
+    "bills": SnapshotTable(Bill, func.substr(func.coalesce(Bill.accounting_period, Bill.period), 1, 7),
+                           changed=Bill.updated_at),
+    "payment_records": SnapshotTable(PaymentRecord, func.strftime('%Y-%m', PaymentRecord.created_at)),
+    "ledger_entries": SnapshotTable(LedgerEntry, LedgerEntry.period),
+    "utility_readings": SnapshotTable(UtilityReading, func.coalesce(
+        UtilityReading.period, func.strftime('%Y-%m', UtilityReading.reading_date))),
+    # 房产为维度表，余额随时变化，每次整表覆盖
+    "rooms": SnapshotTable(Room, None, incremental=False),
+}
+
+
+def install_bill_change_stamp(conn):
+    """为旧库账单表补 updated_at 列并以创建时间回填，建立变更水位索引（作为数据迁移执行一次）"""
+    if "updated_at" not in {r[1] for r in conn.execute(text("PRAGMA table_info(bills)"))}:
+        conn.execute(text("ALTER TABLE bills ADD COLUMN updated_at DATETIME"))
+    conn.execute(text("UPDATE bills SET updated_at = created_at WHERE updated_at IS NULL"))
+    conn.execute(text("CREATE INDEX IF NOT EXISTS ix_bills_updated_at ON bills(updated_at)"))
+
+
+def _arrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+    except ImportError:
+        raise ValidationError("导出分析快照需要安装 pyarrow")
+    return pa, pq
+
+
+def _arrow_schema(pa, model, metadata: dict):
+    def arrow_type(col_type):
+        if isinstance(col_type, Boolean):
+            return pa.bool_()
+        if isinstance(col_type, Integer):
+            return pa.int64()
+        if isinstance(col_type, Float):
+            return pa.float64()
+        if isinstance(col_type, DateTime):
+            return pa.timestamp("us")
+        if isinstance(col_type, Date):
+            return pa.date32()
+        return pa.string()
+    fields = [pa.field(c.name, arrow_type(c.type)) for c in model.__table__.columns]
+    return pa.schema(fields, metadata={k: str(v) for k, v in metadata.items()})
+
+
+def _partition(spec: SnapshotTable):
+    """分区目录名表达式；在 SQL 中计算，使按分区重写与写出时的分组口径一致"""
+    if spec.period is None:
+        return literal("")
+    return func.replace(func.coalesce(spec.period, UNKNOWN_PERIOD), "/", "-")
+
+
+def _load_watermarks(root: str) -> dict:
+    path = os.path.join(root, WATERMARK_FILE)
+    if not os.path.exists(path):
+        return {}
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_watermarks(root: str, marks: dict):
+    tmp = os.path.join(root, WATERMARK_FILE + ".tmp")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(marks, f, ensure_ascii=False)
+    os.replace(tmp, os.path.join(root, WATERMARK_FILE))
+
+
+def _recover(root: str):
+    """清理上次中断留下的临时文件；换名替入中途中断时把移开的旧目录放回原处"""
+    for stale in glob.glob(os.path.join(root, "**", "*.parquet.tmp"), recursive=True):
+        os.remove(stale)
+    staging = os.path.join(root, STAGING_DIR)
+    for old in sorted(glob.glob(os.path.join(staging, "**", "*.old"), recursive=True)):
+        target = os.path.join(root, os.path.relpath(old[:-len(".old")], staging))
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(old, target)
+    shutil.rmtree(staging, ignore_errors=True)
+
+
+def _swap_dir(staged: str, target: str):
+    """以换名替入新目录：先把旧目录移到 staged.old，再换入新目录，最后删除旧目录"""
+    old = staged + ".old"
+    if os.path.exists(target):
+        os.replace(target, old)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    os.replace(staged, target)
+    shutil.rmtree(old, ignore_errors=True)
+
+
+def _write(pa, pq, s, stmt, schema, table_dir: str, filename: str) -> Tuple[int, List[str]]:
+    """流式写出 stmt（末列为分区名）到 {table_dir}/{分区}/{filename}.tmp，返回 (行数, 各分区文件最终路径)"""
+    writers, rows = {}, 0
+    try:
+        for part in s.execute(stmt).partitions():
+            groups: Dict[str, List] = {}
+            for r in part:
+                groups.setdefault(r[-1], []).append(r[:-1])
+            for key, group in groups.items():
+                if key not in writers:
+                    folder = os.path.join(table_dir, f"{PARTITION_KEY}={key}") if key else table_dir
+                    os.makedirs(folder, exist_ok=True)
+                    final = os.path.join(folder, filename)
+                    writers[key] = (pq.ParquetWriter(final + ".tmp", schema,
+                                                     compression=config.SNAPSHOT_COMPRESSION), final)
+                arrays = [pa.array(list(col), type=field.type) for col, field in zip(zip(*group), schema)]
+                writers[key][0].write_table(pa.Table.from_arrays(arrays, schema=schema))
+            rows += len(part)
+    finally:
+        for writer, _ in writers.values():
+            writer.close()
+    finals = [final for _, final in writers.values()]
+    for final in finals:
+        os.replace(final + ".tmp", final)
+    return rows, finals
+
+
+class SnapshotService:
+    @staticmethod
+    def export(s, property_code: Optional[str] = None, out_dir: Optional[str] = None,
+               tables: Optional[Sequence[str]] = None, full: bool = False, chunk_size: int = None) -> Dict[str, int]:
+        """
+        将各表新增行（id 大于上次水位）按会计期分区写出 Parquet，返回各表写出行数。
+        有修改时间列的表，把含新增或变更行的分区整体重写；整表（重）建先写入暂存目录再换名替入，
+        中途失败时原快照保持不变，水位仅在换入后推进。
+        """
+        pa, pq = _arrow()
+        root = os.path.join(out_dir or config.SNAPSHOT_DIR, property_code or "main")
+        os.makedirs(root, exist_ok=True)
+        _recover(root)
+        marks = _load_watermarks(root)
+        chunk_size = chunk_size or config.EXPORT_CHUNK_SIZE
+        schema_version = s.query(func.max(SchemaMigration.name)).scalar() or ""
+        counts = {}
+        for name in tables or list(SNAPSHOT_TABLES):
+            spec = SNAPSHOT_TABLES[name]
+            model = spec.model
+            start = time.perf_counter()
+            table_dir = os.path.join(root, name)
+            staging = os.path.join(root, STAGING_DIR, name)
+            # 水位为 0（首次、全量或上次重建未完成）时整表重建
+            rebuild = full or not spec.incremental or not marks.get(name)
+            since = 0 if rebuild else marks[name]
+            if rebuild and marks.get(name):
+                marks[name] = 0
+                _save_watermarks(root, marks)
+            # 先读水位上限，导出期间的新写入留给下一次
+            changed_key = name + CHANGED_SUFFIX
+            changed_upto = s.query(func.max(spec.changed)).scalar() if spec.changed is not None else None
+            upto = s.query(func.max(model.id)).scalar() or 0
+
+            partition = _partition(spec).label("_partition")
+            where = [model.id <= upto]
+            keys = None
+            if not rebuild:
+                if spec.changed is not None:
+                    changed_since = marks.get(changed_key)
+                    touched = model.id > since
+                    if changed_since:
+                        touched = or_(touched, spec.changed > datetime.datetime.fromisoformat(changed_since))
+                    keys = [k for (k,) in s.execute(select(partition).where(model.id <= upto, touched).distinct())]
+                    where.append(partition.element.in_(keys))
+                else:
+                    where.append(model.id > since)
+            if not rebuild and (upto <= since if keys is None else not keys):
+                counts[name] = 0
+                continue
+
+            lo = 1 if keys is not None or rebuild else since + 1
+            schema = _arrow_schema(pa, model, {
+                "erp.table": name, "erp.property": property_code or "main", "erp.schema_version": schema_version,
+                "erp.exported_at": datetime.datetime.now().isoformat(timespec="seconds"),
+                "erp.id_range": f"{lo}-{upto}", "erp.partition": PARTITION_KEY if spec.period is not None else "",
+            })
+            stmt = (select(*model.__table__.columns, partition).where(*where)
+                    .order_by(model.id).execution_options(yield_per=chunk_size))
+            filename = f"part-{lo:010d}-{upto:010d}.parquet"
+            if rebuild:
+                rows, finals = _write(pa, pq, s, stmt, schema, staging, filename)
+                os.makedirs(staging, exist_ok=True)
+                _swap_dir(staging, table_dir)
+            elif keys is not None:
+                # 被重写的分区含其全部行，逐个换名替入；中途失败时下次按相同水位重做，不会重复
+                rows, finals = _write(pa, pq, s, stmt, schema, staging, filename)
+                for key in keys:
+                    folder = f"{PARTITION_KEY}={key}"
+                    os.makedirs(os.path.join(staging, folder), exist_ok=True)
+                    _swap_dir(os.path.join(staging, folder), os.path.join(table_dir, folder))
+            else:
+                # 上次写出文件后未能推进水位时，先删除同起点的残留文件再追加
+                for stale in glob.glob(os.path.join(table_dir, "**", f"part-{lo:010d}-*.parquet"), recursive=True):
+                    os.remove(stale)
+                rows, finals = _write(pa, pq, s, stmt, schema, table_dir, filename)
+            if spec.incremental:
+                marks[name] = upto
+                if changed_upto is not None:
+                    marks[changed_key] = changed_upto.isoformat()
+                _save_watermarks(root, marks)
+            counts[name] = rows
+            logger.info(f"分析快照 {property_code or 'main'}.{name}: {rows} 行, {len(finals)} 个分区文件, "
+                        f"耗时 {time.perf_counter() - start:.2f}s")
+        shutil.rmtree(os.path.join(root, STAGING_DIR), ignore_errors=True)
+        return counts
+
+    @staticmethod
+    def watermarks(property_code: Optional[str] = None, out_dir: Optional[str] = None) -> dict:
+        return _load_watermarks(os.path.join(out_dir or config.SNAPSHOT_DIR, property_code or "main"))
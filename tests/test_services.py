@@ -91,6 +91,173 @@ class TestAuthService:
         assert AuthService.check_password("mypassword", hashed)
         assert not AuthService.check_password("wrongpassword", hashed)
 
+    def test_authenticate_rehashes_when_cost_changes(self):
+        """测试工作因子变更后登录时透明升级哈希"""
+        from models.base import SessionLocal, Base, engine
+        from models.entities import User
+        from services.auth import AuthService
+        from config import config
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        try:
+            s.query(User).filter_by(username="rehash_test").delete()
+            old_hash = AuthService.hash_password("pw123456", rounds=4)
+            s.add(User(username="rehash_test", password_hash=old_hash, role="项目财务"))
+            s.commit()
+            assert AuthService.needs_rehash(old_hash)
+            
+            assert AuthService.authenticate(s, "rehash_test", "wrong") is None
+            user = AuthService.authenticate(s, "rehash_test", "pw123456")
+            assert user is not None
+            assert user.password_hash.split('$')[2] == f"{config.BCRYPT_ROUNDS:02d}"
+            assert AuthService.check_password("pw123456", user.password_hash)
+        finally:
+            s.query(User).filter_by(username="rehash_test").delete()
+            s.commit()
+            s.close()
+    
+    def test_login_limiter_locks_and_writes_behind(self):
+        """测试内存限流锁定、批量回写及重启后恢复"""
+        from models.base import SessionLocal, Base, engine
+        from models.entities import LoginFail
+        from services.auth import AuthService
+        from services.login_limiter import LoginLimiter
+        from config import config
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        try:
+            s.query(LoginFail).filter_by(username="limiter_test").delete()
+            s.commit()
+            LoginLimiter.reset()
+            
+            for _ in range(config.LOGIN_MAX_FAIL):
+                AuthService.record_fail("limiter_test", "10.0.0.1")
+            assert AuthService.is_locked("limiter_test")
+            # 失败尝试不逐次写库
+            assert s.query(LoginFail).filter_by(username="limiter_test").count() == 0
+            
+            assert LoginLimiter.flush() == 1
+            rec = s.query(LoginFail).filter_by(username="limiter_test").one()
+            assert rec.fail_count == config.LOGIN_MAX_FAIL and rec.locked_until is not None
+            
+            # 模拟进程重启：内存清空后从表中恢复锁定
+            LoginLimiter.reset()
+            assert AuthService.is_locked("limiter_test")
+        finally:
+            LoginLimiter.reset()
+            s.query(LoginFail).filter_by(username="limiter_test").delete()
+            s.commit()
+            s.close()
+    
+    def test_login_limiter_prunes_keys_and_persists_ip_lock(self):
+        """测试过期键清除、键数上限与 IP 锁定重启后恢复"""
+        import datetime
+        from collections import deque
+        from models.base import SessionLocal, Base, engine
+        from models.entities import LoginFail
+        from services.login_limiter import LoginLimiter
+        from config import config
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        old_max = config.LOGIN_TRACK_MAX_KEYS
+        try:
+            s.query(LoginFail).filter(LoginFail.username.like("lim2_%") | (LoginFail.username == "ip:10.9.9.9")).delete(
+                synchronize_session=False)
+            s.commit()
+            LoginLimiter.reset()
+            
+            for i in range(config.LOGIN_MAX_FAIL_IP):
+                LoginLimiter.record_fail(f"lim2_{i}", "10.9.9.9")
+            assert LoginLimiter.is_locked("lim2_new", "10.9.9.9")
+            LoginLimiter.flush()
+            assert s.query(LoginFail).filter_by(username="ip:10.9.9.9").one().locked_until is not None
+            LoginLimiter.reset()
+            assert LoginLimiter.is_locked("lim2_new", "10.9.9.9")
+            
+            # 窗口与锁定均过期后回写时清除
+            LoginLimiter._attempts["u:lim2_stale"] = deque(
+                [datetime.datetime.now() - datetime.timedelta(minutes=config.LOGIN_WINDOW_MINUTES + 1)])
+            LoginLimiter.flush()
+            assert "u:lim2_stale" not in LoginLimiter._attempts
+            
+            for _ in range(config.LOGIN_MAX_FAIL):
+                LoginLimiter.record_fail("lim2_target")
+            LoginLimiter.flush()
+            config.LOGIN_TRACK_MAX_KEYS = 5
+            for i in range(20):
+                LoginLimiter.record_fail(f"lim2_flood_{i}")
+            assert len(LoginLimiter._attempts) <= 5 and "u:lim2_flood_19" in LoginLimiter._attempts
+            # 锁定中的键不被淘汰，被淘汰的键不以空状态覆盖库中记录
+            assert LoginLimiter.is_locked("lim2_target")
+            LoginLimiter.flush()
+            assert s.query(LoginFail).filter_by(username="lim2_target").one().locked_until is not None
+            assert s.query(LoginFail).filter_by(username="lim2_flood_0").count() == 0
+        finally:
+            config.LOGIN_TRACK_MAX_KEYS = old_max
+            LoginLimiter.reset()
+            s.query(LoginFail).filter(LoginFail.username.like("lim2_%") | (LoginFail.username == "ip:10.9.9.9")).delete(
+                synchronize_session=False)
+            s.commit()
+            s.close()
+    
+    def test_resolve_session_uses_cache_until_cleared(self):
+        """测试会话缓存命中及 clear_token 失效"""
+        from models.base import SessionLocal, Base, engine
+        from models.entities import User, SessionToken
+        from services.auth import AuthService
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        try:
+            user = s.query(User).filter_by(username="cache_test").first()
+            if not user:
+                user = User(username="cache_test", password_hash="x", role="项目财务")
+                s.add(user)
+                s.commit()
+            token = AuthService.create_session(s, user.id, 1)
+            
+            info = AuthService.resolve_session(token)
+            assert info.username == "cache_test" and info.role == "项目财务"
+            
+            # 直接删库中记录：缓存仍命中，说明未再查库
+            s.query(SessionToken).filter_by(token=token).delete()
+            s.commit()
+            assert AuthService.resolve_session(token) == info
+            
+            AuthService.clear_token(s, token=token)
+            assert AuthService.resolve_session(token) is None
+        finally:
+            s.query(User).filter_by(username="cache_test").delete()
+            s.commit()
+            s.close()
+
+    def test_purge_expired_sessions_in_batches(self):
+        """测试分批清理过期会话且保留有效会话"""
+        import datetime
+        from models.base import SessionLocal, Base, engine, ensure_indexes
+        from models.entities import SessionToken
+        from services.auth import AuthService
+        
+        Base.metadata.create_all(engine)
+        ensure_indexes(engine)
+        s = SessionLocal()
+        try:
+            s.query(SessionToken).delete()
+            past = datetime.datetime.now() - datetime.timedelta(hours=1)
+            for i in range(5):
+                s.add(SessionToken(token=f"expired-{i}", user_id=1, expires_at=past))
+            valid = AuthService.create_session(s, 1, 1)
+            
+            assert AuthService.purge_expired_sessions(s, batch_size=2) == 5
+            assert [t.token for t in s.query(SessionToken).all()] == [valid]
+        finally:
+            s.query(SessionToken).delete()
+            s.commit()
+            s.close()
+
 
 class TestAuditService:
     """审计服务测试"""
@@ -116,5 +283,919 @@ class TestAuditService:
             s.close()
 
 
+class TestKeysetPagination:
+    """游标分页测试"""
+    
+    def test_keyset_page_walks_all_rows_once(self):
+        """测试游标翻页不重不漏"""
+        import datetime
+        from models.base import SessionLocal, Base, engine
+        from models.entities import AuditLog
+        from utils.pagination import keyset_page
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        try:
+            s.query(AuditLog).filter(AuditLog.user == "keyset_test").delete()
+            ts = datetime.datetime(2026, 1, 1, 8, 0, 0)
+            # 相同时间戳的记录依靠 id 保证顺序稳定
+            for i in range(7):
+                s.add(AuditLog(user="keyset_test", action="test", target=str(i), created_at=ts))
+            s.commit()
+            
+            query = s.query(AuditLog.id, AuditLog.created_at).filter(AuditLog.user == "keyset_test")
+            seen, cursor, pages = [], None, 0
+            while True:
+                rows, cursor, has_more = keyset_page(query, [AuditLog.created_at, AuditLog.id], cursor, 3)
+                seen.extend(r.id for r in rows)
+                pages += 1
+                if not has_more:
+                    break
+            assert pages == 3
+            assert seen == sorted(seen, reverse=True)
+            assert len(set(seen)) == 7
+        finally:
+            s.query(AuditLog).filter(AuditLog.user == "keyset_test").delete()
+            s.commit()
+            s.close()
+
+
+class TestChangeTracker:
+    """数据变更自动追踪测试"""
+    
+    def test_dirty_fields_are_recorded_in_same_flush(self):
+        """测试修改追踪表字段时自动写入变更历史"""
+        from models.base import SessionLocal, Base, engine
+        from models.entities import Room, DataChangeHistory
+        from services.change_tracking import ChangeTracker
+        
+        Base.metadata.create_all(engine)
+        ChangeTracker.install()
+        s = SessionLocal()
+        try:
+            room = Room(room_number="TRACK-001", owner_name="张三", area=80.0)
+            s.add(room)
+            s.commit()
+            
+            s.info['operator'] = "tracker_test"
+            room.owner_name = "李四"
+            room.area = 80.0  # 值未变化，不应记录
+            s.commit()
+            
+            rows = s.query(DataChangeHistory).filter_by(table_name="rooms", record_id=room.id).all()
+            assert [(r.field_name, r.old_value, r.new_value, r.changed_by) for r in rows] == \
+                [("owner_name", "张三", "李四", "tracker_test")]
+        finally:
+            s.info.pop('operator', None)
+            s.query(DataChangeHistory).filter_by(table_name="rooms", changed_by="tracker_test").delete()
+            s.query(Room).filter_by(room_number="TRACK-001").delete()
+            s.commit()
+            s.close()
+            ChangeTracker.uninstall()
+
+
+class TestRefCache:
+    """参考数据缓存测试"""
+    
+    def test_cache_hits_until_invalidated(self):
+        """测试缓存命中与写路径失效"""
+        from models.base import SessionLocal, Base, engine
+        from models.entities import FeeType
+        from services.cache import RefCache, FEE_TYPES, fee_type_rates
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        try:
+            s.query(FeeType).filter_by(name="缓存测试费").delete()
+            s.commit()
+            RefCache.invalidate(s, FEE_TYPES)
+            assert "缓存测试费" not in fee_type_rates(s)
+            
+            s.add(FeeType(name="缓存测试费", tax_rate=0.09))
+            s.commit()
+            # 未失效前仍返回缓存值
+            assert "缓存测试费" not in fee_type_rates(s)
+            
+            RefCache.invalidate(s, FEE_TYPES)
+            assert fee_type_rates(s)["缓存测试费"] == 0.09
+        finally:
+            s.query(FeeType).filter_by(name="缓存测试费").delete()
+            s.commit()
+            RefCache.invalidate(s, FEE_TYPES)
+            s.close()
+    
+    def test_keyed_entries_are_lru_bounded(self):
+        """测试按 arg 分条缓存的条目数受上限约束，且按名称整体失效"""
+        from models.base import SessionLocal
+        from config import config
+        from services.cache import RefCache
+        
+        s = SessionLocal()
+        old_max = config.REF_CACHE_MAX_KEYS
+        try:
+            config.REF_CACHE_MAX_KEYS = 3
+            RefCache.clear()
+            for i in range(5):
+                assert RefCache.get(s, "lru_test", lambda s, i=i: i, arg=i) == i
+            assert len(RefCache._values) == 3
+            # 最早的条目已被淘汰，重新加载
+            assert RefCache.get(s, "lru_test", lambda s: "reloaded", arg=0) == "reloaded"
+            RefCache.invalidate(s, "lru_test")
+            assert len(RefCache._values) == 0
+        finally:
+            config.REF_CACHE_MAX_KEYS = old_max
+            RefCache.clear()
+            s.close()
+
+
+class TestRoomDirectory:
+    """房产目录测试"""
+    
+    def test_prefix_search_and_incremental_refresh(self):
+        """测试房号前缀检索与按ID水位增量加载"""
+        from models.base import SessionLocal, Base, engine
+        from models.entities import Room
+        from services.room_directory import RoomDirectory
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        try:
+            s.query(Room).filter(Room.room_number.like("RD-%")).delete(synchronize_session=False)
+            s.add_all([Room(room_number="RD-101", owner_name="目录甲"), Room(room_number="RD-102", owner_name="目录乙")])
+            s.commit()
+            RoomDirectory.invalidate(s)
+            assert [e.room_number for e in RoomDirectory.search(s, "rd-10")] == ["RD-101", "RD-102"]
+            
+            # 新增房产无需失效即可检索到
+            s.add(Room(room_number="RD-103", owner_name="目录丙"))
+            s.commit()
+            found = RoomDirectory.search(s, "RD-103")
+            assert len(found) == 1 and RoomDirectory.get(s, found[0].id).owner_name == "目录丙"
+            assert [e.room_number for e in RoomDirectory.search(s, "目录乙")] == ["RD-102"]
+        finally:
+            s.query(Room).filter(Room.room_number.like("RD-%")).delete(synchronize_session=False)
+            s.commit()
+            RoomDirectory.invalidate(s)
+            s.close()
+
+
+class TestSearchService:
+    """全文检索测试"""
+    
+    def test_index_follows_writes(self):
+        """测试触发器同步索引及排序"""
+        from models.base import SessionLocal, Base, engine
+        from models.entities import Room
+        from sqlalchemy import text
+        from services.bootstrap import run_migrations
+        from services.search import SearchService
+        
+        Base.metadata.create_all(engine)
+        run_migrations(engine)
+        s = SessionLocal()
+        try:
+            s.query(Room).filter(Room.room_number.like("FTS-%")).delete(synchronize_session=False)
+            a = Room(room_number="FTS-9001", owner_name="检索甲", owner_phone="13900009001")
+            b = Room(room_number="FTS-90011", owner_name="检索乙", owner_phone="13900009002")
+            s.add_all([a, b])
+            s.commit()
+            
+            hits = SearchService.search(s, "FTS-9001", kinds=('room',))
+            assert [h.code for h in hits] == ["FTS-9001", "FTS-90011"]
+            assert SearchService.search(s, "FTS-9001", kinds=('no_such_kind',)) == []
+            assert [h.ref_id for h in SearchService.search(s, "00009002")] == [b.id]
+            assert [h.code for h in SearchService.search(s, "检索乙")] == ["FTS-90011"]
+            
+            # 余额等非检索列的更新不触发索引重写，业主变更会同步
+            raw = s.connection().connection.driver_connection
+            before = raw.total_changes
+            s.execute(text("UPDATE rooms SET balance = balance + 1 WHERE id = :id"), {"id": a.id})
+            assert raw.total_changes - before == 1
+            s.execute(text("UPDATE rooms SET owner_name = '检索丙' WHERE id = :id"), {"id": a.id})
+            s.commit()
+            assert [h.ref_id for h in SearchService.search(s, "检索丙")] == [a.id]
+            
+            # 软删除后不再返回
+            b.is_deleted = True
+            s.commit()
+            assert [h.code for h in SearchService.search(s, "FTS-900")] == ["FTS-9001"]
+        finally:
+            s.query(Room).filter(Room.room_number.like("FTS-%")).delete(synchronize_session=False)
+            s.commit()
+            s.close()
+
+
+class TestPaymentRollup:
+    """收款日汇总测试"""
+    
+    def test_rollup_follows_payments_and_rebuild_matches(self):
+        """测试触发器增量维护与重建结果一致"""
+        import datetime
+        from models.base import SessionLocal, Base, engine
+        from models.entities import PaymentRecord, DailyPaymentRollup
+        from services.bootstrap import run_migrations
+        from services.rollup import PaymentRollupService
+        
+        Base.metadata.create_all(engine)
+        run_migrations(engine)
+        day = datetime.date(1999, 1, 2)
+        at = datetime.datetime(1999, 1, 2, 10, 30)
+        s = SessionLocal()
+        try:
+            s.query(PaymentRecord).filter(PaymentRecord.operator == "rollup-test").delete()
+            s.commit()
+            p1 = PaymentRecord(amount=100.0, pay_method="微信", biz_type="缴费", operator="rollup-test", created_at=at)
+            p2 = PaymentRecord(amount=50.0, pay_method="期初导入", biz_type="缴费", operator="rollup-test", created_at=at)
+            p3 = PaymentRecord(amount=-30.0, pay_method="微信", biz_type="缴费", operator="rollup-test", created_at=at)
+            s.add_all([p1, p2, p3])
+            s.commit()
+            assert PaymentRollupService.revenue(s, day, day) == 100.0
+            assert PaymentRollupService.net_total(s, day, day) == 120.0
+            
+            p1.amount = 80.0
+            s.delete(p2)
+            s.commit()
+            assert PaymentRollupService.net_total(s, day, day) == 50.0
+            
+            incremental = {(r.pay_method, r.amount, r.refund_amount, r.count)
+                           for r in s.query(DailyPaymentRollup).filter(DailyPaymentRollup.day == day) if r.count}
+            PaymentRollupService.rebuild(s, day, day)
+            rebuilt = {(r.pay_method, r.amount, r.refund_amount, r.count)
+                       for r in s.query(DailyPaymentRollup).filter(DailyPaymentRollup.day == day)}
+            assert incremental == rebuilt == {("微信", 80.0, -30.0, 2)}
+        finally:
+            s.query(PaymentRecord).filter(PaymentRecord.operator == "rollup-test").delete()
+            s.commit()
+            PaymentRollupService.rebuild(s, day, day)
+            s.close()
+
+
+class TestCollectionRateService:
+    """收缴率计算测试"""
+    
+    def test_room_rates_use_contract_or_first_bill(self):
+        """测试合同/首张账单确定入伙期及收缴率"""
+        import datetime
+        from models.base import SessionLocal, Base, engine
+        from models.entities import Room, Bill, ServiceContract
+        from services.collection import CollectionRateService
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        try:
+            a = Room(room_number="CR-1")
+            b = Room(room_number="CR-2")
+            s.add_all([a, b])
+            s.flush()
+            s.add(ServiceContract(room_id=a.id, contract_no="CR-C1", start_date=datetime.datetime(2025, 2, 10)))
+            for room, period, paid in [(a, "2025-01", 100), (a, "2025-02", 100), (a, "2025-03", 0),
+                                       (b, "2025-03", 50), (b, "2025-04", 100), (b, "2025-05", 100)]:
+                s.add(Bill(room_id=room.id, fee_type="物业费", period=period, amount_due=100, amount_paid=paid, discount=0))
+            s.commit()
+            
+            df = CollectionRateService.room_rates(s, datetime.date(2025, 4, 30), room_filter="CR-").set_index("房号")
+            assert df.loc["CR-1", "数据来源"] == "合同" and df.loc["CR-1", "应收金额"] == 200
+            assert df.loc["CR-1", "收缴率(%)"] == 50.0
+            assert df.loc["CR-2", "入伙日期"] == "2025-03-01" and df.loc["CR-2", "收缴率(%)"] == 75.0
+        finally:
+            ids = [r.id for r in s.query(Room.id).filter(Room.room_number.like("CR-%"))]
+            s.query(Bill).filter(Bill.room_id.in_(ids)).delete(synchronize_session=False)
+            s.query(ServiceContract).filter(ServiceContract.room_id.in_(ids)).delete(synchronize_session=False)
+            s.query(Room).filter(Room.id.in_(ids)).delete(synchronize_session=False)
+            s.commit()
+            s.close()
+
+    
+    def test_cohort_matrix_is_cumulative(self):
+        """测试入伙批次矩阵按月累计且未到达月份为空"""
+        import datetime
+        from models.base import SessionLocal, Base, engine
+        from models.entities import Room, Bill
+        from services.collection import CollectionRateService
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        try:
+            a = Room(room_number="CH-1")
+            b = Room(room_number="CH-2")
+            s.add_all([a, b])
+            s.flush()
+            for room, period, paid in [(a, "1998-01", 100), (a, "1998-02", 0), (a, "1998-03", 100), (b, "1998-02", 100)]:
+                s.add(Bill(room_id=room.id, fee_type="物业费", period=period, amount_due=100, amount_paid=paid, discount=0))
+            s.commit()
+            
+            m = CollectionRateService.cohort_matrix(s, datetime.date(1998, 3, 31), max_months=3)
+            assert list(m.index) == ["1998-01", "1998-02"]
+            assert m.loc["1998-01", ["M0", "M1", "M2"]].tolist() == [100.0, 50.0, 66.67]
+            assert m.loc["1998-02", "M0"] == 100.0 and m.loc["1998-02", "M2"] != m.loc["1998-02", "M2"]
+        finally:
+            ids = [r.id for r in s.query(Room.id).filter(Room.room_number.like("CH-%"))]
+            s.query(Bill).filter(Bill.room_id.in_(ids)).delete(synchronize_session=False)
+            s.query(Room).filter(Room.id.in_(ids)).delete(synchronize_session=False)
+            s.commit()
+            s.close()
+
+
+class TestReconciliationService:
+    """收费核对测试"""
+    
+    def test_workbench_pages_and_caches_closed_period(self):
+        """测试 SQL 状态判定、分页排序及关账缓存"""
+        import datetime
+        from models.base import SessionLocal, Base, engine
+        from models.entities import Room, Bill, PeriodClose
+        from services.reconciliation import ReconciliationService
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        period = "1997-06"
+        try:
+            rooms = [Room(room_number=f"RW-{i}") for i in range(3)]
+            s.add_all(rooms)
+            s.flush()
+            for room, paid in zip(rooms, [100, 40, 0]):
+                s.add(Bill(room_id=room.id, fee_type="物业费", period=period, amount_due=100, amount_paid=paid, discount=0))
+            s.commit()
+            
+            summary, df, cached = ReconciliationService.workbench(s, period, sort_by="欠费金额", descending=True, page_size=2)
+            assert summary["rows"] == 3 and summary["arrears"] == 160 and not cached
+            assert df["房号"].tolist() == ["RW-2", "RW-1"] and df["状态"].tolist() == ["❌ 未缴", "⚠️ 部分已缴"]
+            
+            s.add(PeriodClose(period=period, closed=True, closed_at=datetime.datetime.now()))
+            s.commit()
+            summary2, df2, cached = ReconciliationService.workbench(s, period, sort_by="欠费金额", descending=True,
+                                                                    page=2, page_size=2)
+            assert cached and summary2 == summary
+            assert df2["房号"].tolist() == ["RW-0"] and df2["状态"].tolist() == ["✅ 已结清"]
+        finally:
+            s.query(PeriodClose).filter_by(period=period).delete()
+            s.query(Bill).filter_by(period=period).delete()
+            s.query(Room).filter(Room.room_number.like("RW-%")).delete(synchronize_session=False)
+            s.commit()
+            s.close()
+
+    
+    def test_room_reconciliation_is_incremental(self):
+        """测试逐户核对只保存差异且增量重算受影响房产"""
+        from models.base import SessionLocal, Base, engine
+        from models.entities import Room, LedgerEntry, PeriodClose, RoomReconciliation
+        from services.ledger import LedgerService
+        from services.reconciliation import ReconciliationService
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        try:
+            s.query(PeriodClose).filter_by(period="1996-01").delete()
+            ok = Room(room_number="RR-1", balance=100)
+            bad = Room(room_number="RR-2", balance=80)
+            s.add_all([ok, bad])
+            s.flush()
+            LedgerService.post_double_entry(s, "1996-01", 1, 3, 100, room_id=ok.id)
+            LedgerService.post_double_entry(s, "1996-01", 1, 3, 50, room_id=bad.id)
+            s.commit()
+            
+            ReconciliationService.reconcile_rooms(s, full=True)
+            diffs = {r.room_id: r.diff for r in s.query(RoomReconciliation).filter(
+                RoomReconciliation.room_id.in_([ok.id, bad.id]))}
+            assert diffs == {bad.id: 30.0}
+            
+            LedgerService.post_double_entry(s, "1996-01", 1, 3, 30, room_id=bad.id)
+            s.commit()
+            res = ReconciliationService.reconcile_rooms(s)
+            assert not res["full"] and res["checked"] == 1
+            assert s.query(RoomReconciliation).filter_by(room_id=bad.id).count() == 0
+        finally:
+            ids = [r.id for r in s.query(Room.id).filter(Room.room_number.like("RR-%"))]
+            s.query(RoomReconciliation).filter(RoomReconciliation.room_id.in_(ids)).delete(synchronize_session=False)
+            s.query(LedgerEntry).filter(LedgerEntry.room_id.in_(ids)).delete(synchronize_session=False)
+            s.query(Room).filter(Room.id.in_(ids)).delete(synchronize_session=False)
+            s.commit()
+            s.close()
+
+
+class TestFinancialReportService:
+    """财务报表查询测试"""
+    
+    def test_period_totals_group_by_effective_period(self):
+        """测试按生效账期分组汇总及会计归属期默认值"""
+        from models.base import SessionLocal, Base, engine
+        from models.entities import Room, Bill
+        from services.reports import FinancialReportService
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        try:
+            room = Room(room_number="FR-1")
+            s.add(room)
+            s.flush()
+            s.add_all([
+                Bill(room_id=room.id, fee_type="物业费", period="1997-01", amount_due=100, amount_paid=60, discount=10),
+                Bill(room_id=room.id, fee_type="物业费", period="1997-01-15", amount_due=50, amount_paid=50, discount=0),
+                Bill(room_id=room.id, fee_type="物业费", period="1997-03", accounting_period="1997-02",
+                     amount_due=200, amount_paid=0, discount=0),
+            ])
+            s.commit()
+            assert {b.accounting_period for b in s.query(Bill).filter_by(room_id=room.id)} == {"1997-01", "1997-02"}
+            
+            df = FinancialReportService.period_totals(s, "1997-01", "1997-03")
+            assert list(df.index) == ["1997-01", "1997-02"]
+            assert df.loc["1997-01", ["应收", "减免", "实收", "未收"]].tolist() == [150.0, 10.0, 110.0, 30.0]
+            assert df.loc["1997-02", "收缴率(%)"] == 0
+            stmt = FinancialReportService.income_statement(s, "1997-01", "1997-03")
+            assert stmt["金额"].tolist() == [350.0, 10.0, 110.0, 230.0]
+        finally:
+            ids = [r.id for r in s.query(Room.id).filter(Room.room_number == "FR-1")]
+            s.query(Bill).filter(Bill.room_id.in_(ids)).delete(synchronize_session=False)
+            s.query(Room).filter(Room.id.in_(ids)).delete(synchronize_session=False)
+            s.commit()
+            s.close()
+
+
+class TestListingService:
+    """列表投影查询测试"""
+    
+    def test_listings_use_single_statement(self):
+        """测试账单、流水与可开票账单均为单条语句"""
+        from sqlalchemy import event
+        from models.base import SessionLocal, Base, engine
+        from models.entities import Room, Bill, PaymentRecord
+        from services.listings import ListingService
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        statements = []
+        listener = lambda *args: statements.append(args[2])
+        try:
+            rooms = [Room(room_number=f"LS-{i}", owner_name=f"业主{i}") for i in range(3)]
+            s.add_all(rooms)
+            s.flush()
+            for r in rooms:
+                s.add(Bill(room_id=r.id, fee_type="物业费", period="1998-01", amount_due=10, amount_paid=10, status="已缴"))
+                s.add(PaymentRecord(room_id=r.id, amount=10, biz_type="缴费", pay_method="现金"))
+            s.commit()
+            
+            event.listen(engine, "before_cursor_execute", listener)
+            bills = ListingService.bill_frame(s)
+            payments = ListingService.payment_frame(s)
+            candidates = [c for c in ListingService.invoice_candidates(s) if c.room_number.startswith("LS-")]
+            event.remove(engine, "before_cursor_execute", listener)
+            
+            assert len(statements) == 3
+            assert {"LS-0", "LS-1", "LS-2"} <= set(bills["房号"]) and {"LS-0"} <= set(payments["房号"])
+            assert len(candidates) == 3 and candidates[0].label.startswith("LS-0 | 物业费 | 1998-01")
+        finally:
+            if event.contains(engine, "before_cursor_execute", listener):
+                event.remove(engine, "before_cursor_execute", listener)
+            ids = [r.id for r in s.query(Room.id).filter(Room.room_number.like("LS-%"))]
+            s.query(Bill).filter(Bill.room_id.in_(ids)).delete(synchronize_session=False)
+            s.query(PaymentRecord).filter(PaymentRecord.room_id.in_(ids)).delete(synchronize_session=False)
+            s.query(Room).filter(Room.id.in_(ids)).delete(synchronize_session=False)
+            s.commit()
+            s.close()
+
+    
+    def test_bill_browser_keyset_pages_with_filters(self):
+        """测试账单浏览按 (账期, id) 倒序翻页、空账期排在最后、筛选生效且计数随写入失效"""
+        from models.base import SessionLocal, Base, engine
+        from models.entities import Room, Bill
+        from services.listings import ListingService, BillFilter, install_count_invalidation
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        try:
+            room = Room(room_number="KB-1")
+            other = Room(room_number="KX-1")
+            s.add_all([room, other])
+            s.flush()
+            for m in range(1, 8):
+                s.add(Bill(room_id=room.id, fee_type="物业费", period=f"1999-{m:02d}", amount_due=m * 10))
+                s.add(Bill(room_id=other.id, fee_type="物业费", period=f"1999-{m:02d}", amount_due=m * 10))
+            s.add(Bill(room_id=room.id, fee_type="物业费", period=None, amount_due=30))
+            s.commit()
+            
+            f = BillFilter(room_prefix="KB", min_amount=20, max_amount=60)
+            seen, cursor = [], None
+            while True:
+                df, cursor, more = ListingService.browse_bills(s, f, cursor, page_size=2)
+                seen += df["账期"].tolist()
+                if not more:
+                    break
+            assert seen == ["1999-06", "1999-05", "1999-04", "1999-03", "1999-02", ""]
+            install_count_invalidation()
+            assert ListingService.count_bills(s, f) == 6
+            s.add(Bill(room_id=room.id, fee_type="水费", period="1999-03", amount_due=25))
+            s.commit()
+            assert ListingService.count_bills(s, f) == 7
+        finally:
+            ids = [r.id for r in s.query(Room.id).filter(Room.room_number.in_(["KB-1", "KX-1"]))]
+            s.query(Bill).filter(Bill.room_id.in_(ids)).delete(synchronize_session=False)
+            s.query(Room).filter(Room.id.in_(ids)).delete(synchronize_session=False)
+            s.commit()
+            s.close()
+
+
+class TestExportService:
+    """流式导出测试"""
+    
+    def test_chunked_export_to_temp_files(self):
+        """测试分块导出 CSV/Parquet 行数一致、各次导出文件互不相同并可按静态链接下载"""
+        import os
+        import pandas as pd
+        from models.base import SessionLocal, Base, engine
+        from models.entities import Room, Bill
+        from services.export import ExportService
+        from services.listings import BillFilter
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        try:
+            room = Room(room_number="EX-1", owner_name="导出")
+            s.add(room)
+            s.flush()
+            s.add_all([Bill(room_id=room.id, fee_type="物业费", period=f"1995-{m:02d}", amount_due=m) for m in range(1, 6)])
+            s.commit()
+            
+            f = BillFilter(room_prefix="EX-")
+            csv_res = ExportService.export(s, "bills", "CSV", f, chunk_size=2)
+            pq_res = ExportService.export(s, "bills", "Parquet", f, chunk_size=2)
+            assert csv_res.rows == pq_res.rows == 5 and csv_res.path != pq_res.path
+            df = pd.read_csv(csv_res.path, encoding="utf-8-sig")
+            assert list(df.columns)[:4] == ["房号", "业主", "科目", "账期"] and df["应收"].sum() == 15
+            assert pd.read_parquet(pq_res.path)["应收"].tolist() == [1.0, 2.0, 3.0, 4.0, 5.0]
+            assert csv_res.url == "app/static/exports/" + os.path.basename(csv_res.path)
+            for res in (csv_res, pq_res):
+                ExportService.discard(res)
+                assert not os.path.exists(res.path)
+        finally:
+            ids = [r.id for r in s.query(Room.id).filter(Room.room_number == "EX-1")]
+            s.query(Bill).filter(Bill.room_id.in_(ids)).delete(synchronize_session=False)
+            s.query(Room).filter(Room.id.in_(ids)).delete(synchronize_session=False)
+            s.commit()
+            s.close()
+
+    
+    def test_snapshot_appends_partitions_by_watermark(self):
+        """测试分析快照按会计期分区并按 id 水位增量追加"""
+        import glob
+        import os
+        import shutil
+        import tempfile
+        import pyarrow.dataset as ds
+        from models.base import SessionLocal, Base, engine
+        from models.entities import Room, Bill
+        from services.snapshot import SnapshotService
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        out = tempfile.mkdtemp()
+        try:
+            room = Room(room_number="SN-1")
+            s.add(room)
+            s.flush()
+            s.add(Bill(room_id=room.id, fee_type="物业费", period="1994-01", amount_due=1))
+            s.commit()
+            assert SnapshotService.export(s, out_dir=out, tables=["bills"])["bills"] >= 1
+            
+            s.add(Bill(room_id=room.id, fee_type="物业费", period="1994-02", amount_due=2))
+            s.commit()
+            assert SnapshotService.export(s, out_dir=out, tables=["bills"]) == {"bills": 1}
+            assert os.path.isdir(os.path.join(out, "main", "bills", "acct_month=1994-02"))
+            
+            table = ds.dataset(os.path.join(out, "main", "bills"), format="parquet", partitioning="hive").to_table()
+            assert table.num_rows == s.query(Bill).count()
+            meta = ds.dataset(glob.glob(os.path.join(out, "main", "bills", "acct_month=1994-02", "*.parquet"))[0]).schema.metadata
+            assert meta[b"erp.table"] == b"bills"
+            assert SnapshotService.watermarks(out_dir=out)["bills"] == s.query(Bill.id).order_by(Bill.id.desc()).first()[0]
+        finally:
+            shutil.rmtree(out, ignore_errors=True)
+            ids = [r.id for r in s.query(Room.id).filter(Room.room_number == "SN-1")]
+            s.query(Bill).filter(Bill.room_id.in_(ids)).delete(synchronize_session=False)
+            s.query(Room).filter(Room.id.in_(ids)).delete(synchronize_session=False)
+            s.commit()
+            s.close()
+    
+    def test_snapshot_rewrites_changed_partitions_and_keeps_data_on_failed_rebuild(self, monkeypatch):
+        """测试已导出账单被批量修改后重写所在分区且不重复，全量重建失败时原快照保留并在下次重建"""
+        import os
+        import shutil
+        import tempfile
+        import pyarrow.dataset as ds
+        from sqlalchemy import update
+        from models.base import SessionLocal, Base, engine
+        from models.entities import Room, Bill
+        import services.snapshot as snapshot
+        from services.snapshot import SnapshotService
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        out = tempfile.mkdtemp()
+        bills_dir = os.path.join(out, "main", "bills")
+        
+        def read_rows():
+            table = ds.dataset(bills_dir, format="parquet", partitioning="hive").to_table()
+            return {r["id"]: r["status"] for r in table.to_pylist() if r["room_id"] == room.id}, table.num_rows
+        
+        try:
+            room = Room(room_number="SN-2")
+            s.add(room)
+            s.flush()
+            b1 = Bill(room_id=room.id, fee_type="物业费", period="1993-11", amount_due=10)
+            b2 = Bill(room_id=room.id, fee_type="水费", period="1993-11", amount_due=5)
+            s.add_all([b1, b2])
+            s.commit()
+            SnapshotService.export(s, out_dir=out, tables=["bills"])
+            assert read_rows()[0] == {b1.id: "未缴", b2.id: "未缴"}
+            
+            # 批量 Core UPDATE 同样刷新 updated_at
+            s.execute(update(Bill.__table__).where(Bill.id == b1.id).values(amount_paid=10, status="已缴"))
+            s.commit()
+            assert SnapshotService.export(s, out_dir=out, tables=["bills"]) == {"bills": 2}
+            statuses, total = read_rows()
+            assert statuses == {b1.id: "已缴", b2.id: "未缴"} and total == s.query(Bill).count()
+            assert SnapshotService.export(s, out_dir=out, tables=["bills"]) == {"bills": 0}
+            
+            def fail(*args, **kwargs):
+                raise RuntimeError("disk full")
+            monkeypatch.setattr(snapshot, "_write", fail)
+            with pytest.raises(RuntimeError):
+                SnapshotService.export(s, out_dir=out, tables=["bills"], full=True)
+            monkeypatch.undo()
+            assert read_rows()[0] == {b1.id: "已缴", b2.id: "未缴"}
+            assert SnapshotService.watermarks(out_dir=out)["bills"] == 0
+            assert SnapshotService.export(s, out_dir=out, tables=["bills"])["bills"] == s.query(Bill).count()
+            assert read_rows()[1] == s.query(Bill).count()
+        finally:
+            shutil.rmtree(out, ignore_errors=True)
+            ids = [r.id for r in s.query(Room.id).filter(Room.room_number == "SN-2")]
+            s.query(Bill).filter(Bill.room_id.in_(ids)).delete(synchronize_session=False)
+            s.query(Room).filter(Room.id.in_(ids)).delete(synchronize_session=False)
+            s.commit()
+            s.close()
+
+
+class TestBatchPaymentService:
+    """批量缴费测试"""
+    
+    def test_settle_rooms_in_bulk(self):
+        """测试批量结清账单、逐户收款与借贷平衡"""
+        import datetime
+        from sqlalchemy import func
+        from models.base import SessionLocal, Base, engine
+        from models.entities import Room, Bill, PaymentRecord, LedgerEntry, PeriodClose, DataChangeHistory
+        from services.batch_payment import BatchPaymentService
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        # 结清同时校验账单账期与当月收款账期，两者均需处于未关账状态
+        pay_period = datetime.datetime.now().strftime("%Y-%m")
+        closed = {p.period: p.closed for p in s.query(PeriodClose).filter(PeriodClose.period == pay_period)}
+        try:
+            s.query(PeriodClose).filter_by(period="1993-01").delete()
+            s.query(PeriodClose).filter_by(period=pay_period).update({"closed": False})
+            a, b, c = Room(room_number="BP-A"), Room(room_number="BP-B"), Room(room_number="BP-C")
+            s.add_all([a, b, c])
+            s.flush()
+            s.add_all([Bill(room_id=a.id, fee_type="物业费", period="1993-01", amount_due=100, amount_paid=30, status="部分已缴"),
+                       Bill(room_id=a.id, fee_type="水费", period="1993-01", amount_due=20, discount=5),
+                       Bill(room_id=b.id, fee_type="物业费", period="1993-01", amount_due=50)])
+            s.commit()
+            
+            results = BatchPaymentService.settle(s, [a.id, b.id, c.id], "1993-01", "现金", "tester")
+            s.commit()
+            by_room = {r.room_number: r for r in results}
+            assert (by_room["BP-A"].bills, by_room["BP-A"].amount) == (2, 85.0)
+            assert by_room["BP-C"].bills == 0 and by_room["BP-C"].payment_id is None
+            assert s.query(Bill).filter(Bill.room_id.in_([a.id, b.id]), Bill.status != "已缴").count() == 0
+            assert s.get(PaymentRecord, by_room["BP-B"].payment_id).amount == 50
+            net = s.query(func.sum(LedgerEntry.amount * LedgerEntry.direction)).filter(
+                LedgerEntry.room_id.in_([a.id, b.id])).scalar()
+            assert abs(net) < 0.001
+            assert all(r.bills == 0 for r in BatchPaymentService.settle(s, [a.id, b.id], "1993-01", "现金", "tester"))
+        finally:
+            s.rollback()
+            ids = [r.id for r in s.query(Room.id).filter(Room.room_number.like("BP-%"))]
+            bill_ids = [b.id for b in s.query(Bill.id).filter(Bill.room_id.in_(ids))]
+            s.query(DataChangeHistory).filter(DataChangeHistory.table_name == "bills",
+                                              DataChangeHistory.record_id.in_(bill_ids)).delete(synchronize_session=False)
+            s.query(LedgerEntry).filter(LedgerEntry.room_id.in_(ids)).delete(synchronize_session=False)
+            s.query(PaymentRecord).filter(PaymentRecord.room_id.in_(ids)).delete(synchronize_session=False)
+            s.query(Bill).filter(Bill.id.in_(bill_ids)).delete(synchronize_session=False)
+            s.query(Room).filter(Room.id.in_(ids)).delete(synchronize_session=False)
+            for period, was_closed in closed.items():
+                s.query(PeriodClose).filter_by(period=period).update({"closed": was_closed})
+            s.commit()
+            s.close()
+
+
+class TestInvoiceService:
+    """开票测试"""
+    
+    def test_bulk_issue_allocates_sequential_numbers(self):
+        """测试按账期批量开票、科目税率、连续发票号与跳过已开票账单"""
+        from models.base import SessionLocal, Base, engine
+        from models.entities import Room, Bill, FeeType, Invoice
+        from services.cache import RefCache, FEE_TYPES
+        from services.invoicing import InvoiceService
+        from services.listings import ListingService
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        try:
+            s.add(FeeType(name="IV测试费", tax_rate=0.13))
+            room = Room(room_number="IV-1", owner_name="张三")
+            s.add(room)
+            s.flush()
+            bills = [Bill(room_id=room.id, fee_type="IV测试费", period="1992-01", amount_due=113, amount_paid=113, status="已缴")
+                     for _ in range(3)]
+            bills.append(Bill(room_id=room.id, fee_type="IV测试费", period="1992-01", amount_due=50, status="未缴"))
+            s.add_all(bills)
+            s.commit()
+            RefCache.invalidate(s, FEE_TYPES)
+            
+            first = InvoiceService.issue(s, [bills[0].id, bills[3].id], "公司")
+            s.commit()
+            assert first.count == 1 and first.tax == 13.0
+            batch = InvoiceService.issue_period(s, "1992-01")
+            s.commit()
+            assert batch.count == 2 and batch.amount == 226.0
+            invoices = s.query(Invoice).filter(Invoice.bill_id.in_([b.id for b in bills])).order_by(Invoice.id).all()
+            seq = [int(i.invoice_no[-10:]) for i in invoices]
+            assert seq == list(range(seq[0], seq[0] + 3))
+            assert [i.title for i in invoices] == ["公司", "张三", "张三"]
+            assert invoices[1].amount_excl_tax == 100.0 and invoices[1].tax_rate == 0.13
+            assert not ListingService.invoice_candidates(s, "1992-01")
+            assert InvoiceService.issue_period(s, "1992-01").count == 0
+        finally:
+            ids = [r.id for r in s.query(Room.id).filter(Room.room_number.like("IV-%"))]
+            bill_ids = [b.id for b in s.query(Bill.id).filter(Bill.room_id.in_(ids))]
+            s.query(Invoice).filter(Invoice.bill_id.in_(bill_ids)).delete(synchronize_session=False)
+            s.query(Bill).filter(Bill.id.in_(bill_ids)).delete(synchronize_session=False)
+            s.query(Room).filter(Room.id.in_(ids)).delete(synchronize_session=False)
+            s.query(FeeType).filter_by(name="IV测试费").delete()
+            s.commit()
+            RefCache.invalidate(s, FEE_TYPES)
+            s.close()
+
+
+class TestDiscountService:
+    """减免审批测试"""
+    
+    def test_bulk_approve_and_reject(self):
+        """测试批量通过按账单累加减免、写调整分录，重复处理时报并发冲突"""
+        from models.base import SessionLocal, Base, engine
+        from models.entities import Room, Bill, DiscountRequest, AdjustmentEntry, DataChangeHistory
+        from services.discounts import DiscountService
+        from utils.exceptions import ConcurrencyError
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        try:
+            room = Room(room_number="DR-1")
+            s.add(room)
+            s.flush()
+            b1 = Bill(room_id=room.id, fee_type="物业费", period="1991-01", amount_due=100, discount=2)
+            b2 = Bill(room_id=room.id, fee_type="水费", period="1991-01", amount_due=30)
+            s.add_all([b1, b2])
+            s.flush()
+            reqs = [DiscountRequest(bill_id=b1.id, requested_by="op", amount=10, reason="暴雨"),
+                    DiscountRequest(bill_id=b1.id, requested_by="op", amount=5, reason="暴雨"),
+                    DiscountRequest(bill_id=b2.id, requested_by="op", amount=3, reason="争议")]
+            s.add_all(reqs)
+            s.commit()
+            
+            pending = {p.id: p for p in DiscountService.pending(s)}
+            assert pending[reqs[0].id].room_number == "DR-1" and pending[reqs[0].id].discount == 2
+            d = DiscountService.approve(s, [reqs[0].id, reqs[1].id], "boss")
+            s.commit()
+            assert (d.requests, d.bills, d.amount) == (2, 1, 15.0)
+            assert {(i["申请ID"], i["账单ID"], i["amount"]) for i in d.items} == {
+                (reqs[0].id, b1.id, 10.0), (reqs[1].id, b1.id, 5.0)}
+            s.expire_all()
+            assert s.get(Bill, b1.id).discount == 17
+            assert s.query(AdjustmentEntry).filter_by(bill_id=b1.id).count() == 2
+            assert s.query(DataChangeHistory).filter_by(table_name="bills", record_id=b1.id,
+                                                         field_name="discount").first().new_value == "17.0"
+            with pytest.raises(ConcurrencyError):
+                DiscountService.reject(s, [reqs[1].id, reqs[2].id], "boss")
+            s.rollback()
+            d = DiscountService.reject(s, [reqs[2].id], "boss")
+            s.commit()
+            assert d.items == [{"申请ID": reqs[2].id, "账单ID": b2.id, "amount": 3.0}]
+            assert s.get(DiscountRequest, reqs[2].id).status == "已拒绝" and s.get(Bill, b2.id).discount == 0
+        finally:
+            ids = [r.id for r in s.query(Room.id).filter(Room.room_number.like("DR-%"))]
+            bill_ids = [b.id for b in s.query(Bill.id).filter(Bill.room_id.in_(ids))]
+            s.query(DiscountRequest).filter(DiscountRequest.bill_id.in_(bill_ids)).delete(synchronize_session=False)
+            s.query(DataChangeHistory).filter(DataChangeHistory.table_name == "bills",
+                                              DataChangeHistory.record_id.in_(bill_ids)).delete(synchronize_session=False)
+            s.query(AdjustmentEntry).filter(AdjustmentEntry.bill_id.in_(bill_ids)).delete(synchronize_session=False)
+            s.query(Bill).filter(Bill.id.in_(bill_ids)).delete(synchronize_session=False)
+            s.query(Room).filter(Room.id.in_(ids)).delete(synchronize_session=False)
+            s.commit()
+            s.close()
+
+
+class TestRoomImportService:
+    """房产档案导入测试"""
+    
+    def test_import_splits_bills_and_reports_issues(self):
+        """测试按月拆分欠费、费用项目占位、预缴入余额与问题汇总"""
+        import pandas as pd
+        from models.base import SessionLocal, Base, engine
+        from models.entities import Room, Bill, PaymentRecord, LedgerEntry, DataChangeHistory
+        from services.room_import import RoomImportService
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        df = pd.DataFrame({"房号": ["RI-1", "RI-1", "", "RI-2"], "业主": ["甲", "", "孤行", "乙"],
+                           "面积": ["88", "abc", "", "60"], "费用项目": ["物业费", "水费", "", "物业费"],
+                           "项目月标准金额": ["10", "5", "", ""], "历史欠费": ["100", "30", "", "50"],
+                           "欠费周期起": ["2024-01", "2024-03-01 00:00:00", "", "2024-13"],
+                           "欠费周期终": ["2024-03", "", "", ""], "预缴金额": ["5", "7", "", ""],
+                           "已缴金额": ["100", "", "", ""]})
+        try:
+            preview = RoomImportService.run(s, df, "tester", dry_run=True)
+            assert s.query(Room).filter(Room.room_number.like("RI-%")).count() == 0
+            assert (preview.new_rooms, preview.bills) == (2, 4)
+            assert set(zip(preview.issues["行号"], preview.issues["字段"])) == {(3, "面积"), (4, "房号"), (5, "欠费周期起")}
+            
+            res = RoomImportService.run(s, df, "tester")
+            s.commit()
+            room = s.query(Room).filter_by(room_number="RI-1").one()
+            assert (room.owner_name, room.area, room.balance) == ("甲", 88.0, 12.0)
+            assert (room.fee1_name, room.fee1_std, room.fee2_name, room.fee2_std) == ("物业费", 10.0, "水费", 5.0)
+            bills = s.query(Bill).filter_by(batch_id=res.batch_id, room_id=room.id, fee_type="物业费").order_by(Bill.period).all()
+            assert [(b.period, b.amount_due, b.status) for b in bills] == [
+                ("2024-01", 33.33, "已缴"), ("2024-02", 33.33, "已缴"), ("2024-03", 33.34, "已缴")]
+            assert s.query(PaymentRecord).filter_by(room_id=room.id).one().amount == 100
+            assert s.query(LedgerEntry).filter_by(room_id=room.id, account_id=3).count() == 2
+            
+            again = RoomImportService.run(s, df[df["房号"] == "RI-2"].assign(业主="丙"), "tester")
+            s.commit()
+            assert (again.new_rooms, again.updated_rooms) == (0, 1)
+            rid = s.query(Room.id).filter_by(room_number="RI-2").scalar()
+            assert s.query(DataChangeHistory).filter_by(table_name="rooms", record_id=rid,
+                                                         field_name="owner_name").one().new_value == "丙"
+        finally:
+            ids = [r.id for r in s.query(Room.id).filter(Room.room_number.like("RI-%"))]
+            s.query(DataChangeHistory).filter(DataChangeHistory.table_name == "rooms",
+                                              DataChangeHistory.record_id.in_(ids)).delete(synchronize_session=False)
+            s.query(LedgerEntry).filter(LedgerEntry.room_id.in_(ids)).delete(synchronize_session=False)
+            s.query(PaymentRecord).filter(PaymentRecord.room_id.in_(ids)).delete(synchronize_session=False)
+            s.query(Bill).filter(Bill.room_id.in_(ids)).delete(synchronize_session=False)
+            s.query(Room).filter(Room.id.in_(ids)).delete(synchronize_session=False)
+            s.commit()
+            s.close()
+
+
+class TestIntegrityService:
+    """财务完整性检查测试"""
+    
+    def test_rules_run_concurrently_with_samples(self):
+        """测试内置规则计数、样本与自定义规则注册"""
+        from models.base import SessionLocal, Base, engine
+        from models.entities import Room
+        from services import integrity
+        from services.integrity import IntegrityRule, IntegrityService, register_rule
+        
+        Base.metadata.create_all(engine)
+        s = SessionLocal()
+        try:
+            s.add(Room(room_number="IC-1", balance=-12.5))
+            s.commit()
+            register_rule(IntegrityRule("test_broken", "错误规则", "SELECT * FROM no_such_table"))
+            results = {r.rule.key: r for r in IntegrityService.run(s, keys=["negative_balance", "test_broken"], workers=2)}
+            neg = results["negative_balance"]
+            assert neg.count >= 1 and neg.status == "⚠️ 警告"
+            assert any(row[1] == "IC-1" for row in neg.sample) or len(neg.sample) == 20
+            assert results["test_broken"].status == "❌ 执行失败"
+            assert "负余额房产" in IntegrityService.report(list(results.values()))
+        finally:
+            integrity._RULES.pop("test_broken", None)
+            s.query(Room).filter(Room.room_number == "IC-1").delete()
+            s.commit()
+            s.close()
+
+
+class TestBootstrap:
+    """启动引导测试"""
+    
+    def test_bootstrap_runs_migrations_once(self):
+        """测试迁移只执行一次且重复引导无副作用"""
+        from models.base import SessionLocal, engine
+        from models.entities import SchemaMigration
+        from services.bootstrap import bootstrap, run_migrations, MIGRATIONS
+        
+        bootstrap()
+        bootstrap()
+        assert run_migrations(engine) == []
+        s = SessionLocal()
+        try:
+            names = [m.name for m in s.query(SchemaMigration).all()]
+            assert sorted(names) == sorted(name for name, _ in MIGRATIONS)
+        finally:
+            s.close()
+
+
 if __name__ == "__main__":
     pytest.main([__file__, "-v"])
@@ -39,3 +39,8 @@ class DatabaseError(ERPException):
 class ConfigurationError(ERPException):
     """配置错误"""
     pass
+
+
+class ConcurrencyError(ERPException):
+    """并发修改冲突（数据在读取后已被其他操作修改）"""
+    pass
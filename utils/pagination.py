@@ -0,0 +1,58 @@
+"""游标（keyset）分页模块"""
+from typing import Any, List, Optional, Sequence, Tuple
+from sqlalchemy import tuple_
+
+
+def keyset_page(query, order_cols: Sequence, cursor: Optional[Tuple] = None,
+                page_size: int = 50, descending: bool = True) -> Tuple[List[Any], Optional[Tuple], bool]:
+    """
+    按 (排序列..., id) 游标取一页数据，深页与首页代价相同
+    order_cols: 排序列，最后一列须唯一（通常为主键 id）
+    cursor: 上一页最后一行在排序列上的取值，None 表示首页
+    返回 (本页行, 下一页游标, 是否还有下一页)
+    """
+    key = tuple_(*order_cols)
+    if cursor is not None:
+        query = query.filter(key < tuple_(*cursor) if descending else key > tuple_(*cursor))
+    ordering = [c.desc() for c in order_cols] if descending else [c.asc() for c in order_cols]
+    rows = query.order_by(*ordering).limit(page_size + 1).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    next_cursor = tuple(getattr(rows[-1], c.key) for c in order_cols) if rows else None
+    return rows, next_cursor, has_more
+
+
+class KeysetPager:
+    """保存在 session_state 中的游标翻页状态，筛选条件变化时自动回到首页"""
+
+    def __init__(self, state, key: str, filters: Any = None):
+        self._state = state
+        self._key = key
+        sig = repr(filters)
+        data = state.get(key)
+        if not data or data.get("filters") != sig:
+            data = {"filters": sig, "stack": [None]}
+            state[key] = data
+        self._data = data
+
+    @property
+    def cursor(self) -> Optional[Tuple]:
+        return self._data["stack"][-1]
+
+    @property
+    def page_no(self) -> int:
+        return len(self._data["stack"])
+
+    @property
+    def has_prev(self) -> bool:
+        return len(self._data["stack"]) > 1
+
+    def next(self, cursor: Tuple):
+        self._data["stack"].append(cursor)
+
+    def prev(self):
+        if self.has_prev:
+            self._data["stack"].pop()
+
+    def reset(self):
+        self._data["stack"] = [None]